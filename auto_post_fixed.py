@@ -93,31 +93,30 @@ def prepare_media_text(text: str, max_caption_length: int = 800) -> tuple[str, s
 
 async def start_scheduler(bot: Bot, check_interval: int = 2):
     """Background task to publish scheduled posts and send notifications."""
+    # Outcomes of passes whose complete_scheduler_tick() failed, retried next pass
+    outcome = {"sent": [], "skipped": [], "notified": []}
     while True:
         try:
             now_utc = datetime.now(timezone.utc)
+            tick = await supabase_db.db.claim_scheduler_tick(now_utc)
+            # Posts sent or skipped in a pass whose outcome is not stored yet
+            # come back once their claim lease expires - never send them twice
+            held = set(outcome["sent"]) | set(outcome["skipped"])
             
             # 1. Publish due posts
-            due_posts = supabase_db.db.get_due_posts(now_utc)
-            
-            for post in due_posts:
+            # (user_id, post_id, channel name, error) of failed posts
+            failures = []
+            for post in tick["due"]:
                 post_id = post["id"]
+                if post_id in held:
+                    continue
                 user_id = post.get("user_id") or post.get("created_by")
-                chat_id = None
-                
-                # Determine channel chat_id
-                if post.get("chat_id"):
-                    chat_id = post["chat_id"]
-                else:
-                    chan_id = post.get("channel_id")
-                    if chan_id:
-                        channel = supabase_db.db.get_channel(chan_id)
-                        if channel:
-                            chat_id = channel.get("chat_id")
+                # chat_id is resolved from the channel by the claim
+                chat_id = post.get("chat_id")
                 
                 if not chat_id:
                     # No valid channel, mark as published to skip
-                    supabase_db.db.mark_post_published(post_id)
+                    outcome["skipped"].append(post_id)
                     continue
                 
                 text = post.get("text") or ""
@@ -237,181 +236,111 @@ async def start_scheduler(bot: Bot, check_interval: int = 2):
                             
                         except Exception as e2:
                             print(f"❌ Повторная попытка также провалилась для поста #{post_id}: {e2}")
-                            # Уведомляем пользователя об ошибке
+                            # Уведомляем пользователя об ошибке (после цикла)
                             if user_id:
-                                chan_name = str(chat_id)
-                                channel = supabase_db.db.get_channel_by_chat_id(chat_id)
-                                if channel:
-                                    chan_name = channel.get("name") or str(chat_id)
-                                
-                                lang = "ru"
-                                user = supabase_db.db.get_user(user_id)
-                                if user:
-                                    lang = user.get("language", "ru")
-                                
-                                msg_text = TEXTS[lang]['error_post_failed'].format(
-                                    id=post_id, 
-                                    channel=chan_name, 
-                                    error=str(e2)
-                                )
-                                
-                                try:
-                                    await bot.send_message(user_id, msg_text)
-                                except:
-                                    pass
+                                failures.append((user_id, post_id, post.get("channel_name") or str(chat_id), str(e2)))
                     else:
-                        # Другие ошибки - уведомляем пользователя
+                        # Другие ошибки - уведомляем пользователя (после цикла)
                         if user_id:
-                            chan_name = str(chat_id)
-                            channel = supabase_db.db.get_channel_by_chat_id(chat_id)
-                            if channel:
-                                chan_name = channel.get("name") or str(chat_id)
-                            
-                            lang = "ru"
-                            user = supabase_db.db.get_user(user_id)
-                            if user:
-                                lang = user.get("language", "ru")
-                            
-                            msg_text = TEXTS[lang]['error_post_failed'].format(
-                                id=post_id, 
-                                channel=chan_name, 
-                                error=error_msg
-                            )
-                            
-                            try:
-                                await bot.send_message(user_id, msg_text)
-                            except:
-                                pass
+                            failures.append((user_id, post_id, post.get("channel_name") or str(chat_id), error_msg))
                     
-                    supabase_db.db.mark_post_published(post_id)
+                    outcome["skipped"].append(post_id)
                     continue
                 
-                # Handle repeating posts
-                repeat_int = post.get("repeat_interval") or 0
-                if repeat_int > 0:
-                    try:
-                        pub_time_str = post.get("publish_time")
-                        if pub_time_str:
-                            try:
-                                # Parse datetime string
-                                if isinstance(pub_time_str, str):
-                                    # Remove 'Z' suffix if present
-                                    if pub_time_str.endswith('Z'):
-                                        pub_time_str = pub_time_str[:-1] + '+00:00'
-                                    current_dt = datetime.fromisoformat(pub_time_str)
-                                else:
-                                    current_dt = pub_time_str
-                            except Exception:
-                                current_dt = datetime.strptime(pub_time_str, "%Y-%m-%dT%H:%M:%S")
-                                current_dt = current_dt.replace(tzinfo=timezone.utc)
-                        else:
-                            current_dt = now_utc
-                        
-                        # Calculate next time
-                        next_time = current_dt + timedelta(seconds=repeat_int)
-                        
-                        # Update post with new time (ИСПРАВЛЕНО - как строка)
-                        supabase_db.db.update_post(post_id, {
-                            "publish_time": next_time.isoformat(),
-                            "published": False,
-                            "notified": False
-                        })
-                        
-                        print(f"🔄 Пост #{post_id} запланирован повторно на {next_time.isoformat()}")
-                        continue  # do not mark published
-                        
-                    except Exception as e:
-                        print(f"Failed to schedule next repeat for post {post_id}: {e}")
-                
-                # Mark as published
-                supabase_db.db.mark_post_published(post_id)
+                # Repeating posts are moved to their next time by complete_scheduler_tick
+                outcome["sent"].append(post_id)
             
-            # 2. Send notifications for upcoming posts
-            upcoming_posts = supabase_db.db.list_posts(only_pending=True)
+            # Authors of failed posts are loaded in one query
+            if failures:
+                users = await supabase_db.db.get_users([failure[0] for failure in failures])
+                for user_id, post_id, chan_name, error in failures:
+                    lang = (users.get(user_id) or {}).get("language") or "ru"
+                    if lang not in TEXTS:
+                        lang = "ru"
+                    msg_text = TEXTS[lang]['error_post_failed'].format(
+                        id=post_id, 
+                        channel=chan_name, 
+                        error=error
+                    )
+                    try:
+                        await bot.send_message(user_id, msg_text)
+                    except:
+                        pass
             
-            for post in upcoming_posts:
-                if post.get("published") or post.get("draft"):
+            # 2. Send notifications for upcoming posts (already filtered by notify_before)
+            for post in tick["notify"]:
+                user_id = post.get("created_by")
+                # Sent in a pass whose outcome is not stored yet
+                if not user_id or post["id"] in outcome["notified"]:
                     continue
-                
-                user_id = post.get("user_id") or post.get("created_by")
-                if not user_id:
-                    continue
-                
-                user = supabase_db.db.get_user(user_id)
-                if not user:
-                    continue
-                
-                notify_before = user.get("notify_before", 0)
-                if notify_before and notify_before > 0:
+                try:
+                    pub_time_str = post.get("publish_time")
+                    if isinstance(pub_time_str, str):
+                        if pub_time_str.endswith('Z'):
+                            pub_time_str = pub_time_str[:-1] + '+00:00'
+                        pub_dt = datetime.fromisoformat(pub_time_str)
+                    else:
+                        pub_dt = pub_time_str
+                    if pub_dt.tzinfo is None:
+                        pub_dt = pub_dt.replace(tzinfo=timezone.utc)
+                    
+                    lang = post.get("language") or "ru"
+                    if lang not in TEXTS:
+                        lang = "ru"
+                    chat_id = post.get("chat_id")
+                    chan_name = post.get("channel_name") or (str(chat_id) if chat_id else "")
+                    minutes_left = int((pub_dt - datetime.now(timezone.utc)).total_seconds() // 60)
+                    
+                    if minutes_left < 1:
+                        notify_text = TEXTS[lang]['notify_message_less_min'].format(
+                            id=post['id'], 
+                            channel=chan_name
+                        )
+                    else:
+                        notify_text = TEXTS[lang]['notify_message'].format(
+                            id=post['id'], 
+                            channel=chan_name, 
+                            minutes=minutes_left
+                        )
+                    
                     try:
-                        pub_time_str = post.get("publish_time")
-                        if not pub_time_str:
-                            continue
-                        
-                        # Parse publish time
-                        try:
-                            if isinstance(pub_time_str, str):
-                                # Remove 'Z' suffix if present
-                                if pub_time_str.endswith('Z'):
-                                    pub_time_str = pub_time_str[:-1] + '+00:00'
-                                pub_dt = datetime.fromisoformat(pub_time_str)
-                            else:
-                                pub_dt = pub_time_str
-                        except Exception:
-                            pub_dt = datetime.strptime(pub_time_str, "%Y-%m-%dT%H:%M:%S")
-                            pub_dt = pub_dt.replace(tzinfo=timezone.utc)
-                        
-                        # Ensure timezone aware
-                        if pub_dt.tzinfo is None:
-                            pub_dt = pub_dt.replace(tzinfo=timezone.utc)
-                        
-                        now = datetime.now(timezone.utc)
-                        threshold = pub_dt - timedelta(minutes=notify_before)
-                        
-                        # Check if it's time to notify
-                        if threshold <= now < pub_dt and not post.get("notified"):
-                            lang = user.get("language", "ru")
-                            chan_name = ""
-                            
-                            chan_id = post.get("channel_id")
-                            chat_id = post.get("chat_id")
-                            channel = None
-                            
-                            if chan_id:
-                                channel = supabase_db.db.get_channel(chan_id)
-                            if not channel and chat_id:
-                                channel = supabase_db.db.get_channel_by_chat_id(chat_id)
-                            
-                            if channel:
-                                chan_name = channel.get("name") or str(channel.get("chat_id"))
-                            else:
-                                chan_name = str(chat_id) if chat_id else ""
-                            
-                            minutes_left = int((pub_dt - now).total_seconds() // 60)
-                            
-                            if minutes_left < 1:
-                                notify_text = TEXTS[lang]['notify_message_less_min'].format(
-                                    id=post['id'], 
-                                    channel=chan_name
-                                )
-                            else:
-                                notify_text = TEXTS[lang]['notify_message'].format(
-                                    id=post['id'], 
-                                    channel=chan_name, 
-                                    minutes=minutes_left
-                                )
-                            
-                            try:
-                                await bot.send_message(user_id, notify_text)
-                                supabase_db.db.update_post(post["id"], {"notified": True})
-                                print(f"🔔 Отправлено уведомление пользователю {user_id} о посте #{post['id']}")
-                            except Exception as e:
-                                print(f"Failed to send notification to user {user_id}: {e}")
-                                
+                        await bot.send_message(user_id, notify_text)
+                        outcome["notified"].append(post["id"])
+                        print(f"🔔 Отправлено уведомление пользователю {user_id} о посте #{post['id']}")
                     except Exception as e:
-                        print(f"Notification check failed for post {post.get('id')}: {e}")
+                        print(f"Failed to send notification to user {user_id}: {e}")
+                        
+                except Exception as e:
+                    print(f"Notification check failed for post {post.get('id')}: {e}")
+            
+            # 3. Store every outcome of this pass in one call
+            rows = await supabase_db.db.complete_scheduler_tick(**outcome)
+            if rows is not None:
+                for row in rows:
+                    if row["id"] in outcome["sent"] and not row.get("published"):
+                        print(f"🔄 Пост #{row['id']} запланирован повторно на {row.get('publish_time')}")
+                outcome = {"sent": [], "skipped": [], "notified": []}
             
         except Exception as e:
             print(f"❌ Ошибка в планировщике: {e}")
         
         await asyncio.sleep(check_interval)
+
+
+async def start_archiver(older_than_days: int, batch_size: int = 500, interval: int = 3600, pause: float = 1.0):
+    """Background task moving old published posts into posts_archive in batches."""
+    while True:
+        try:
+            moved = 0
+            while True:
+                count = await supabase_db.db.archive_published_posts(older_than_days, batch_size)
+                moved += count
+                if count < batch_size:
+                    break
+                await asyncio.sleep(pause)
+            if moved:
+                print(f"🗄 В архив перенесено опубликованных постов: {moved}")
+        except Exception as e:
+            print(f"❌ Ошибка архивации постов: {e}")
+        
+        await asyncio.sleep(interval)
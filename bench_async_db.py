@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: задержка обработчиков при синхронном и асинхронном доступе к БД
+
+Эмулирует поток апдейтов, каждый обработчик делает несколько запросов к БД.
+Задержка PostgREST имитируется через time.sleep, чтобы не зависеть от живого
+проекта Supabase. Сравниваются:
+  - до: синхронные вызовы SupabaseDB прямо из корутин (блокируют event loop)
+  - после: AsyncSupabaseDB с ограниченным пулом потоков
+"""
+
+import asyncio
+import random
+import statistics
+import time
+
+from supabase_db import AsyncSupabaseDB
+
+UPDATES = 300            # количество апдейтов
+ARRIVAL_INTERVAL = 0.005 # интервал между апдейтами, сек
+CALLS_PER_HANDLER = 2    # запросов к БД на один апдейт
+FAST_LATENCY = 0.010     # обычный round trip, сек
+SLOW_LATENCY = 0.200     # медленный round trip, сек
+SLOW_RATIO = 0.05        # доля медленных запросов
+
+
+class FakeSyncDB:
+    """Заглушка SupabaseDB с имитацией сетевой задержки"""
+
+    def __init__(self, seed: int = 42):
+        self._rnd = random.Random(seed)
+
+    def get_user(self, user_id: int):
+        delay = SLOW_LATENCY if self._rnd.random() < SLOW_RATIO else FAST_LATENCY
+        time.sleep(delay)
+        return {"user_id": user_id, "language": "ru", "timezone": "UTC"}
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def run_load(get_user) -> list:
+    """Запускает апдейты с фиксированным темпом и возвращает задержки в мс"""
+    latencies = []
+    start = time.perf_counter()
+
+    async def handler(i: int):
+        planned = start + i * ARRIVAL_INTERVAL
+        delay = planned - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        for _ in range(CALLS_PER_HANDLER):
+            await get_user(i)
+        latencies.append((time.perf_counter() - planned) * 1000)
+
+    await asyncio.gather(*(handler(i) for i in range(UPDATES)))
+    return latencies
+
+
+def report(title: str, latencies: list, total: float):
+    print(f"\n📊 {title}")
+    print(f"   p50: {percentile(latencies, 50):8.1f} мс")
+    print(f"   p99: {percentile(latencies, 99):8.1f} мс")
+    print(f"   max: {max(latencies):8.1f} мс")
+    print(f"   среднее: {statistics.mean(latencies):8.1f} мс")
+    print(f"   общее время: {total:6.2f} с")
+
+
+async def main():
+    print("🧪 БЕНЧМАРК ЗАДЕРЖКИ ОБРАБОТЧИКОВ")
+    print("=" * 60)
+    print(f"Апдейтов: {UPDATES}, запросов на апдейт: {CALLS_PER_HANDLER}")
+
+    sync_db = FakeSyncDB()
+
+    async def blocking_get_user(user_id):
+        return sync_db.get_user(user_id)
+
+    t0 = time.perf_counter()
+    before = await run_load(blocking_get_user)
+    report("До: синхронный SupabaseDB в event loop", before, time.perf_counter() - t0)
+
+    async_db = AsyncSupabaseDB(FakeSyncDB(), max_workers=8)
+    t0 = time.perf_counter()
+    after = await run_load(async_db.get_user)
+    report("После: AsyncSupabaseDB (8 потоков)", after, time.perf_counter() - t0)
+    async_db.shutdown()
+
+    print("\n" + "=" * 60)
+    print(f"🏁 p99 улучшен в {percentile(before, 99) / percentile(after, 99):.1f} раз")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
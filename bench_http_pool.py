@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: пул HTTP-соединений PostgREST по умолчанию и настроенный
+
+Вместо Supabase поднимается локальная заглушка PostgREST (ThreadingHTTPServer,
+HTTP/1.1 keep-alive). Стоимость установки соединения (TCP + TLS до облака)
+имитируется задержкой при каждом новом подключении, время запроса - задержкой
+ответа. Нагрузка идет пачками с паузой дольше keepalive httpx по умолчанию (5 с),
+как у бота в спокойные часы. Сравниваются:
+  - по умолчанию: keepalive 5 с, без прогрева
+  - настроено: keepalive 60 с, пул на число потоков, прогрев при старте
+"""
+
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from supabase_db import SupabaseDB
+
+WORKERS = 8              # потоков БД (как DB_MAX_WORKERS)
+BURSTS = 3               # пачек запросов
+BURST_SIZE = 200         # запросов в пачке
+IDLE_GAP = 6.0           # пауза между пачками, сек
+HANDSHAKE_LATENCY = 0.060  # установка соединения, сек
+QUERY_LATENCY = 0.004    # обработка запроса, сек
+
+# JWT-подобный ключ, чтобы пройти проверку формата в create_client
+BENCH_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.bench"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Минимальная заглушка PostgREST: любой GET/POST отдает одну строку users"""
+
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        with StandInHandler.lock:
+            StandInHandler.connections += 1
+        time.sleep(HANDSHAKE_LATENCY)
+        super().setup()
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        time.sleep(QUERY_LATENCY)
+        body = json.dumps([{"user_id": 1, "language": "ru", "timezone": "UTC"}]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _reply
+    do_POST = _reply
+    do_PATCH = _reply
+
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def run_scenario(url: str, title: str, prewarm: int, **pool_settings):
+    StandInHandler.connections = 0
+    db = SupabaseDB(url, BENCH_KEY, user_cache_size=0, **pool_settings)
+    db.prewarm_connections(prewarm)
+    warm_connections = StandInHandler.connections
+
+    def call(i):
+        started = time.perf_counter()
+        db.get_user(i)
+        return (time.perf_counter() - started) * 1000
+
+    print(f"\n📊 {title}")
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        for burst in range(BURSTS):
+            if burst:
+                time.sleep(IDLE_GAP)
+            t0 = time.perf_counter()
+            latencies = list(executor.map(call, range(BURST_SIZE)))
+            elapsed = time.perf_counter() - t0
+            print(
+                f"   пачка {burst + 1}: p50 {percentile(latencies, 50):6.1f} мс, "
+                f"p99 {percentile(latencies, 99):6.1f} мс, "
+                f"среднее {statistics.mean(latencies):6.1f} мс, "
+                f"{BURST_SIZE / elapsed:7.1f} запр/с"
+            )
+    print(f"   соединений: {StandInHandler.connections} (из них при прогреве: {warm_connections})")
+    db.close()
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print("🧪 БЕНЧМАРК ПУЛА СОЕДИНЕНИЙ POSTGREST")
+    print("=" * 60)
+    print(f"Потоков: {WORKERS}, пачек: {BURSTS} x {BURST_SIZE}, пауза: {IDLE_GAP} с")
+
+    run_scenario(url, "По умолчанию (keepalive 5 с, без прогрева)", prewarm=0,
+                 http_pool_size=100, http_keepalive=20, http_keepalive_expiry=5.0)
+    run_scenario(url, f"Настроено (keepalive 60 с, пул {WORKERS}, прогрев)", prewarm=WORKERS,
+                 http_pool_size=WORKERS, http_keepalive=WORKERS, http_keepalive_expiry=60.0)
+
+    server.shutdown()
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    main()
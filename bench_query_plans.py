@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: планы и время запросов SupabaseDB на 1 млн постов
+
+Нужен локальный PostgreSQL и драйвер psycopg (pip install "psycopg[binary]").
+Строка подключения берется из BENCH_DATABASE_URL. Все создается в отдельной
+схеме bench_plans, которая удаляется в конце.
+
+Схема накатывается миграциями из migrations/. Сравниваются:
+  - до: миграции 0001-0006 (одностолбцовые индексы и (published, draft))
+  - после: плюс 0007 (частичный индекс планировщика и составные по каналам)
+Для каждого запроса, который SupabaseDB отправляет через PostgREST, снимается
+EXPLAIN ANALYZE. После 0007 проверяется, что запрос идет по ожидаемому
+индексу без Seq Scan по posts и укладывается в лимит времени.
+"""
+
+import os
+import statistics
+import sys
+from datetime import datetime, timezone
+
+from migrate import load_migrations, migration_script
+
+DSN = os.getenv("BENCH_DATABASE_URL", "postgresql://postgres@localhost:5432/postgres")
+SCHEMA = "bench_plans"
+POSTS = 1_000_000        # постов
+CHANNELS = 2_000         # каналов
+USERS = 1_000            # пользователей
+USER_CHANNELS = 5        # каналов в запросах списков (как у одного пользователя)
+REPEAT = 15              # запусков каждого запроса
+LIMIT_MS = 50.0          # лимит медианы после индексов, мс
+INDEX_MIGRATION = 7      # миграция с индексами
+
+# Доли постов: опубликованные (прошлое), запланированные (будущее),
+# черновики и просроченные неопубликованные (их забирает планировщик)
+LOAD_SQL = f"""
+INSERT INTO users (user_id, language, notify_before)
+SELECT u, 'ru', CASE WHEN u % 4 = 0 THEN 15 ELSE 0 END FROM generate_series(1, {USERS}) u;
+
+INSERT INTO channels (chat_id, name)
+SELECT -1000000 - c, 'Канал ' || c FROM generate_series(1, {CHANNELS}) c;
+
+INSERT INTO channel_admins (channel_id, user_id)
+SELECT c.id, 1 + (c.id - 1) % {USERS} FROM channels c;
+
+INSERT INTO posts (channel_id, chat_id, created_by, text, publish_time, draft, published, created_at)
+SELECT
+    1 + i % {CHANNELS},
+    -1000000 - (1 + i % {CHANNELS}),
+    1 + i % {USERS},
+    'Пост ' || i || repeat(' текст', 20),
+    CASE
+        WHEN r < 0.90 THEN now() - (r * interval '365 days')
+        WHEN r < 0.97 THEN now() + ((r - 0.90) * interval '300 days')
+        WHEN r < 0.99 THEN NULL
+        ELSE now() - ((r - 0.99) * interval '10 days')
+    END,
+    r >= 0.97 AND r < 0.99,
+    r < 0.90,
+    now() - ((1 - r) * interval '400 days')
+FROM (SELECT i, random() AS r FROM generate_series(1, {POSTS}) i) s;
+"""
+
+LIST_COLUMNS = "id, channel_id, published, draft, publish_time, created_at, text_preview"
+PUBLISH_COLUMNS = ("id, channel_id, chat_id, created_by, publish_time, repeat_interval, published, draft, notified, "
+                   "text, media_type, media_id, parse_mode, buttons")
+
+# (название, SQL в том виде, как его строит PostgREST, ожидаемые индексы)
+QUERIES = [
+    ("get_due_posts",
+     f"SELECT {PUBLISH_COLUMNS} FROM posts "
+     "WHERE published = false AND draft = false AND publish_time <= %(now)s",
+     {"idx_posts_due"}),
+    ("scheduler_claim: готовые посты",
+     "SELECT id FROM posts WHERE NOT published AND NOT draft AND publish_time <= %(now)s "
+     "AND (claimed_at IS NULL OR claimed_at < %(now)s - interval '300 seconds')",
+     {"idx_posts_due"}),
+    ("scheduler_claim: напоминания",
+     "SELECT p.id, ch.name, u.language FROM posts p "
+     "JOIN users u ON u.user_id = p.created_by LEFT JOIN channels ch ON ch.id = p.channel_id "
+     "WHERE NOT p.published AND NOT p.draft AND NOT p.notified AND u.notify_before > 0 "
+     "AND p.publish_time > %(now)s AND p.publish_time - make_interval(mins => u.notify_before) <= %(now)s",
+     {"idx_posts_due"}),
+    ("list_posts (ожидающие)",
+     f"SELECT {LIST_COLUMNS} FROM posts WHERE channel_id = ANY(%(channels)s) AND published = false "
+     "ORDER BY publish_time",
+     {"idx_posts_channel_published_time"}),
+    ("list_posts_page: запланированные",
+     f"SELECT {LIST_COLUMNS} FROM posts WHERE channel_id = ANY(%(channels)s) "
+     "AND published = false AND draft = false ORDER BY publish_time LIMIT 5",
+     {"idx_posts_channel_published_time", "idx_posts_due"}),
+    ("list_posts_page: черновики",
+     f"SELECT {LIST_COLUMNS} FROM posts WHERE channel_id = ANY(%(channels)s) AND draft = true "
+     "ORDER BY created_at DESC LIMIT 5",
+     {"idx_posts_channel_drafts"}),
+    ("list_posts_page: опубликованные",
+     f"SELECT {LIST_COLUMNS} FROM posts WHERE channel_id = ANY(%(channels)s) AND published = true "
+     "ORDER BY created_at DESC LIMIT 5",
+     {"idx_posts_channel_published_created"}),
+]
+
+
+def plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def explain(cur, sql: str, params: dict) -> tuple:
+    """(медиана Execution Time в мс, индексы в плане, есть ли Seq Scan по posts)"""
+    times = []
+    plan = None
+    for _ in range(REPEAT):
+        cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql, params)
+        result = cur.fetchone()[0][0]
+        times.append(result["Execution Time"])
+        plan = result["Plan"]
+    nodes = list(plan_nodes(plan))
+    indexes = {node["Index Name"] for node in nodes if "Index Name" in node}
+    seq_scan = any(node["Node Type"] == "Seq Scan" and node.get("Relation Name") == "posts" for node in nodes)
+    return statistics.median(times), indexes, seq_scan
+
+
+def run_queries(cur, params: dict) -> dict:
+    return {title: explain(cur, sql, params) for title, sql, _ in QUERIES}
+
+
+def main():
+    try:
+        import psycopg
+    except ImportError:
+        print("Для бенчмарка нужен psycopg: pip install \"psycopg[binary]\"")
+        sys.exit(1)
+
+    print("🧪 БЕНЧМАРК ПЛАНОВ ЗАПРОСОВ POSTGRES")
+    print("=" * 60)
+    print(f"Постов: {POSTS:,}, каналов: {CHANNELS}, пользователей: {USERS}, запусков: {REPEAT}")
+
+    migrations = load_migrations()
+    before = [m for m in migrations if m.version < INDEX_MIGRATION]
+    after = [m for m in migrations if m.version == INDEX_MIGRATION]
+
+    with psycopg.connect(DSN, autocommit=True) as conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+        cur.execute(f"SET search_path = {SCHEMA}")
+        try:
+            for migration in before:
+                cur.execute(migration_script(migration))
+
+            print("\n⏳ Загрузка данных...")
+            # Счетчики пересчитываются один раз после загрузки, а не триггером на каждый пост
+            cur.execute("ALTER TABLE posts DISABLE TRIGGER USER")
+            cur.execute(LOAD_SQL)
+            cur.execute("ALTER TABLE posts ENABLE TRIGGER USER")
+            cur.execute("SELECT rebuild_channel_post_stats()")
+            cur.execute("ANALYZE")
+
+            params = {"now": datetime.now(timezone.utc), "channels": list(range(1, USER_CHANNELS + 1))}
+
+            results_before = run_queries(cur, params)
+            for migration in after:
+                cur.execute(migration_script(migration))
+            cur.execute("ANALYZE")
+            results_after = run_queries(cur, params)
+        finally:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+    failures = []
+    for title, _, expected in QUERIES:
+        time_before, _, _ = results_before[title]
+        time_after, indexes, seq_scan = results_after[title]
+        print(f"\n📊 {title}")
+        print(f"   до:    {time_before:8.2f} мс")
+        print(f"   после: {time_after:8.2f} мс ({time_before / max(time_after, 0.001):.1f}x), "
+              f"индексы: {', '.join(sorted(indexes)) or 'нет'}")
+        if not indexes & expected:
+            failures.append(f"{title}: нет индекса {' / '.join(sorted(expected))}")
+        if seq_scan:
+            failures.append(f"{title}: Seq Scan по posts")
+        if time_after > LIMIT_MS:
+            failures.append(f"{title}: {time_after:.1f} мс > {LIMIT_MS:.0f} мс")
+
+    print("\n" + "=" * 60)
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print("✅ Все запросы идут по индексам и укладываются в лимит")
+
+
+if __name__ == "__main__":
+    main()
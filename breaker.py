@@ -0,0 +1,91 @@
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the database while the breaker is open."""
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` failures in a row and lets one probe through after ``reset_timeout``."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, name: str = "database"):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+        self.total_failures = 0
+        self.timeouts = 0
+        self.stale_reads = 0
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being rejected (the reset timeout has not passed)."""
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def allow(self) -> bool:
+        """Whether a call may go to the database now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print(f"Circuit breaker for {self.name} closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.total_failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+                self.opened += 1
+                print(f"Circuit breaker for {self.name} opened after {self.failures} failures, "
+                      f"retrying in {self.reset_timeout:.0f}s")
+
+    def record_timeout(self):
+        """A caller gave up waiting (deadline); counts as a failure."""
+        with self._lock:
+            self.timeouts += 1
+        self.record_failure()
+
+    def record_stale_read(self):
+        with self._lock:
+            self.stale_reads += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "failures": self.total_failures,
+                "timeouts": self.timeouts,
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "stale_reads": self.stale_reads,
+            }
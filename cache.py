@@ -0,0 +1,254 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class TTLCache:
+    """Thread-safe bounded LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Called as on_evict(key, value) for LRU evictions, under the cache lock
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Write sequence: entries keep the sequence of their last write, and
+        # _floor the highest one of entries popped or evicted since
+        self._seq = 0
+        self._floor = 0
+
+    def stamp(self) -> int:
+        """Current write sequence; take it before reading a value from the database."""
+        with self._lock:
+            return self._seq
+
+    def get(self, key, default=None):
+        """Return the cached value or ``default`` on a miss or expired entry."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_stale(self, key, default=None):
+        """Return the last stored value even if it has expired (not counted as a hit)."""
+        with self._lock:
+            entry = self._data.get(key)
+        return entry[0] if entry else default
+
+    def set(self, key, value, stamp: int = None):
+        """Store ``value``; with ``stamp`` skipped if the key may have been written since."""
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if stamp is None:
+                self._seq += 1
+                seq = self._seq
+            else:
+                entry = self._data.get(key)
+                if (entry[2] if entry else self._floor) > stamp:
+                    return
+                seq = stamp
+            self._data[key] = (value, expires_at, seq)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted_key, (evicted, _, evicted_seq) = self._data.popitem(last=False)
+                self._floor = max(self._floor, evicted_seq)
+                self.evictions += 1
+                if self.on_evict is not None:
+                    self.on_evict(evicted_key, evicted)
+
+    def pop(self, key):
+        """Invalidate a single key."""
+        with self._lock:
+            self._seq += 1
+            self._floor = self._seq
+            entry = self._data.pop(key, None)
+        return entry[0] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._seq += 1
+            self._floor = self._seq
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+class ChannelACLCache:
+    """In-process ACL index: user_id -> {channel_id: channel row with admin_role}."""
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 600.0, invalidation_window: int = 256):
+        self._users = TTLCache(maxsize=maxsize, ttl=ttl, on_evict=self._unlink)
+        self._channel_users = {}
+        self._lock = threading.Lock()
+        # Invalidation sequence and the latest invalidations as (seq, user_id, channel_id);
+        # stamps older than _forgotten (invalidations no longer in the window) never store
+        self._seq = 0
+        self._recent = deque(maxlen=invalidation_window)
+        self._forgotten = 0
+
+    def stamp(self, user_id) -> int:
+        """Invalidation sequence; take it before querying the user's channels."""
+        with self._lock:
+            return self._seq
+
+    def get(self, user_id):
+        """Return {channel_id: channel} for the user, or None if not cached."""
+        return self._users.get(user_id)
+
+    def get_stale(self, user_id):
+        """Last cached {channel_id: channel} for the user even if expired, or None."""
+        return self._users.get_stale(user_id)
+
+    def set(self, user_id, channels: list, stamp: int = None) -> dict:
+        """Index ``channels`` by id and cache them, unless the user or one of the
+        channels was invalidated after ``stamp``."""
+        by_id = {ch["id"]: ch for ch in channels}
+        with self._lock:
+            if self._users.maxsize <= 0 or (stamp is not None and self._invalidated_since(stamp, user_id, by_id)):
+                return by_id
+            self._unlink(user_id, self._users.get_stale(user_id))
+            for channel_id in by_id:
+                self._channel_users.setdefault(channel_id, set()).add(user_id)
+            self._users.set(user_id, by_id)
+        return by_id
+
+    def _invalidated_since(self, stamp: int, user_id, by_id: dict) -> bool:
+        if stamp < self._forgotten:
+            return True
+        return any(
+            seq > stamp and (user == user_id or channel in by_id)
+            for seq, user, channel in self._recent
+        )
+
+    def _record(self, user_id=None, channel_id=None):
+        self._seq += 1
+        if len(self._recent) == self._recent.maxlen:
+            self._forgotten = self._recent[0][0]
+        self._recent.append((self._seq, user_id, channel_id))
+
+    def _unlink(self, user_id, by_id):
+        # Drop user_id from the reverse index of its cached channels (lock held)
+        for channel_id in by_id or ():
+            users = self._channel_users.get(channel_id)
+            if users:
+                users.discard(user_id)
+                if not users:
+                    del self._channel_users[channel_id]
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._record(user_id=user_id)
+            self._unlink(user_id, self._users.pop(user_id))
+
+    def invalidate_channel(self, channel_id):
+        with self._lock:
+            self._record(channel_id=channel_id)
+            users = self._channel_users.pop(channel_id, set())
+            for user_id in users:
+                self._unlink(user_id, self._users.pop(user_id))
+
+    def clear(self):
+        with self._lock:
+            self._seq += 1
+            self._forgotten = self._seq
+            self._recent.clear()
+            self._channel_users.clear()
+            self._users.clear()
+
+    def stats(self) -> dict:
+        stats = self._users.stats()
+        stats["channels"] = len(self._channel_users)
+        return stats
+
+
+class ListResultCache:
+    """Cache of post list results validated by per-channel version counters."""
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 120.0):
+        self._results = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions = {}
+        self._bumped_at = {}
+        self._epoch = 0
+        self._epoch_bumped_at = None
+        self._lock = threading.Lock()
+        self.bumps = 0
+
+    def stamp(self, channel_ids) -> tuple:
+        """Current versions of ``channel_ids``; take it before running the query."""
+        channel_ids = sorted(channel_ids)
+        with self._lock:
+            return (self._epoch, tuple((cid, self._versions.get(cid, 0)) for cid in channel_ids))
+
+    def get(self, key, channel_ids):
+        """Cached result for ``key`` if none of ``channel_ids`` changed since, else None."""
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        stamp, value = entry
+        if stamp != self.stamp(channel_ids):
+            return None
+        return value
+
+    def get_stale(self, key):
+        """Last result stored for ``key`` regardless of versions and expiry, or None."""
+        entry = self._results.get_stale(key)
+        return entry[1] if entry else None
+
+    def set(self, key, value, stamp: tuple, settle: float = 0.0):
+        """Store a result built under ``stamp`` (skipped if a channel changed within ``settle`` seconds)."""
+        if settle > 0:
+            horizon = time.monotonic() - settle
+            with self._lock:
+                times = [self._bumped_at.get(cid) for cid, _ in stamp[1]] + [self._epoch_bumped_at]
+            if any(t is not None and t > horizon for t in times):
+                return
+        self._results.set(key, (stamp, value))
+
+    def bump(self, channel_id):
+        if channel_id is None:
+            return self.bump_all()
+        with self._lock:
+            self._versions[channel_id] = self._versions.get(channel_id, 0) + 1
+            self._bumped_at[channel_id] = time.monotonic()
+            self.bumps += 1
+
+    def bump_all(self):
+        with self._lock:
+            self._epoch += 1
+            self._epoch_bumped_at = time.monotonic()
+            self.bumps += 1
+
+    def clear(self):
+        self._results.clear()
+
+    def stats(self) -> dict:
+        stats = self._results.stats()
+        stats["bumps"] = self.bumps
+        return stats
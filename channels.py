@@ -19,9 +19,9 @@ def get_channels_main_menu(lang: str):
     ])
 
 @router.message(Command("channels"))
-async def cmd_channels(message: Message, state: FSMContext):
+async def cmd_channels(message: Message, state: FSMContext, db_user: dict = None):
     user_id = message.from_user.id
-    user = supabase_db.db.ensure_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     # Parse subcommand
@@ -46,17 +46,17 @@ async def show_channels_menu(message: Message, user: dict, lang: str):
     await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
 
 @router.callback_query(F.data == "channels_list")
-async def callback_list_channels(callback: CallbackQuery):
+async def callback_list_channels(callback: CallbackQuery, db_user: dict = None):
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     await list_channels_callback(callback, user, lang)
 
 @router.callback_query(F.data == "channels_add")
-async def callback_add_channel(callback: CallbackQuery):
+async def callback_add_channel(callback: CallbackQuery, db_user: dict = None):
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     text = ("➕ **Добавление канала**\n\n"
@@ -73,25 +73,25 @@ async def callback_add_channel(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "channels_remove")
-async def callback_remove_channel(callback: CallbackQuery):
+async def callback_remove_channel(callback: CallbackQuery, db_user: dict = None):
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     await show_channels_for_removal(callback, user, lang)
 
 @router.callback_query(F.data == "channels_check_admin")
-async def callback_check_admin_rights(callback: CallbackQuery):
+async def callback_check_admin_rights(callback: CallbackQuery, db_user: dict = None):
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     await check_admin_rights_all(callback, user, lang)
 
 @router.callback_query(F.data == "channels_menu")
-async def callback_channels_menu(callback: CallbackQuery):
+async def callback_channels_menu(callback: CallbackQuery, db_user: dict = None):
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     text = "🔧 **Управление каналами**\n\nВыберите действие:"
@@ -104,7 +104,7 @@ async def list_channels_callback(callback: CallbackQuery, user: dict, lang: str)
     user_id = user.get("user_id")
     
     # Получаем каналы пользователя
-    channels = supabase_db.db.get_user_channels(user_id)
+    channels = await supabase_db.db.get_user_channels(user_id)
     if not channels:
         text = ("📋 **Список каналов**\n\n"
                 "❌ Каналы не найдены.\n"
@@ -147,7 +147,7 @@ async def list_channels_direct(message: Message, user: dict, lang: str):
     """Показать список каналов через команду"""
     user_id = user.get("user_id")
     
-    channels = supabase_db.db.get_user_channels(user_id)
+    channels = await supabase_db.db.get_user_channels(user_id)
     if not channels:
         await message.answer("❌ У вас нет доступных каналов. Добавьте канал через /channels add")
         return
@@ -170,7 +170,7 @@ async def show_channels_for_removal(callback: CallbackQuery, user: dict, lang: s
     """Показать каналы для удаления"""
     user_id = user.get("user_id")
     
-    channels = supabase_db.db.get_user_channels(user_id)
+    channels = await supabase_db.db.get_user_channels(user_id)
     if not channels:
         text = "❌ Нет каналов для удаления."
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -199,7 +199,7 @@ async def check_admin_rights_all(callback: CallbackQuery, user: dict, lang: str)
     """Проверить права администратора для всех каналов"""
     user_id = user.get("user_id")
     
-    channels = supabase_db.db.get_user_channels(user_id)
+    channels = await supabase_db.db.get_user_channels(user_id)
     if not channels:
         text = "❌ Нет каналов для проверки."
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -220,7 +220,7 @@ async def check_admin_rights_all(callback: CallbackQuery, user: dict, lang: str)
             is_admin = chat_member.status in ['administrator', 'creator']
             
             # Обновляем статус в базе данных
-            supabase_db.db.update_channel_admin_status(channel['id'], is_admin)
+            await supabase_db.db.update_channel_admin_status(channel['id'], is_admin)
             
             status = "✅ Администратор" if is_admin else "❌ Не администратор"
             results.append(f"**{channel['name']}**: {status}")
@@ -247,10 +247,10 @@ async def channel_id_filter(message):
 
 # Обработка текстовых сообщений для добавления канала (только если они похожи на ID канала)
 @router.message(F.text, channel_id_filter)
-async def handle_channel_input(message: Message, state: FSMContext):
+async def handle_channel_input(message: Message, state: FSMContext, db_user: dict = None):
     """Обработка ввода ID канала"""
     user_id = message.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     text = message.text.strip()
@@ -301,7 +301,7 @@ async def add_channel_direct(message: Message, user: dict, lang: str, identifier
             )
         
         # Добавляем канал в базу данных
-        channel = supabase_db.db.add_channel(
+        channel = await supabase_db.db.add_channel(
             chat_id=chat.id,
             name=chat.title or chat.username or str(chat.id),
             username=chat.username,
@@ -310,7 +310,7 @@ async def add_channel_direct(message: Message, user: dict, lang: str, identifier
         
         if channel:
             # Добавляем пользователя как админа канала
-            supabase_db.db.add_channel_admin(channel['id'], user_id, user_role)
+            await supabase_db.db.add_channel_admin(channel['id'], user_id, user_role)
             
             status_text = "✅ с правами администратора" if is_admin else "❓ без прав администратора"
             role_text = "👑 владелец" if user_role == "owner" else "⚙️ админ"
@@ -333,7 +333,7 @@ async def remove_channel_direct(message: Message, user: dict, lang: str, identif
     user_id = user.get("user_id")
     
     # Получаем каналы пользователя
-    channels = supabase_db.db.get_user_channels(user_id)
+    channels = await supabase_db.db.get_user_channels(user_id)
     
     # Находим канал
     channel = None
@@ -365,29 +365,29 @@ async def remove_channel_direct(message: Message, user: dict, lang: str, identif
     )
 
 @router.callback_query(F.data.startswith("remove_channel_confirm:"))
-async def confirm_remove_channel(callback: CallbackQuery):
+async def confirm_remove_channel(callback: CallbackQuery, db_user: dict = None, admin_channel_ids: set = None):
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     channel_id = int(callback.data.split(":", 1)[1])
     
     try:
         # Проверяем, что пользователь админ этого канала
-        if not supabase_db.db.is_channel_admin(channel_id, user_id):
+        if channel_id not in admin_channel_ids:
             await callback.message.edit_text("❌ У вас нет прав для удаления этого канала.")
             await callback.answer()
             return
         
         # Получаем информацию о канале
-        channel = supabase_db.db.get_channel(channel_id)
+        channel = await supabase_db.db.get_channel(channel_id)
         if not channel:
             await callback.message.edit_text("❌ Канал не найден.")
             await callback.answer()
             return
         
         # Удаляем канал (это удалит и все связанные данные через CASCADE)
-        if supabase_db.db.remove_channel(channel_id):
+        if await supabase_db.db.remove_channel(channel_id):
             await callback.message.edit_text(
                 f"✅ **Канал удален**\n\n"
                 f"**{channel['name']}** был удален.\n"
@@ -402,27 +402,27 @@ async def confirm_remove_channel(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("remove_channel_direct:"))
-async def confirm_remove_channel_direct(callback: CallbackQuery):
+async def confirm_remove_channel_direct(callback: CallbackQuery, db_user: dict = None, admin_channel_ids: set = None):
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     channel_id = int(callback.data.split(":", 1)[1])
     
     # Проверяем права пользователя
-    if not supabase_db.db.is_channel_admin(channel_id, user_id):
+    if channel_id not in admin_channel_ids:
         await callback.message.edit_text("❌ У вас нет прав для удаления этого канала.")
         await callback.answer()
         return
     
     # Получаем информацию о канале
-    channel = supabase_db.db.get_channel(channel_id)
+    channel = await supabase_db.db.get_channel(channel_id)
     if not channel:
         await callback.message.edit_text("❌ Канал не найден.")
         await callback.answer()
         return
     
-    if supabase_db.db.remove_channel(channel_id):
+    if await supabase_db.db.remove_channel(channel_id):
         await callback.message.edit_text(
             f"✅ **Канал удален**\n\n"
             f"**{channel['name']}** был удален.\n"
@@ -435,30 +435,30 @@ async def confirm_remove_channel_direct(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "remove_channel_cancel")
-async def cancel_remove_channel(callback: CallbackQuery):
+async def cancel_remove_channel(callback: CallbackQuery, db_user: dict = None):
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     await callback.message.edit_text("❌ Удаление канала отменено.")
     await callback.answer()
 
 @router.callback_query(F.data.startswith("channel_manage:"))
-async def manage_specific_channel(callback: CallbackQuery):
+async def manage_specific_channel(callback: CallbackQuery, db_user: dict = None, admin_channel_ids: set = None):
     """Управление конкретным каналом"""
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     channel_id = int(callback.data.split(":", 1)[1])
     
     # Проверяем права доступа
-    if not supabase_db.db.is_channel_admin(channel_id, user_id):
+    if channel_id not in admin_channel_ids:
         await callback.message.edit_text("❌ У вас нет доступа к этому каналу.")
         await callback.answer()
         return
     
-    channel = supabase_db.db.get_channel(channel_id)
+    channel = await supabase_db.db.get_channel(channel_id)
     if not channel:
         await callback.message.edit_text("❌ Канал не найден.")
         await callback.answer()
@@ -474,6 +474,12 @@ async def manage_specific_channel(callback: CallbackQuery):
     if channel.get('username'):
         text += f"**Username:** @{channel['username']}\n"
     
+    # Готовые счетчики из channel_post_stats
+    stats = (await supabase_db.db.get_channel_post_stats([channel_id])).get(channel_id)
+    if stats:
+        text += (f"\n📊 **Посты:** ⏰ {stats['scheduled']} | 📝 {stats['drafts']} | "
+                 f"✅ {stats['published']} | всего {stats['total']}\n")
+    
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🔄 Проверить права", callback_data=f"check_admin:{channel_id}")],
         [InlineKeyboardButton(text="📋 Посты канала", callback_data=f"channel_posts:{channel_id}")],
@@ -485,18 +491,18 @@ async def manage_specific_channel(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("check_admin:"))
-async def check_single_channel_admin(callback: CallbackQuery):
+async def check_single_channel_admin(callback: CallbackQuery, admin_channel_ids: set = None):
     """Проверить права администратора для одного канала"""
     user_id = callback.from_user.id
     channel_id = int(callback.data.split(":", 1)[1])
     
     # Проверяем права доступа
-    if not supabase_db.db.is_channel_admin(channel_id, user_id):
+    if channel_id not in admin_channel_ids:
         await callback.message.edit_text("❌ У вас нет доступа к этому каналу.")
         await callback.answer()
         return
     
-    channel = supabase_db.db.get_channel(channel_id)
+    channel = await supabase_db.db.get_channel(channel_id)
     if not channel:
         await callback.message.edit_text("❌ Канал не найден.")
         await callback.answer()
@@ -508,7 +514,7 @@ async def check_single_channel_admin(callback: CallbackQuery):
         is_admin = chat_member.status in ['administrator', 'creator']
         
         # Обновляем статус в базе данных
-        supabase_db.db.update_channel_admin_status(channel_id, is_admin)
+        await supabase_db.db.update_channel_admin_status(channel_id, is_admin)
         
         status = "✅ Администратор" if is_admin else "❌ Не администратор"
         text = (f"🔄 **Проверка завершена**\n\n"
@@ -531,25 +537,25 @@ async def check_single_channel_admin(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("channel_posts:"))
-async def show_channel_posts(callback: CallbackQuery):
+async def show_channel_posts(callback: CallbackQuery, admin_channel_ids: set = None):
     """Показать посты конкретного канала"""
     user_id = callback.from_user.id
     channel_id = int(callback.data.split(":", 1)[1])
     
     # Проверяем права доступа
-    if not supabase_db.db.is_channel_admin(channel_id, user_id):
+    if channel_id not in admin_channel_ids:
         await callback.message.edit_text("❌ У вас нет доступа к этому каналу.")
         await callback.answer()
         return
     
-    channel = supabase_db.db.get_channel(channel_id)
+    channel = await supabase_db.db.get_channel(channel_id)
     if not channel:
         await callback.message.edit_text("❌ Канал не найден.")
         await callback.answer()
         return
     
     # Получаем посты канала
-    posts = supabase_db.db.list_posts_by_channel(channel_id)
+    posts = await supabase_db.db.list_posts_by_channel(channel_id, projection="list_row")
     
     if not posts:
         text = f"📋 **Посты канала {channel['name']}**\n\n❌ Постов не найдено."
@@ -557,7 +563,7 @@ async def show_channel_posts(callback: CallbackQuery):
         text = f"📋 **Посты канала {channel['name']}**\n\n"
         for i, post in enumerate(posts[:10], 1):  # Показываем только первые 10
             status = "✅" if post.get('published') else "⏰" if post.get('publish_time') else "📝"
-            text += f"{i}. {status} {post.get('text', 'Без текста')[:30]}...\n"
+            text += f"{i}. {status} {(post.get('text_preview') or post.get('text') or 'Без текста')[:30]}...\n"
         
         if len(posts) > 10:
             text += f"\n... и еще {len(posts) - 10} постов"
@@ -12,6 +12,14 @@ import html
 
 router = Router()
 
+# Ответы на неудачное сохранение (статусы update_post_if)
+SAVE_ERRORS = {
+    "conflict": "⚠️ Пост уже изменил другой администратор. Показана актуальная версия",
+    "published": "❌ Нельзя редактировать опубликованный пост!",
+    "missing": "❌ Пост не найден!",
+    "error": "❌ Ошибка сохранения",
+}
+
 def get_edit_main_menu_keyboard(post_id: int, lang: str = "ru"):
     """Главное меню редактирования поста"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -66,10 +74,10 @@ def format_post_summary(post: dict, channel: dict = None) -> str:
     return text
 
 @router.message(Command("edit"))
-async def cmd_edit_post(message: Message, state: FSMContext):
+async def cmd_edit_post(message: Message, state: FSMContext, db_user: dict = None):
     """Редактировать пост по ID"""
     user_id = message.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     args = message.text.split(maxsplit=1)
@@ -98,7 +106,7 @@ async def cmd_edit_post(message: Message, state: FSMContext):
         return
     
     # Получаем пост
-    post = supabase_db.db.get_post(post_id)
+    post = await supabase_db.db.get_post_for_admin(post_id, user_id)
     if not post:
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="📋 Список постов", callback_data="posts_menu")],
@@ -108,7 +116,7 @@ async def cmd_edit_post(message: Message, state: FSMContext):
         return
     
     # Проверяем доступ через канал
-    if not supabase_db.db.is_channel_admin(post.get("channel_id"), user_id):
+    if not post["is_admin"]:
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="📋 Список постов", callback_data="posts_menu")],
             [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
@@ -125,14 +133,45 @@ async def cmd_edit_post(message: Message, state: FSMContext):
         return
     
     # Получаем информацию о канале
-    channel = supabase_db.db.get_channel(post.get("channel_id"))
+    channel = post.get("channels")
     
     # Показываем главное меню редактирования
     await show_edit_main_menu(message, post_id, post, user, lang)
 
-async def show_edit_main_menu(message: Message, post_id: int, post: dict, user: dict, lang: str):
+async def save_post_changes(state: FSMContext, post_id: int, changes: dict):
+    """Сохранить изменения, только если пост не менялся с момента открытия редактора
+    
+    Возвращает (post, status) из update_post_if. Версия из ответа (новая или,
+    при конфликте, актуальная) запоминается в состоянии для следующего сохранения.
+    """
+    data = await state.get_data()
+    if data.get("version") is None:
+        # Без версии изменения другого администратора затерлись бы молча:
+        # показываем актуальный пост как при конфликте
+        post = await supabase_db.db.get_post(post_id)
+        if not post:
+            return None, "missing"
+        await state.update_data(version=post.get("version"), original_post=post)
+        return post, "published" if post.get("published") else "conflict"
+    post, status = await supabase_db.db.update_post_if(post_id, data.get("version"), changes)
+    if post and status in ("ok", "conflict"):
+        await state.update_data(version=post.get("version"), original_post=post)
+    return post, status
+
+async def handle_save_failure(message: Message, post_id: int, post: dict, status: str, user: dict,
+                              user_channels: list = None) -> str:
+    """Показать актуальный пост при конфликте версий и вернуть текст ошибки"""
+    if status == "conflict" and post:
+        await show_edit_main_menu(message, post_id, post, user, user.get("language", "ru"), user_channels)
+    return SAVE_ERRORS.get(status, SAVE_ERRORS["error"])
+
+async def show_edit_main_menu(message: Message, post_id: int, post: dict, user: dict, lang: str,
+                              user_channels: list = None):
     """Показать главное меню редактирования"""
-    channel = supabase_db.db.get_channel(post.get("channel_id"))
+    # Канал берем из поста или из каналов пользователя, без лишнего запроса
+    channel = post.get("channels") or next(
+        (ch for ch in user_channels or [] if ch["id"] == post.get("channel_id")), None
+    ) or await supabase_db.db.get_channel(post.get("channel_id"))
     
     text = format_post_summary(post, channel)
     keyboard = get_edit_main_menu_keyboard(post_id, lang)
@@ -146,23 +185,23 @@ async def show_edit_main_menu(message: Message, post_id: int, post: dict, user:
         await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
 
 # Обработчики для глобальных callback'ов из main.py
-async def handle_edit_field_callback(callback: CallbackQuery, state: FSMContext):
+async def handle_edit_field_callback(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Обработка редактирования поля (вызывается из main.py)"""
     parts = callback.data.split(":")
     post_id = int(parts[1])
     field = parts[2]
     
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     
     # Получаем пост
-    post = supabase_db.db.get_post(post_id)
+    post = await supabase_db.db.get_post_for_admin(post_id, user_id)
     if not post:
         await callback.answer("❌ Пост не найден!")
         return
     
     # Проверяем доступ
-    if not supabase_db.db.is_channel_admin(post.get("channel_id"), user_id):
+    if not post["is_admin"]:
         await callback.answer("❌ У вас нет доступа к этому посту!")
         return
     
@@ -175,6 +214,7 @@ async def handle_edit_field_callback(callback: CallbackQuery, state: FSMContext)
         "edit_mode": True,
         "post_id": post_id,
         "original_post": post,
+        "version": post.get("version"),
         "current_field": field,
         "changes": {}
     })
@@ -182,20 +222,20 @@ async def handle_edit_field_callback(callback: CallbackQuery, state: FSMContext)
     await start_field_edit(callback.message, state, field, post, user)
     await callback.answer()
 
-async def handle_edit_recreate(callback: CallbackQuery, state: FSMContext):
+async def handle_edit_recreate(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Полное пересоздание поста"""
     post_id = int(callback.data.split(":", 1)[1])
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     
     # Получаем пост
-    post = supabase_db.db.get_post(post_id)
+    post = await supabase_db.db.get_post_for_admin(post_id, user_id)
     if not post:
         await callback.answer("❌ Пост не найден!")
         return
     
     # Проверяем доступ
-    if not supabase_db.db.is_channel_admin(post.get("channel_id"), user_id):
+    if not post["is_admin"]:
         await callback.answer("❌ У вас нет доступа к этому посту!")
         return
     
@@ -208,6 +248,7 @@ async def handle_edit_recreate(callback: CallbackQuery, state: FSMContext):
         "edit_mode": True,
         "recreate_mode": True,
         "post_id": post_id,
+        "version": post.get("version"),
         "user_id": user_id,
         "text": post.get("text"),
         "media_type": post.get("media_type"),
@@ -237,7 +278,7 @@ async def handle_edit_recreate(callback: CallbackQuery, state: FSMContext):
     await start_text_step(callback.message, state, user.get("language", "ru"))
     await callback.answer()
 
-async def handle_edit_menu_return(callback: CallbackQuery, state: FSMContext):
+async def handle_edit_menu_return(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Возврат в главное меню редактирования"""
     data = await state.get_data()
     post_id = data.get("post_id")
@@ -247,8 +288,8 @@ async def handle_edit_menu_return(callback: CallbackQuery, state: FSMContext):
         return
     
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
-    post = supabase_db.db.get_post(post_id)
+    user = db_user
+    post = await supabase_db.db.get_post_for_admin(post_id, user_id)
     
     if not post:
         await callback.answer("❌ Пост не найден!")
@@ -268,9 +309,9 @@ async def handle_edit_confirm_callback(callback: CallbackQuery, state: FSMContex
         return
     
     # Применяем изменения
-    success = supabase_db.db.update_post(post_id, changes)
+    post, status = await save_post_changes(state, post_id, changes)
     
-    if success:
+    if status == "ok":
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="👀 Просмотр поста", callback_data=f"post_full_view:{post_id}")],
             [InlineKeyboardButton(text="✏️ Продолжить редактирование", callback_data=f"edit_menu:{post_id}")],
@@ -286,14 +327,14 @@ async def handle_edit_confirm_callback(callback: CallbackQuery, state: FSMContex
     else:
         await callback.message.edit_text(
             f"❌ **Ошибка сохранения**\n\n"
-            f"Не удалось сохранить изменения.",
+            f"{SAVE_ERRORS.get(status, SAVE_ERRORS['error'])}",
             parse_mode="Markdown"
         )
     
     await state.clear()
     await callback.answer()
 
-async def handle_edit_skip(callback: CallbackQuery, state: FSMContext):
+async def handle_edit_skip(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Пропустить редактирование поля"""
     data = await state.get_data()
     post_id = data.get("post_id")
@@ -303,13 +344,13 @@ async def handle_edit_skip(callback: CallbackQuery, state: FSMContext):
         return
     
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
-    post = supabase_db.db.get_post(post_id)
+    user = db_user
+    post = await supabase_db.db.get_post_for_admin(post_id, user_id)
     
     await show_edit_main_menu(callback.message, post_id, post, user, user.get("language", "ru"))
     await callback.answer()
 
-async def handle_edit_save(callback: CallbackQuery, state: FSMContext):
+async def handle_edit_save(callback: CallbackQuery, state: FSMContext, db_user: dict = None, user_channels: list = None):
     """Сохранить изменения поля"""
     data = await state.get_data()
     post_id = data.get("post_id")
@@ -322,17 +363,14 @@ async def handle_edit_save(callback: CallbackQuery, state: FSMContext):
     
     # Сохраняем изменение
     changes = {field: new_value}
-    success = supabase_db.db.update_post(post_id, changes)
+    post, status = await save_post_changes(state, post_id, changes)
     
-    if success:
-        user_id = callback.from_user.id
-        user = supabase_db.db.get_user(user_id)
-        post = supabase_db.db.get_post(post_id)
-        
-        await show_edit_main_menu(callback.message, post_id, post, user, user.get("language", "ru"))
+    if status == "ok":
+        user = db_user
+        await show_edit_main_menu(callback.message, post_id, post, user, user.get("language", "ru"), user_channels)
         await callback.answer("✅ Изменения сохранены")
     else:
-        await callback.answer("❌ Ошибка сохранения")
+        await callback.answer(await handle_save_failure(callback.message, post_id, post, status, db_user, user_channels))
 
 async def handle_edit_cancel(callback: CallbackQuery, state: FSMContext):
     """Отменить редактирование"""
@@ -574,8 +612,8 @@ async def start_edit_channel_step(message: Message, state: FSMContext, lang: str
         return
     
     # Получаем каналы пользователя
-    channels = supabase_db.db.get_user_channels(user_id)
-    current_channel = supabase_db.db.get_channel(post.get("channel_id"))
+    channels = await supabase_db.db.get_user_channels(user_id)
+    current_channel = post.get("channels") or await supabase_db.db.get_channel(post.get("channel_id"))
     
     text = (
         "📺 **Редактирование канала**\n\n"
@@ -612,7 +650,7 @@ async def start_edit_channel_step(message: Message, state: FSMContext, lang: str
 
 # Обработчики для callback'ов редактирования
 @router.callback_query(F.data.startswith("edit_format_"))
-async def handle_edit_format_selection(callback: CallbackQuery, state: FSMContext):
+async def handle_edit_format_selection(callback: CallbackQuery, state: FSMContext, db_user: dict = None, user_channels: list = None):
     """Обработка выбора формата"""
     format_map = {
         "edit_format_html": "HTML",
@@ -626,20 +664,17 @@ async def handle_edit_format_selection(callback: CallbackQuery, state: FSMContex
     
     # Сохраняем изменение
     changes = {"parse_mode": new_format}
-    success = supabase_db.db.update_post(post_id, changes)
+    post, status = await save_post_changes(state, post_id, changes)
     
-    if success:
-        user_id = callback.from_user.id
-        user = supabase_db.db.get_user(user_id)
-        post = supabase_db.db.get_post(post_id)
-        
-        await show_edit_main_menu(callback.message, post_id, post, user, user.get("language", "ru"))
+    if status == "ok":
+        user = db_user
+        await show_edit_main_menu(callback.message, post_id, post, user, user.get("language", "ru"), user_channels)
         await callback.answer(f"✅ Формат изменен на {new_format or 'без форматирования'}")
     else:
-        await callback.answer("❌ Ошибка сохранения")
+        await callback.answer(await handle_save_failure(callback.message, post_id, post, status, db_user, user_channels))
 
 @router.callback_query(F.data.startswith("edit_time_"))
-async def handle_edit_time_selection(callback: CallbackQuery, state: FSMContext):
+async def handle_edit_time_selection(callback: CallbackQuery, state: FSMContext, db_user: dict = None, user_channels: list = None):
     """Обработка выбора времени"""
     action = callback.data.split("_")[-1]  # now, draft
     data = await state.get_data()
@@ -660,28 +695,25 @@ async def handle_edit_time_selection(callback: CallbackQuery, state: FSMContext)
         return
     
     # Сохраняем изменение
-    success = supabase_db.db.update_post(post_id, changes)
+    post, status = await save_post_changes(state, post_id, changes)
     
-    if success:
-        user_id = callback.from_user.id
-        user = supabase_db.db.get_user(user_id)
-        post = supabase_db.db.get_post(post_id)
-        
-        await show_edit_main_menu(callback.message, post_id, post, user, user.get("language", "ru"))
-        status = "немедленной публикации" if action == "now" else "черновика"
-        await callback.answer(f"✅ Время изменено на {status}")
+    if status == "ok":
+        user = db_user
+        await show_edit_main_menu(callback.message, post_id, post, user, user.get("language", "ru"), user_channels)
+        status_text = "немедленной публикации" if action == "now" else "черновика"
+        await callback.answer(f"✅ Время изменено на {status_text}")
     else:
-        await callback.answer("❌ Ошибка сохранения")
+        await callback.answer(await handle_save_failure(callback.message, post_id, post, status, db_user, user_channels))
 
 @router.callback_query(F.data.startswith("edit_channel_select:"))
-async def handle_edit_channel_selection(callback: CallbackQuery, state: FSMContext):
+async def handle_edit_channel_selection(callback: CallbackQuery, state: FSMContext, db_user: dict = None, user_channels: list = None):
     """Обработка выбора канала"""
     channel_id = int(callback.data.split(":", 1)[1])
     data = await state.get_data()
     post_id = data.get("post_id")
     
     # Получаем новый канал для chat_id
-    new_channel = supabase_db.db.get_channel(channel_id)
+    new_channel = await supabase_db.db.get_channel(channel_id)
     if not new_channel:
         await callback.answer("❌ Канал не найден")
         return
@@ -691,40 +723,34 @@ async def handle_edit_channel_selection(callback: CallbackQuery, state: FSMConte
         "channel_id": channel_id,
         "chat_id": new_channel["chat_id"]
     }
-    success = supabase_db.db.update_post(post_id, changes)
+    post, status = await save_post_changes(state, post_id, changes)
     
-    if success:
-        user_id = callback.from_user.id
-        user = supabase_db.db.get_user(user_id)
-        post = supabase_db.db.get_post(post_id)
-        
-        await show_edit_main_menu(callback.message, post_id, post, user, user.get("language", "ru"))
+    if status == "ok":
+        user = db_user
+        await show_edit_main_menu(callback.message, post_id, post, user, user.get("language", "ru"), user_channels)
         await callback.answer(f"✅ Канал изменен на {new_channel['name']}")
     else:
-        await callback.answer("❌ Ошибка сохранения")
+        await callback.answer(await handle_save_failure(callback.message, post_id, post, status, db_user, user_channels))
 
 # Обработчики для удаления/очистки
 @router.callback_query(F.data == "edit_clear_text")
-async def handle_edit_clear_text(callback: CallbackQuery, state: FSMContext):
+async def handle_edit_clear_text(callback: CallbackQuery, state: FSMContext, db_user: dict = None, user_channels: list = None):
     """Очистить текст поста"""
     data = await state.get_data()
     post_id = data.get("post_id")
     
     changes = {"text": None}
-    success = supabase_db.db.update_post(post_id, changes)
+    post, status = await save_post_changes(state, post_id, changes)
     
-    if success:
-        user_id = callback.from_user.id
-        user = supabase_db.db.get_user(user_id)
-        post = supabase_db.db.get_post(post_id)
-        
-        await show_edit_main_menu(callback.message, post_id, post, user, user.get("language", "ru"))
+    if status == "ok":
+        user = db_user
+        await show_edit_main_menu(callback.message, post_id, post, user, user.get("language", "ru"), user_channels)
         await callback.answer("✅ Текст удален")
     else:
-        await callback.answer("❌ Ошибка сохранения")
+        await callback.answer(await handle_save_failure(callback.message, post_id, post, status, db_user, user_channels))
 
 @router.callback_query(F.data == "edit_remove_media")
-async def handle_edit_remove_media(callback: CallbackQuery, state: FSMContext):
+async def handle_edit_remove_media(callback: CallbackQuery, state: FSMContext, db_user: dict = None, user_channels: list = None):
     """Удалить медиа поста"""
     data = await state.get_data()
     post_id = data.get("post_id")
@@ -733,40 +759,34 @@ async def handle_edit_remove_media(callback: CallbackQuery, state: FSMContext):
         "media_type": None,
         "media_id": None
     }
-    success = supabase_db.db.update_post(post_id, changes)
+    post, status = await save_post_changes(state, post_id, changes)
     
-    if success:
-        user_id = callback.from_user.id
-        user = supabase_db.db.get_user(user_id)
-        post = supabase_db.db.get_post(post_id)
-        
-        await show_edit_main_menu(callback.message, post_id, post, user, user.get("language", "ru"))
+    if status == "ok":
+        user = db_user
+        await show_edit_main_menu(callback.message, post_id, post, user, user.get("language", "ru"), user_channels)
         await callback.answer("✅ Медиа удалено")
     else:
-        await callback.answer("❌ Ошибка сохранения")
+        await callback.answer(await handle_save_failure(callback.message, post_id, post, status, db_user, user_channels))
 
 @router.callback_query(F.data == "edit_remove_buttons")
-async def handle_edit_remove_buttons(callback: CallbackQuery, state: FSMContext):
+async def handle_edit_remove_buttons(callback: CallbackQuery, state: FSMContext, db_user: dict = None, user_channels: list = None):
     """Удалить кнопки поста"""
     data = await state.get_data()
     post_id = data.get("post_id")
     
     changes = {"buttons": None}
-    success = supabase_db.db.update_post(post_id, changes)
+    post, status = await save_post_changes(state, post_id, changes)
     
-    if success:
-        user_id = callback.from_user.id
-        user = supabase_db.db.get_user(user_id)
-        post = supabase_db.db.get_post(post_id)
-        
-        await show_edit_main_menu(callback.message, post_id, post, user, user.get("language", "ru"))
+    if status == "ok":
+        user = db_user
+        await show_edit_main_menu(callback.message, post_id, post, user, user.get("language", "ru"), user_channels)
         await callback.answer("✅ Кнопки удалены")
     else:
-        await callback.answer("❌ Ошибка сохранения")
+        await callback.answer(await handle_save_failure(callback.message, post_id, post, status, db_user, user_channels))
 
 # Обработчики для ввода текста при редактировании
 @router.message(PostCreationFlow.step_text, F.text)
-async def handle_edit_text_input(message: Message, state: FSMContext):
+async def handle_edit_text_input(message: Message, state: FSMContext, db_user: dict = None, user_channels: list = None):
     """Обработка нового текста при редактировании"""
     data = await state.get_data()
     
@@ -779,8 +799,8 @@ async def handle_edit_text_input(message: Message, state: FSMContext):
     # Проверяем команды
     if message.text.lower().strip() in ["skip", "пропустить"]:
         user_id = message.from_user.id
-        user = supabase_db.db.get_user(user_id)
-        post = supabase_db.db.get_post(post_id)
+        user = db_user
+        post = await supabase_db.db.get_post_for_admin(post_id, user_id)
         await show_edit_main_menu(message, post_id, post, user, user.get("language", "ru"))
         return
     
@@ -790,17 +810,14 @@ async def handle_edit_text_input(message: Message, state: FSMContext):
     
     # Сохраняем новый текст
     changes = {"text": message.text}
-    success = supabase_db.db.update_post(post_id, changes)
+    post, status = await save_post_changes(state, post_id, changes)
     
-    if success:
-        user_id = message.from_user.id
-        user = supabase_db.db.get_user(user_id)
-        post = supabase_db.db.get_post(post_id)
-        
-        await show_edit_main_menu(message, post_id, post, user, user.get("language", "ru"))
+    if status == "ok":
+        user = db_user
+        await show_edit_main_menu(message, post_id, post, user, user.get("language", "ru"), user_channels)
         await message.answer("✅ Текст обновлен!")
     else:
-        await message.answer("❌ Ошибка сохранения текста")
+        await message.answer(await handle_save_failure(message, post_id, post, status, db_user, user_channels))
 
 async def handle_edit_cancel_text(message: Message, state: FSMContext):
     """Отменить редактирование через текстовую команду"""
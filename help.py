@@ -7,10 +7,10 @@ from __init__ import TEXTS
 router = Router()
 
 @router.message(Command("help"))
-async def cmd_help(message: Message):
+async def cmd_help(message: Message, db_user: dict = None):
     user_id = message.from_user.id
     lang = "ru"
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     if user:
         lang = user.get("language", "ru")
     
@@ -0,0 +1,104 @@
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from breaker import CircuitBreaker, CircuitOpenError
+
+
+def make_session(base_url, headers, pool_size: int = 20, keepalive: int = 20, keepalive_expiry: float = 60.0,
+                 http2: bool = False, timeout: float = 5.0, connect_timeout: float = 2.0,
+                 breaker: CircuitBreaker = None, on_request=None) -> httpx.Client:
+    """httpx client for PostgREST with explicit pool limits, keep-alive and timeouts.
+
+    ``on_request(request)`` is called for every request actually sent.
+    """
+    if http2 and importlib.util.find_spec("h2") is None:
+        print("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+        http2 = False
+    transport = httpx.HTTPTransport(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=min(keepalive, pool_size),
+            keepalive_expiry=keepalive_expiry,
+        ),
+    )
+    if on_request is not None:
+        # Inside the breaker: requests it rejects are never sent and not counted
+        transport = HookTransport(transport, on_request)
+    if breaker is not None:
+        transport = BreakerTransport(transport, breaker)
+    return httpx.Client(
+        base_url=base_url,
+        headers=headers,
+        follow_redirects=True,
+        transport=transport,
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+    )
+
+
+def install_postgrest_session(client, **settings) -> httpx.Client:
+    """Replace the PostgREST session of a supabase client with a tuned one."""
+    postgrest = client.postgrest
+    old = postgrest.session
+    postgrest.session = make_session(old.base_url, old.headers, **settings)
+    old.close()
+    return postgrest.session
+
+
+def prewarm(probe, connections: int) -> int:
+    """Open ``connections`` pooled connections by running ``probe`` concurrently; returns the successes."""
+    if connections <= 0:
+        return 0
+
+    def run(_):
+        try:
+            probe()
+            return True
+        except Exception as e:
+            print(f"Connection pre-warm failed: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=connections, thread_name_prefix="supabase-prewarm") as executor:
+        return sum(executor.map(run, range(connections)))
+
+
+class BreakerTransport(httpx.BaseTransport):
+    """httpx transport that routes every request through a CircuitBreaker."""
+
+    def __init__(self, transport: httpx.BaseTransport, breaker: CircuitBreaker):
+        self.transport = transport
+        self.breaker = breaker
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.breaker.name} circuit is open")
+        try:
+            response = self.transport.handle_request(request)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class HookTransport(httpx.BaseTransport):
+    """httpx transport that reports every request to ``on_request`` before sending it."""
+
+    def __init__(self, transport: httpx.BaseTransport, on_request):
+        self.transport = transport
+        self.on_request = on_request
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.on_request(request)
+        return self.transport.handle_request(request)
+
+    def close(self):
+        self.transport.close()
@@ -2,11 +2,17 @@ from aiogram import Router, F
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.filters import Command
 import supabase_db
+from storage import KEYSET_ORDER, encode_cursor
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
 router = Router()
 
+POSTS_PER_PAGE = 5
+
+# Направление в callback posts_page:<тип>:<страница>:<направление>:<курсор>
+PAGE_DIRECTIONS = {"a": "after", "b": "before", "l": "last"}
+
 def format_time_for_user_simple(time_str: str, user: dict) -> str:
     """Простое форматирование времени для списков"""
     try:
@@ -45,16 +51,34 @@ def get_posts_main_menu_keyboard(lang: str = "ru"):
         ]
     ])
 
-def get_post_list_keyboard(posts: list, page: int = 0, posts_per_page: int = 5, list_type: str = "all"):
-    """Создать клавиатуру со списком постов с пагинацией"""
+def get_post_list_keyboard(posts: list, page: int = 0, posts_per_page: int = 5, list_type: str = "all", total: int = None):
+    """Создать клавиатуру со списком постов с пагинацией
+    
+    Если передан total, posts - уже выбранная страница (серверная пагинация).
+    Для списков из KEYSET_ORDER кнопки несут курсор первого/последнего поста
+    страницы, а не номер страницы для OFFSET.
+    """
     buttons = []
     
-    start_idx = page * posts_per_page
-    end_idx = min(start_idx + posts_per_page, len(posts))
+    server_side = total is not None
+    if total is None:
+        total = len(posts)
+        start_idx = page * posts_per_page
+        page_posts = posts[start_idx:start_idx + posts_per_page]
+    else:
+        start_idx = page * posts_per_page
+        page_posts = posts
+    end_idx = start_idx + len(page_posts)
+    keyset = server_side and list_type in KEYSET_ORDER
+    
+    def page_data(target: int, direction: str = "a", post: dict = None) -> str:
+        if not keyset:
+            return f"posts_page:{list_type}:{target}"
+        data = f"posts_page:{list_type}:{target}:{direction}"
+        return f"{data}:{encode_cursor(post, list_type)}" if post else data
     
     # Кнопки постов
-    for i in range(start_idx, end_idx):
-        post = posts[i]
+    for post in page_posts:
         
         # Определяем статус поста
         if post.get('published'):
@@ -72,7 +96,7 @@ def get_post_list_keyboard(posts: list, page: int = 0, posts_per_page: int = 5,
             channel_name = post['channels'].get('name', 'Канал')[:10]
         
         # Краткий текст поста
-        post_text = post.get('text', 'Без текста')[:15]
+        post_text = (post.get('text_preview') or post.get('text') or 'Без текста')[:15]
         
         button_text = f"{status} #{post['id']} {channel_name} - {post_text}..."
         buttons.append([InlineKeyboardButton(
@@ -85,28 +109,28 @@ def get_post_list_keyboard(posts: list, page: int = 0, posts_per_page: int = 5,
     if page > 0:
         nav_buttons.append(InlineKeyboardButton(
             text="⬅️ Назад", 
-            callback_data=f"posts_page:{list_type}:{page-1}"
+            callback_data=page_data(page - 1, "b", page_posts[0] if page_posts else None)
         ))
     
-    if end_idx < len(posts):
+    if end_idx < total:
         nav_buttons.append(InlineKeyboardButton(
             text="Вперед ➡️", 
-            callback_data=f"posts_page:{list_type}:{page+1}"
+            callback_data=page_data(page + 1, "a", page_posts[-1] if page_posts else None)
         ))
     
     if nav_buttons:
         buttons.append(nav_buttons)
     
     # Кнопки управления страницами
-    if len(posts) > posts_per_page:
-        total_pages = (len(posts) + posts_per_page - 1) // posts_per_page
+    if total > posts_per_page:
+        total_pages = (total + posts_per_page - 1) // posts_per_page
         page_info_text = f"📄 {page + 1}/{total_pages}"
         
         page_buttons = []
         if page > 0:
-            page_buttons.append(InlineKeyboardButton(text="⏪ Первая", callback_data=f"posts_page:{list_type}:0"))
+            page_buttons.append(InlineKeyboardButton(text="⏪ Первая", callback_data=page_data(0)))
         if page < total_pages - 1:
-            page_buttons.append(InlineKeyboardButton(text="⏩ Последняя", callback_data=f"posts_page:{list_type}:{total_pages-1}"))
+            page_buttons.append(InlineKeyboardButton(text="⏩ Последняя", callback_data=page_data(total_pages - 1, "l")))
         
         if page_buttons:
             buttons.append(page_buttons)
@@ -120,10 +144,10 @@ def get_post_list_keyboard(posts: list, page: int = 0, posts_per_page: int = 5,
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 @router.message(Command("list"))
-async def cmd_list_posts(message: Message):
+async def cmd_list_posts(message: Message, db_user: dict = None):
     """Показать список постов"""
     user_id = message.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     await show_posts_menu(message, user, lang)
@@ -134,18 +158,15 @@ async def show_posts_menu(message, user, lang):
     
     # Получаем статистику
     try:
-        all_posts = supabase_db.db.list_posts(user_id=user_id, only_pending=False) or []
-        scheduled = [p for p in all_posts if not p.get('published') and not p.get('draft') and p.get('publish_time')]
-        drafts = [p for p in all_posts if p.get('draft')]
-        published = [p for p in all_posts if p.get('published')]
+        counts = await supabase_db.db.count_posts_by_status(user_id)
         
         text = (
             "📋 **Управление постами**\n\n"
             f"📊 **Статистика:**\n"
-            f"⏰ Запланированных: {len(scheduled)}\n"
-            f"📝 Черновиков: {len(drafts)}\n"
-            f"✅ Опубликованных: {len(published)}\n"
-            f"📋 Всего: {len(all_posts)}\n\n"
+            f"⏰ Запланированных: {counts['scheduled']}\n"
+            f"📝 Черновиков: {counts['drafts']}\n"
+            f"✅ Опубликованных: {counts['published']}\n"
+            f"📋 Всего: {counts['total']}\n\n"
             f"Выберите категорию для просмотра:"
         )
     except Exception as e:
@@ -160,25 +181,23 @@ async def show_posts_menu(message, user, lang):
         await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
 
 @router.callback_query(F.data == "posts_menu")
-async def callback_posts_menu(callback: CallbackQuery):
+async def callback_posts_menu(callback: CallbackQuery, db_user: dict = None):
     """Callback для главного меню постов"""
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
-    if not user:
-        user = supabase_db.db.ensure_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     await show_posts_menu(callback.message, user, lang)
     await callback.answer()
 
 @router.callback_query(F.data == "posts_scheduled")
-async def callback_posts_scheduled(callback: CallbackQuery):
+async def callback_posts_scheduled(callback: CallbackQuery, db_user: dict = None):
     """Показать запланированные посты с пагинацией"""
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     
     try:
-        posts = supabase_db.db.get_scheduled_posts_by_channel(user_id) or []
+        posts, total = await supabase_db.db.list_posts_keyset(user_id, "scheduled", page_size=POSTS_PER_PAGE)
         
         if not posts:
             text = "⏰ **Запланированные посты**\n\n❌ Нет запланированных постов."
@@ -188,8 +207,8 @@ async def callback_posts_scheduled(callback: CallbackQuery):
             ])
             await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
         else:
-            text = f"⏰ **Запланированные посты** ({len(posts)})\n\n"
-            keyboard = get_post_list_keyboard(posts, 0, 5, "scheduled")
+            text = f"⏰ **Запланированные посты** ({total})\n\n"
+            keyboard = get_post_list_keyboard(posts, 0, POSTS_PER_PAGE, "scheduled", total)
             
             await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
             
@@ -204,13 +223,13 @@ async def callback_posts_scheduled(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "posts_drafts")
-async def callback_posts_drafts(callback: CallbackQuery):
+async def callback_posts_drafts(callback: CallbackQuery, db_user: dict = None):
     """Показать черновики с пагинацией"""
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     
     try:
-        posts = supabase_db.db.get_draft_posts_by_channel(user_id) or []
+        posts, total = await supabase_db.db.list_posts_keyset(user_id, "drafts", page_size=POSTS_PER_PAGE)
         
         if not posts:
             text = "📝 **Черновики**\n\n❌ Нет черновиков."
@@ -220,8 +239,8 @@ async def callback_posts_drafts(callback: CallbackQuery):
             ])
             await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
         else:
-            text = f"📝 **Черновики** ({len(posts)})\n\n"
-            keyboard = get_post_list_keyboard(posts, 0, 5, "drafts")
+            text = f"📝 **Черновики** ({total})\n\n"
+            keyboard = get_post_list_keyboard(posts, 0, POSTS_PER_PAGE, "drafts", total)
             
             await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
             
@@ -236,14 +255,15 @@ async def callback_posts_drafts(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "posts_published")
-async def callback_posts_published(callback: CallbackQuery):
+async def callback_posts_published(callback: CallbackQuery, db_user: dict = None):
     """Показать опубликованные посты с пагинацией"""
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     
     try:
-        all_posts = supabase_db.db.list_posts(user_id=user_id, only_pending=False) or []
-        published_posts = [p for p in all_posts if p.get('published')]
+        published_posts, total = await supabase_db.db.list_posts_keyset(
+            user_id, "published", page_size=POSTS_PER_PAGE, include_archive=True
+        )
         
         if not published_posts:
             text = "✅ **Опубликованные посты**\n\n❌ Нет опубликованных постов."
@@ -253,10 +273,9 @@ async def callback_posts_published(callback: CallbackQuery):
             ])
             await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
         else:
-            text = f"✅ **Опубликованные посты** ({len(published_posts)})\n\n"
-            # Сортируем по дате создания (новые сначала)
-            published_posts.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-            keyboard = get_post_list_keyboard(published_posts, 0, 5, "published")
+            text = f"✅ **Опубликованные посты** ({total})\n\n"
+            # Новые сначала (сортировка на стороне БД)
+            keyboard = get_post_list_keyboard(published_posts, 0, POSTS_PER_PAGE, "published", total)
             
             await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
             
@@ -271,13 +290,13 @@ async def callback_posts_published(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "posts_all")
-async def callback_posts_all(callback: CallbackQuery):
+async def callback_posts_all(callback: CallbackQuery, db_user: dict = None):
     """Показать все посты с пагинацией"""
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     
     try:
-        posts = supabase_db.db.list_posts(user_id=user_id, only_pending=False) or []
+        posts, total = await supabase_db.db.list_posts_page(user_id, "all", 0, POSTS_PER_PAGE)
         
         if not posts:
             text = "📋 **Все посты**\n\n❌ У вас пока нет постов."
@@ -287,16 +306,9 @@ async def callback_posts_all(callback: CallbackQuery):
             ])
             await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
         else:
-            # Сортируем посты: сначала запланированные, потом черновики, потом опубликованные
-            scheduled = [p for p in posts if not p.get('published') and not p.get('draft') and p.get('publish_time')]
-            drafts = [p for p in posts if p.get('draft')]
-            published = [p for p in posts if p.get('published')]
-            published.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-            
-            sorted_posts = scheduled + drafts + published
-            
-            text = f"📋 **Все посты** ({len(posts)})\n\n"
-            keyboard = get_post_list_keyboard(sorted_posts, 0, 5, "all")
+            # Сначала запланированные, потом черновики, потом опубликованные (сортирует БД)
+            text = f"📋 **Все посты** ({total})\n\n"
+            keyboard = get_post_list_keyboard(posts, 0, POSTS_PER_PAGE, "all", total)
             
             await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
             
@@ -311,39 +323,45 @@ async def callback_posts_all(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("posts_page:"))
-async def callback_posts_page(callback: CallbackQuery):
-    """Обработка пагинации постов"""
+async def callback_posts_page(callback: CallbackQuery, db_user: dict = None):
+    """Обработка пагинации постов (курсорной для списков по статусу)"""
     parts = callback.data.split(":")
     list_type = parts[1]
     page = int(parts[2])
+    direction = PAGE_DIRECTIONS.get(parts[3], "after") if len(parts) > 3 else None
+    cursor = parts[4] if len(parts) > 4 else None
     
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
+    
+    titles = {
+        "scheduled": "⏰ **Запланированные посты**",
+        "drafts": "📝 **Черновики**",
+        "published": "✅ **Опубликованные посты**",
+        "all": "📋 **Все посты**",
+    }
     
     try:
-        if list_type == "scheduled":
-            posts = supabase_db.db.get_scheduled_posts_by_channel(user_id) or []
-            title = "⏰ **Запланированные посты**"
-        elif list_type == "drafts":
-            posts = supabase_db.db.get_draft_posts_by_channel(user_id) or []
-            title = "📝 **Черновики**"
-        elif list_type == "published":
-            all_posts = supabase_db.db.list_posts(user_id=user_id, only_pending=False) or []
-            posts = [p for p in all_posts if p.get('published')]
-            posts.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-            title = "✅ **Опубликованные посты**"
-        else:  # all
-            posts = supabase_db.db.list_posts(user_id=user_id, only_pending=False) or []
-            # Сортируем
-            scheduled = [p for p in posts if not p.get('published') and not p.get('draft') and p.get('publish_time')]
-            drafts = [p for p in posts if p.get('draft')]
-            published = [p for p in posts if p.get('published')]
-            published.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-            posts = scheduled + drafts + published
-            title = "📋 **Все посты**"
+        if list_type not in titles:
+            list_type = "all"
+        if list_type in KEYSET_ORDER:
+            # История опубликованных включает архив
+            posts, total = await supabase_db.db.list_posts_keyset(
+                user_id, list_type, cursor, direction or "after", POSTS_PER_PAGE,
+                include_archive=list_type == "published"
+            )
+            if not cursor and direction != "last":
+                page = 0
+            elif direction == "before" and len(posts) < POSTS_PER_PAGE:
+                # Перед курсором меньше страницы постов - это начало списка
+                page = 0
+        else:
+            posts, total = await supabase_db.db.list_posts_page(user_id, list_type, page, POSTS_PER_PAGE)
+        # Страница могла исчезнуть после удаления/публикации постов
+        page = min(page, max(total - 1, 0) // POSTS_PER_PAGE)
         
-        text = f"{title} ({len(posts)})\n\n"
-        keyboard = get_post_list_keyboard(posts, page, 5, list_type)
+        text = f"{titles[list_type]} ({total})\n\n"
+        keyboard = get_post_list_keyboard(posts, page, POSTS_PER_PAGE, list_type, total)
         
         await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
         
@@ -359,24 +377,24 @@ async def callback_page_info(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("post_view:"))
-async def callback_post_view(callback: CallbackQuery):
+async def callback_post_view(callback: CallbackQuery, db_user: dict = None):
     """Полный просмотр конкретного поста (ИСПРАВЛЕНО)"""
     post_id = int(callback.data.split(":", 1)[1])
     user_id = callback.from_user.id
     
     # Получаем пост
-    post = supabase_db.db.get_post(post_id)
+    post = await supabase_db.db.get_post_for_admin(post_id, user_id, include_archive=True)
     if not post:
         await callback.answer("❌ Пост не найден!")
         return
     
     # Проверяем доступ через канал
-    if not supabase_db.db.is_channel_admin(post.get("channel_id"), user_id):
+    if not post["is_admin"]:
         await callback.answer("❌ У вас нет доступа к этому посту!")
         return
     
     # Получаем пользователя для форматирования времени
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     
     # Отправляем полный просмотр поста
     try:
@@ -387,7 +405,7 @@ async def callback_post_view(callback: CallbackQuery):
         await send_post_preview_safe(callback.message, post)
         
         # Отправляем информацию с кнопками как второе сообщение
-        channel = supabase_db.db.get_channel(post['channel_id'])
+        channel = post.get("channels")
         channel_name = channel['name'] if channel else 'Неизвестный канал'
         
         info_text = f"👀 **Пост #{post_id}**\n\n"
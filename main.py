@@ -14,9 +14,44 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-
-if not BOT_TOKEN or not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("Missing BOT_TOKEN or SUPABASE_URL or SUPABASE_KEY in environment")
+# Optional read replica for list/statistics queries
+SUPABASE_REPLICA_URL = os.getenv("SUPABASE_REPLICA_URL")
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "10"))
+# "supabase" (default) or "sqlite" for a local single-node database
+DB_BACKEND = os.getenv("DB_BACKEND", "supabase").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "botautopub.sqlite3")
+DB_MAX_WORKERS = int(os.getenv("DB_MAX_WORKERS", "8"))
+DB_QUERY_BUDGET = int(os.getenv("DB_QUERY_BUDGET", "4"))
+# Deadline of one DB read, seconds (writes have none, see supabase_db.DEFAULT_DEADLINES)
+DB_CALL_DEADLINE = float(os.getenv("DB_CALL_DEADLINE", "8"))
+# Consecutive failures that open the circuit breaker, and how long it stays open
+DB_BREAKER_THRESHOLD = int(os.getenv("DB_BREAKER_THRESHOLD", "5"))
+DB_BREAKER_RESET = float(os.getenv("DB_BREAKER_RESET", "30"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+ACL_CACHE_TTL = float(os.getenv("ACL_CACHE_TTL", "600"))
+LIST_CACHE_SIZE = int(os.getenv("LIST_CACHE_SIZE", "2048"))
+LIST_CACHE_TTL = float(os.getenv("LIST_CACHE_TTL", "120"))
+DB_HTTP_POOL_SIZE = int(os.getenv("DB_HTTP_POOL_SIZE", "20"))
+DB_HTTP_KEEPALIVE = int(os.getenv("DB_HTTP_KEEPALIVE", "20"))
+DB_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("DB_HTTP_KEEPALIVE_EXPIRY", "60"))
+DB_HTTP2 = os.getenv("DB_HTTP2", "false").lower() in ("1", "true", "yes")
+# HTTP timeouts stay under DB_CALL_DEADLINE so a read abandoned at its deadline
+# does not keep a worker thread busy for long
+DB_HTTP_TIMEOUT = float(os.getenv("DB_HTTP_TIMEOUT", "5"))
+DB_HTTP_CONNECT_TIMEOUT = float(os.getenv("DB_HTTP_CONNECT_TIMEOUT", "2"))
+# Published posts older than this many days move to posts_archive (0 turns the archiver off)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "500"))
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "3600"))
+# Connections opened at startup (defaults to one per DB worker thread)
+DB_PREWARM_CONNECTIONS = int(os.getenv("DB_PREWARM_CONNECTIONS", os.getenv("DB_MAX_WORKERS", "8")))
+
+if not BOT_TOKEN:
+    raise RuntimeError("Missing BOT_TOKEN in environment")
+if DB_BACKEND == "supabase" and (not SUPABASE_URL or not SUPABASE_KEY):
+    raise RuntimeError("Missing SUPABASE_URL or SUPABASE_KEY in environment")
 
 # Configure logging
 logging.basicConfig(
@@ -24,21 +59,55 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
-# Initialize Supabase database interface
+if DB_HTTP_TIMEOUT + DB_HTTP_CONNECT_TIMEOUT >= DB_CALL_DEADLINE:
+    print("⚠️ DB_HTTP_TIMEOUT + DB_HTTP_CONNECT_TIMEOUT не меньше DB_CALL_DEADLINE: "
+          "запросы будут продолжаться после дедлайна")
+# Initialize the database backend
 import supabase_db
-supabase_db.db = supabase_db.SupabaseDB(SUPABASE_URL, SUPABASE_KEY)
-supabase_db.db.init_schema()
+if DB_BACKEND == "sqlite":
+    from sqlite_db import SQLiteDB
+    sync_db = SQLiteDB(SQLITE_PATH)
+else:
+    sync_db = supabase_db.SupabaseDB(
+        SUPABASE_URL, SUPABASE_KEY,
+        user_cache_size=USER_CACHE_SIZE,
+        user_cache_ttl=USER_CACHE_TTL,
+        acl_cache_ttl=ACL_CACHE_TTL,
+        list_cache_size=LIST_CACHE_SIZE,
+        list_cache_ttl=LIST_CACHE_TTL,
+        http_pool_size=DB_HTTP_POOL_SIZE,
+        http_keepalive=DB_HTTP_KEEPALIVE,
+        http_keepalive_expiry=DB_HTTP_KEEPALIVE_EXPIRY,
+        http2=DB_HTTP2,
+        http_timeout=DB_HTTP_TIMEOUT,
+        http_connect_timeout=DB_HTTP_CONNECT_TIMEOUT,
+        replica_url=SUPABASE_REPLICA_URL,
+        replica_max_lag=REPLICA_MAX_LAG,
+        replica_check_interval=REPLICA_CHECK_INTERVAL,
+        breaker_threshold=DB_BREAKER_THRESHOLD,
+        breaker_reset=DB_BREAKER_RESET,
+    )
+sync_db.init_schema()
+sync_db.prewarm_connections(DB_PREWARM_CONNECTIONS)
+# Handlers and the scheduler await the DB through a bounded thread pool
+supabase_db.db = supabase_db.AsyncSupabaseDB(sync_db, max_workers=DB_MAX_WORKERS,
+                                             deadline=DB_CALL_DEADLINE)
 
 # Initialize bot and dispatcher
 bot = Bot(token=BOT_TOKEN, parse_mode=None)
 dp = Dispatcher(storage=MemoryStorage())
 
+# Load the user row and channel ACL once per update for all handlers
+from middlewares import DBContextMiddleware
+dp.update.outer_middleware(DBContextMiddleware(query_budget=DB_QUERY_BUDGET))
+
 # Функция для мгновенной публикации постов
-async def publish_post_immediately(bot: Bot, post_id: int) -> bool:
-    """Немедленно опубликовать конкретный пост"""
+async def publish_post_immediately(bot: Bot, post_id: int, post: dict = None) -> bool:
+    """Немедленно опубликовать конкретный пост (post - уже загруженная строка, если есть)"""
     try:
-        # Получаем пост
-        post = supabase_db.db.get_post(post_id)
+        # Получаем пост, если вызывающий код не передал свежую строку
+        if post is None:
+            post = await supabase_db.db.get_post(post_id)
         if not post or post.get("published") or post.get("draft"):
             return False
         
@@ -49,7 +118,7 @@ async def publish_post_immediately(bot: Bot, post_id: int) -> bool:
         else:
             chan_id = post.get("channel_id")
             if chan_id:
-                channel = supabase_db.db.get_channel(chan_id)
+                channel = await supabase_db.db.get_channel(chan_id)
                 if channel:
                     chat_id = channel.get("chat_id")
         
@@ -147,7 +216,7 @@ async def publish_post_immediately(bot: Bot, post_id: int) -> bool:
             )
         
         # Отмечаем как опубликованный
-        supabase_db.db.mark_post_published(post_id)
+        await supabase_db.db.mark_post_published(post_id)
         print(f"✅ Пост #{post_id} немедленно опубликован в канал {chat_id}")
         return True
         
@@ -212,7 +281,7 @@ dp.include_router(main_menu.router)
 
 # Улучшенные глобальные обработчики для редактирования
 @dp.callback_query(F.data.startswith("edit_field:"))
-async def callback_edit_field_global(callback: CallbackQuery, state: FSMContext):
+async def callback_edit_field_global(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Глобальный обработчик редактирования полей поста"""
     try:
         parts = callback.data.split(":")
@@ -221,16 +290,16 @@ async def callback_edit_field_global(callback: CallbackQuery, state: FSMContext)
             # Это возврат в главное меню редактирования
             post_id = int(parts[1])
             user_id = callback.from_user.id
-            user = supabase_db.db.get_user(user_id)
+            user = db_user
             
             # Получаем пост
-            post = supabase_db.db.get_post(post_id)
+            post = await supabase_db.db.get_post_for_admin(post_id, user_id)
             if not post:
                 await callback.answer("❌ Пост не найден!")
                 return
             
             # Проверяем доступ через канал
-            if not supabase_db.db.is_channel_admin(post.get("channel_id"), user_id):
+            if not post["is_admin"]:
                 await callback.answer("❌ У вас нет доступа к этому посту!")
                 return
             
@@ -251,7 +320,7 @@ async def callback_edit_field_global(callback: CallbackQuery, state: FSMContext)
             # Обычное редактирование поля - передаем в edit_post модуль
             try:
                 from edit_post import handle_edit_field_callback
-                await handle_edit_field_callback(callback, state)
+                await handle_edit_field_callback(callback, state, db_user)
             except ImportError:
                 post_id = int(parts[1]) if len(parts) > 1 else 0
                 await callback.message.edit_text(f"Используйте команду `/edit {post_id}` для редактирования.")
@@ -261,11 +330,11 @@ async def callback_edit_field_global(callback: CallbackQuery, state: FSMContext)
         await callback.answer("❌ Произошла ошибка")
 
 @dp.callback_query(F.data.startswith("edit_recreate:"))
-async def callback_edit_recreate_global(callback: CallbackQuery, state: FSMContext):
+async def callback_edit_recreate_global(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Глобальный обработчик полного пересоздания поста"""
     try:
         from edit_post import handle_edit_recreate
-        await handle_edit_recreate(callback, state)
+        await handle_edit_recreate(callback, state, db_user)
     except ImportError:
         parts = callback.data.split(":")
         post_id = int(parts[1]) if len(parts) > 1 else 0
@@ -276,11 +345,11 @@ async def callback_edit_recreate_global(callback: CallbackQuery, state: FSMConte
         await callback.answer("❌ Произошла ошибка")
 
 @dp.callback_query(F.data.startswith("edit_menu:"))
-async def callback_edit_menu_global(callback: CallbackQuery, state: FSMContext):
+async def callback_edit_menu_global(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Глобальный обработчик возврата в меню редактирования"""
     try:
         from edit_post import handle_edit_menu_return
-        await handle_edit_menu_return(callback, state)
+        await handle_edit_menu_return(callback, state, db_user)
     except ImportError:
         parts = callback.data.split(":")
         post_id = int(parts[1]) if len(parts) > 1 else 0
@@ -304,11 +373,11 @@ async def callback_edit_confirm_global(callback: CallbackQuery, state: FSMContex
         await callback.answer("❌ Произошла ошибка")
 
 @dp.callback_query(F.data.startswith("edit_skip:"))
-async def callback_edit_skip_global(callback: CallbackQuery, state: FSMContext):
+async def callback_edit_skip_global(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Глобальный обработчик пропуска шага редактирования"""
     try:
         from edit_post import handle_edit_skip
-        await handle_edit_skip(callback, state)
+        await handle_edit_skip(callback, state, db_user)
     except ImportError:
         await callback.message.edit_text("Ошибка: модуль редактирования недоступен.")
         await callback.answer()
@@ -317,11 +386,11 @@ async def callback_edit_skip_global(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Произошла ошибка")
 
 @dp.callback_query(F.data.startswith("edit_save:"))
-async def callback_edit_save_global(callback: CallbackQuery, state: FSMContext):
+async def callback_edit_save_global(callback: CallbackQuery, state: FSMContext, db_user: dict = None, user_channels: list = None):
     """Глобальный обработчик сохранения редактирования"""
     try:
         from edit_post import handle_edit_save
-        await handle_edit_save(callback, state)
+        await handle_edit_save(callback, state, db_user, user_channels)
     except ImportError:
         await callback.message.edit_text("Ошибка: модуль редактирования недоступен.")
         await callback.answer()
@@ -368,21 +437,21 @@ async def callback_edit_post_global(callback: CallbackQuery):
         await callback.answer("❌ Произошла ошибка")
 
 @dp.callback_query(F.data.startswith("post_edit_direct:"))
-async def callback_edit_post_global_updated(callback: CallbackQuery, state: FSMContext):
+async def callback_edit_post_global_updated(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Глобальный обработчик команды редактирования поста (обновленный)"""
     try:
         post_id = int(callback.data.split(":", 1)[1])
         user_id = callback.from_user.id
-        user = supabase_db.db.get_user(user_id)
+        user = db_user
         
         # Получаем пост
-        post = supabase_db.db.get_post(post_id)
+        post = await supabase_db.db.get_post_for_admin(post_id, user_id)
         if not post:
             await callback.answer("❌ Пост не найден!")
             return
         
         # Проверяем доступ через канал
-        if not supabase_db.db.is_channel_admin(post.get("channel_id"), user_id):
+        if not post["is_admin"]:
             await callback.answer("❌ У вас нет доступа к этому посту!")
             return
         
@@ -426,7 +495,7 @@ async def callback_publish_post_global(callback: CallbackQuery):
         user_id = callback.from_user.id
         post_id = int(callback.data.split(":", 1)[1])
         
-        post = supabase_db.db.get_post(post_id)
+        post = await supabase_db.db.get_post_for_admin(post_id, user_id)
         if not post:
             await callback.answer("Пост не найден!")
             return
@@ -436,19 +505,23 @@ async def callback_publish_post_global(callback: CallbackQuery):
             return
         
         # Проверяем доступ через канал
-        if not supabase_db.db.is_channel_admin(post.get("channel_id"), user_id):
+        if not post["is_admin"]:
             await callback.answer("У вас нет доступа к этому посту!")
             return
         
-        # Обновляем время публикации на текущее (ИСПРАВЛЕНО - конвертируем в строку)
+        # Обновляем время публикации на текущее, если пост не изменился после чтения
         now = datetime.now(ZoneInfo("UTC"))
-        supabase_db.db.update_post(post_id, {
+        updated, status = await supabase_db.db.update_post_if(post_id, post.get("version"), {
             "publish_time": now.isoformat(),  # Конвертируем в строку!
             "draft": False
         })
+        if status != "ok":
+            await callback.answer("Пост уже опубликован!" if status == "published"
+                                  else "Пост изменился, попробуйте еще раз")
+            return
         
-        # Пытаемся опубликовать немедленно
-        published = await publish_post_immediately(bot, post_id)
+        # Пытаемся опубликовать немедленно (строка из update, без повторного чтения)
+        published = await publish_post_immediately(bot, post_id, updated)
         
         # Создаем клавиатуру с действиями
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -535,12 +608,12 @@ async def callback_confirm_delete_post_global(callback: CallbackQuery):
         post_id = int(callback.data.split(":", 1)[1])
         
         # Проверяем доступ через канал
-        post = supabase_db.db.get_post(post_id)
-        if not post or not supabase_db.db.is_channel_admin(post.get("channel_id"), user_id):
+        post = await supabase_db.db.get_post_for_admin(post_id, user_id, include_archive=True)
+        if not post or not post["is_admin"]:
             await callback.answer("У вас нет доступа к этому посту!")
             return
         
-        if supabase_db.db.delete_post(post_id):
+        if await supabase_db.db.delete_post(post_id):
             keyboard = InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="📋 Список постов", callback_data="posts_menu")],
                 [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
@@ -570,21 +643,21 @@ async def callback_confirm_delete_post_global(callback: CallbackQuery):
         await callback.answer("❌ Произошла ошибка")
 
 @dp.callback_query(F.data.startswith("post_full_view:"))
-async def callback_full_view_post_global(callback: CallbackQuery):
+async def callback_full_view_post_global(callback: CallbackQuery, db_user: dict = None):
     """Глобальный обработчик полного просмотра поста"""
     try:
         user_id = callback.from_user.id
-        user = supabase_db.db.get_user(user_id)
+        user = db_user
         
         post_id = int(callback.data.split(":", 1)[1])
-        post = supabase_db.db.get_post(post_id)
+        post = await supabase_db.db.get_post_for_admin(post_id, user_id, include_archive=True)
         
         if not post:
             await callback.answer("Пост не найден!")
             return
         
         # Проверяем доступ через канал
-        if not supabase_db.db.is_channel_admin(post.get("channel_id"), user_id):
+        if not post["is_admin"]:
             await callback.answer("У вас нет доступа к этому посту!")
             return
         
@@ -596,7 +669,7 @@ async def callback_full_view_post_global(callback: CallbackQuery):
             await send_post_preview(callback.message, post)
             
             # Отправляем информацию с кнопками
-            channel = supabase_db.db.get_channel(post['channel_id'])
+            channel = post.get("channels")
             channel_name = channel['name'] if channel else 'Неизвестный канал'
             
             info_text = f"👀 **Полный просмотр поста #{post_id}**\n\n"
@@ -716,11 +789,11 @@ async def callback_create_quick_help(callback: CallbackQuery):
 
 # Обработчик для меню постов
 @dp.callback_query(F.data == "posts_menu")
-async def callback_posts_menu_global(callback: CallbackQuery):
+async def callback_posts_menu_global(callback: CallbackQuery, db_user: dict = None):
     """Глобальный обработчик меню постов"""
     try:
         from list_posts import callback_posts_menu
-        await callback_posts_menu(callback)
+        await callback_posts_menu(callback, db_user)
     except Exception as e:
         print(f"Error in callback_posts_menu_global: {e}")
         await callback.answer("❌ Произошла ошибка")
@@ -730,11 +803,15 @@ import auto_post_fixed as auto_post
 
 async def main():
     print("🚀 Запуск бота...")
-    print(f"📊 База данных: {SUPABASE_URL}")
+    print(f"📊 База данных: {SQLITE_PATH if DB_BACKEND == 'sqlite' else SUPABASE_URL}")
     
     # Start background task for auto-posting
     asyncio.create_task(auto_post.start_scheduler(bot))
     print("⏰ Планировщик запущен")
+    # Start background archiving of old published posts
+    if ARCHIVE_AFTER_DAYS > 0:
+        asyncio.create_task(auto_post.start_archiver(ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH, ARCHIVE_INTERVAL))
+        print(f"🗄 Архивация постов старше {ARCHIVE_AFTER_DAYS} дн. запущена")
     
     # Start polling
     print("🔄 Начинаем получение обновлений...")
@@ -751,6 +828,8 @@ async def main():
             print("⏳ Ожидание завершения другого экземпляра бота...")
             await asyncio.sleep(5)
             await dp.start_polling(bot)
+    finally:
+        supabase_db.db.shutdown(wait=False)
 
 if __name__ == "__main__":
     asyncio.run(main())
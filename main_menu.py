@@ -37,8 +37,8 @@ def get_main_menu_keyboard(lang: str = "ru"):
             ]
         ])
 
-def get_welcome_text(user: dict, lang: str = "ru") -> str:
-    """Получить приветственный текст"""
+async def get_welcome_text(user: dict, lang: str = "ru", user_channels: list = None) -> str:
+    """Получить приветственный текст (user_channels - каналы из DBContextMiddleware)"""
     if lang == "ru":
         text = "🤖 **Добро пожаловать в бот управления каналами!**\n\n"
         text += "Этот бот поможет вам:\n"
@@ -50,9 +50,11 @@ def get_welcome_text(user: dict, lang: str = "ru") -> str:
         # Быстрая статистика
         if user:
             try:
-                channels = supabase_db.db.get_user_channels(user['user_id'])
-                posts = supabase_db.db.list_posts(user_id=user['user_id'], only_pending=True)
-                text += f"📺 Ваших каналов: {len(channels) if channels else 0} | ⏰ Запланированных постов: {len(posts) if posts else 0}\n\n"
+                channels = user_channels
+                if channels is None:
+                    channels = await supabase_db.db.get_user_channels(user['user_id'])
+                counts = await supabase_db.db.count_posts_by_status(user['user_id'])
+                text += f"📺 Ваших каналов: {len(channels) if channels else 0} | ⏰ Запланированных постов: {counts['scheduled']}\n\n"
             except Exception as e:
                 print(f"Error getting stats for user: {e}")
                 text += "\n"
@@ -69,9 +71,11 @@ def get_welcome_text(user: dict, lang: str = "ru") -> str:
         # Quick stats
         if user:
             try:
-                channels = supabase_db.db.get_user_channels(user['user_id'])
-                posts = supabase_db.db.list_posts(user_id=user['user_id'], only_pending=True)
-                text += f"📺 Your channels: {len(channels) if channels else 0} | ⏰ Scheduled posts: {len(posts) if posts else 0}\n\n"
+                channels = user_channels
+                if channels is None:
+                    channels = await supabase_db.db.get_user_channels(user['user_id'])
+                counts = await supabase_db.db.count_posts_by_status(user['user_id'])
+                text += f"📺 Your channels: {len(channels) if channels else 0} | ⏰ Scheduled posts: {counts['scheduled']}\n\n"
             except Exception as e:
                 print(f"Error getting stats for user: {e}")
                 text += "\n"
@@ -81,14 +85,14 @@ def get_welcome_text(user: dict, lang: str = "ru") -> str:
     return text
 
 @router.message(Command("menu"))
-async def cmd_main_menu(message: Message, state: FSMContext):
+async def cmd_main_menu(message: Message, state: FSMContext, db_user: dict = None, user_channels: list = None):
     """Показать главное меню"""
     user_id = message.from_user.id
     try:
-        user = supabase_db.db.ensure_user(user_id)
+        user = db_user
         lang = user.get("language", "ru") if user else "ru"
         
-        text = get_welcome_text(user, lang)
+        text = await get_welcome_text(user, lang, user_channels)
         keyboard = get_main_menu_keyboard(lang)
         
         await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
@@ -97,16 +101,14 @@ async def cmd_main_menu(message: Message, state: FSMContext):
         await message.answer("❌ Произошла ошибка. Попробуйте позже.")
 
 @router.callback_query(F.data == "main_menu")
-async def callback_main_menu(callback: CallbackQuery):
+async def callback_main_menu(callback: CallbackQuery, db_user: dict = None, user_channels: list = None):
     """Вернуться в главное меню"""
     user_id = callback.from_user.id
     try:
-        user = supabase_db.db.get_user(user_id)
-        if not user:
-            user = supabase_db.db.ensure_user(user_id)
+        user = db_user
         lang = user.get("language", "ru") if user else "ru"
         
-        text = get_welcome_text(user, lang)
+        text = await get_welcome_text(user, lang, user_channels)
         keyboard = get_main_menu_keyboard(lang)
         
         await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
@@ -116,14 +118,14 @@ async def callback_main_menu(callback: CallbackQuery):
         await callback.answer("❌ Произошла ошибка")
 
 @router.callback_query(F.data == "menu_create_post")
-async def callback_create_post(callback: CallbackQuery, state: FSMContext):
+async def callback_create_post(callback: CallbackQuery, state: FSMContext, db_user: dict = None, user_channels: list = None):
     """Создать пост напрямую"""
     user_id = callback.from_user.id
-    user = supabase_db.db.ensure_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     # Проверяем наличие каналов у пользователя
-    channels = supabase_db.db.get_user_channels(user_id)
+    channels = user_channels
     if not channels:
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="📺 Добавить канал", callback_data="channels_add")],
@@ -180,12 +182,12 @@ async def callback_posts_menu(callback: CallbackQuery):
         await callback.answer("❌ Произошла ошибка")
 
 @router.callback_query(F.data == "menu_channels")
-async def callback_channels_menu(callback: CallbackQuery):
+async def callback_channels_menu(callback: CallbackQuery, db_user: dict = None):
     """Меню каналов"""
     try:
         # Прямой запуск меню каналов
         user_id = callback.from_user.id
-        user = supabase_db.db.get_user(user_id)
+        user = db_user
         lang = user.get("language", "ru") if user else "ru"
         
         # Показываем главное меню каналов
@@ -213,14 +215,12 @@ async def callback_channels_menu(callback: CallbackQuery):
         await callback.answer()
 
 @router.callback_query(F.data == "menu_settings")
-async def callback_settings_menu(callback: CallbackQuery):
+async def callback_settings_menu(callback: CallbackQuery, db_user: dict = None):
     """Меню настроек"""
     try:
         # Импортируем функцию из settings_improved
         user_id = callback.from_user.id
-        user = supabase_db.db.get_user(user_id)
-        if not user:
-            user = supabase_db.db.ensure_user(user_id)
+        user = db_user
         lang = user.get("language", "ru") if user else "ru"
         
         # Прямой вызов настроек
@@ -296,11 +296,11 @@ async def callback_help_menu(callback: CallbackQuery):
 
 # Команды быстрого доступа
 @router.message(Command("quick"))
-async def cmd_quick_actions(message: Message, state: FSMContext):
+async def cmd_quick_actions(message: Message, state: FSMContext, db_user: dict = None):
     """Быстрые действия"""
     try:
         user_id = message.from_user.id
-        user = supabase_db.db.ensure_user(user_id)
+        user = db_user
         lang = user.get("language", "ru") if user else "ru"
         
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -337,27 +337,24 @@ async def callback_quick_post(callback: CallbackQuery):
         await callback.answer("❌ Произошла ошибка")
 
 @router.callback_query(F.data == "quick_stats")
-async def callback_quick_stats(callback: CallbackQuery):
+async def callback_quick_stats(callback: CallbackQuery, db_user: dict = None, user_channels: list = None):
     """Быстрая статистика"""
     try:
         user_id = callback.from_user.id
-        user = supabase_db.db.get_user(user_id)
-        if not user:
-            user = supabase_db.db.ensure_user(user_id)
+        user = db_user
         
         try:
-            channels = supabase_db.db.get_user_channels(user_id) or []
-            all_posts = supabase_db.db.list_posts(user_id=user_id, only_pending=False) or []
-            scheduled = [p for p in all_posts if not p.get('published') and not p.get('draft') and p.get('publish_time')]
-            drafts = [p for p in all_posts if p.get('draft')]
-            published = [p for p in all_posts if p.get('published')]
+            channels = user_channels
+            if channels is None:
+                channels = await supabase_db.db.get_user_channels(user_id) or []
+            counts = await supabase_db.db.count_posts_by_status(user_id)
             
             text = (
                 f"📊 **Быстрая статистика**\n\n"
                 f"📺 Каналов: {len(channels)}\n"
-                f"⏰ Запланированных: {len(scheduled)}\n"
-                f"📝 Черновиков: {len(drafts)}\n"
-                f"✅ Опубликованных: {len(published)}\n"
+                f"⏰ Запланированных: {counts['scheduled']}\n"
+                f"📝 Черновиков: {counts['drafts']}\n"
+                f"✅ Опубликованных: {counts['published']}\n"
             )
         except Exception as e:
             print(f"Error getting stats: {e}")
@@ -375,16 +372,14 @@ async def callback_quick_stats(callback: CallbackQuery):
         await callback.answer("❌ Произошла ошибка")
 
 @router.callback_query(F.data == "quick_upcoming")
-async def callback_quick_upcoming(callback: CallbackQuery):
+async def callback_quick_upcoming(callback: CallbackQuery, db_user: dict = None):
     """Ближайшие посты"""
     try:
         user_id = callback.from_user.id
-        user = supabase_db.db.get_user(user_id)
-        if not user:
-            user = supabase_db.db.ensure_user(user_id)
+        user = db_user
         
         try:
-            posts = supabase_db.db.get_scheduled_posts_by_channel(user_id) or []
+            posts = await supabase_db.db.get_scheduled_posts_by_channel(user_id, projection="list_row") or []
             
             if not posts:
                 text = "⏰ **Ближайшие посты**\n\n❌ Нет запланированных постов."
@@ -408,7 +403,7 @@ async def callback_quick_upcoming(callback: CallbackQuery):
                             if post.get('channels') and isinstance(post['channels'], dict):
                                 channel_name = post['channels'].get('name', 'Канал')
                             
-                            post_text = post.get('text', 'Без текста')[:25]
+                            post_text = (post.get('text_preview') or post.get('text') or 'Без текста')[:25]
                             text += f"{i}. **{time_str}** - {channel_name}\n   {post_text}...\n\n"
                         else:
                             text += f"{i}. Пост #{post.get('id', '?')}\n\n"
@@ -0,0 +1,53 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+import supabase_db
+
+logger = logging.getLogger(__name__)
+
+
+def default_language(language_code: str = None) -> str:
+    """Default bot language for a new user based on Telegram settings."""
+    if (language_code or "").startswith("en"):
+        return "en"
+    return "ru"
+
+
+class DBContextMiddleware(BaseMiddleware):
+    """Loads db_user, user_channels and admin_channel_ids once per update."""
+
+    def __init__(self, query_budget: int = 4):
+        self.query_budget = query_budget
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        budget = supabase_db.QueryBudget(self.query_budget)
+        token = supabase_db.current_budget.set(budget)
+        try:
+            tg_user = data.get("event_from_user")
+            db_user = None
+            user_channels = []
+            if tg_user and not tg_user.is_bot:
+                db_user, user_channels = await asyncio.gather(
+                    supabase_db.db.ensure_user(tg_user.id, default_lang=default_language(tg_user.language_code)),
+                    supabase_db.db.get_user_channels(tg_user.id),
+                )
+            data["db_user"] = db_user
+            data["user_channels"] = user_channels or []
+            data["admin_channel_ids"] = {ch["id"] for ch in data["user_channels"]}
+            return await handler(event, data)
+        finally:
+            supabase_db.current_budget.reset(token)
+            if budget.exceeded:
+                logger.warning(
+                    "Update %s sent %d DB requests (budget %d): %s",
+                    getattr(event, "update_id", "?"), budget.count, budget.limit, ", ".join(budget.calls)
+                )
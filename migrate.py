@@ -0,0 +1,83 @@
+"""Versioned schema migrations (migrations/NNNN_name.sql) for the Supabase database.
+
+``python migrate.py > sql.sql`` regenerates the full script.
+"""
+
+import os
+import re
+from collections import namedtuple
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+Migration = namedtuple("Migration", "version name sql")
+
+SCHEMA_MIGRATIONS_SQL = """CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+"""
+
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> list:
+    """Migrations found in ``directory``, sorted by version."""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            migrations.append(Migration(int(match.group(1)), match.group(2), f.read()))
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def migration_script(migration: Migration) -> str:
+    """SQL that applies ``migration`` and records it, under an advisory lock."""
+    return (
+        f"-- {migration.version:04d} {migration.name}\n"
+        f"{SCHEMA_MIGRATIONS_SQL}"
+        "SELECT pg_advisory_xact_lock(hashtext('schema_migrations'));\n\n"
+        f"{migration.sql.rstrip()}\n\n"
+        f"INSERT INTO schema_migrations (version, name) VALUES ({migration.version}, '{migration.name}')\n"
+        "ON CONFLICT (version) DO NOTHING;\n"
+    )
+
+
+def pending_migrations(migrations: list, current_version: int) -> list:
+    return [m for m in migrations if m.version > current_version]
+
+
+def apply_migrations(execute_sql, current_version: int, migrations: list = None) -> int:
+    """Run pending migrations through ``execute_sql(sql)``; returns the version reached."""
+    if migrations is None:
+        migrations = load_migrations()
+    for migration in pending_migrations(migrations, current_version):
+        try:
+            execute_sql(migration_script(migration))
+        except Exception as e:
+            print(f"Warning: Could not apply migration {migration.version:04d}_{migration.name}: {e}")
+            return current_version
+        print(f"Applied migration {migration.version:04d}_{migration.name}")
+        current_version = migration.version
+    return current_version
+
+
+def full_script(migrations: list = None) -> str:
+    """All migrations as one script (the contents of sql.sql)."""
+    if migrations is None:
+        migrations = load_migrations()
+    header = (
+        "-- Схема базы данных: все миграции из migrations/ по порядку.\n"
+        "-- Файл генерируется: python migrate.py > sql.sql (не редактировать вручную).\n"
+        "-- Бот применяет новые миграции сам при запуске (SupabaseDB.init_schema).\n\n"
+    )
+    return header + "\n".join(migration_script(m) for m in migrations)
+
+
+if __name__ == "__main__":
+    print(full_script(), end="")
@@ -0,0 +1,86 @@
+-- Базовая схема: пользователи, каналы, админы каналов, посты, настройки уведомлений
+
+-- Таблицы старой схемы с проектами больше не используются
+DROP TABLE IF EXISTS user_projects CASCADE;
+DROP TABLE IF EXISTS projects CASCADE;
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    timezone TEXT DEFAULT 'UTC',
+    language TEXT DEFAULT 'ru',
+    date_format TEXT DEFAULT 'YYYY-MM-DD',
+    time_format TEXT DEFAULT 'HH:MM',
+    notify_before INTEGER DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS channels (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    chat_id BIGINT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    username TEXT,
+    is_admin_verified BOOLEAN DEFAULT FALSE,
+    admin_check_date TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Таблица для связи пользователей с каналами (кто имеет доступ)
+CREATE TABLE IF NOT EXISTS channel_admins (
+    channel_id BIGINT,
+    user_id BIGINT,
+    role TEXT DEFAULT 'admin', -- admin, owner
+    added_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (channel_id, user_id),
+    FOREIGN KEY (channel_id) REFERENCES channels(id) ON DELETE CASCADE
+);
+
+-- Посты привязываются только к каналам
+CREATE TABLE IF NOT EXISTS posts (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    channel_id BIGINT NOT NULL,
+    chat_id BIGINT NOT NULL, -- дублируем для быстрого доступа
+    created_by BIGINT, -- кто создал пост (для истории)
+    text TEXT,
+    media_type TEXT,
+    media_id TEXT,
+    parse_mode TEXT DEFAULT 'HTML',
+    buttons JSONB,
+    publish_time TIMESTAMP WITH TIME ZONE,
+    repeat_interval INTEGER DEFAULT 0,
+    draft BOOLEAN DEFAULT FALSE,
+    published BOOLEAN DEFAULT FALSE,
+    notified BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    FOREIGN KEY (channel_id) REFERENCES channels(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS notification_settings (
+    user_id BIGINT PRIMARY KEY,
+    post_published BOOLEAN DEFAULT TRUE,
+    post_failed BOOLEAN DEFAULT TRUE,
+    daily_summary BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Базы со старой схемой: убираем столбцы проектов, переименовываем user_id
+ALTER TABLE users DROP COLUMN IF EXISTS current_project;
+ALTER TABLE channels DROP COLUMN IF EXISTS project_id;
+ALTER TABLE channels DROP COLUMN IF EXISTS user_id;
+ALTER TABLE posts DROP COLUMN IF EXISTS project_id;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema() AND table_name='posts' AND column_name='user_id') THEN
+        ALTER TABLE posts RENAME COLUMN user_id TO created_by;
+    END IF;
+END $$;
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS created_by BIGINT;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS chat_id BIGINT NOT NULL DEFAULT 0;
+
+-- Индексы для производительности
+CREATE INDEX IF NOT EXISTS idx_posts_channel_id ON posts(channel_id);
+CREATE INDEX IF NOT EXISTS idx_posts_publish_time ON posts(publish_time);
+CREATE INDEX IF NOT EXISTS idx_posts_published_draft ON posts(published, draft);
+CREATE INDEX IF NOT EXISTS idx_channel_admins_user_id ON channel_admins(user_id);
+CREATE INDEX IF NOT EXISTS idx_channels_chat_id ON channels(chat_id);
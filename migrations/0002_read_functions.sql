@@ -0,0 +1,34 @@
+-- Функции чтения: счетчики постов, пользователь одним запросом, отставание реплики
+
+-- Счетчики постов по статусам без выборки строк (меню и статистика)
+CREATE OR REPLACE FUNCTION count_posts_by_status(channel_ids BIGINT[])
+RETURNS TABLE (scheduled BIGINT, drafts BIGINT, published BIGINT, total BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT
+        COUNT(*) FILTER (WHERE NOT published AND NOT draft AND publish_time IS NOT NULL),
+        COUNT(*) FILTER (WHERE draft),
+        COUNT(*) FILTER (WHERE published),
+        COUNT(*)
+    FROM posts
+    WHERE channel_id = ANY(channel_ids);
+$$;
+
+-- Получить или создать пользователя одним запросом (новому ставится p_language)
+CREATE OR REPLACE FUNCTION ensure_user(p_user_id BIGINT, p_language TEXT DEFAULT 'ru')
+RETURNS SETOF users
+LANGUAGE sql VOLATILE AS $$
+    INSERT INTO users (user_id, language) VALUES (p_user_id, p_language)
+    ON CONFLICT (user_id) DO UPDATE SET user_id = EXCLUDED.user_id
+    RETURNING *;
+$$;
+
+-- Отставание реплики в секундах (0 на основной базе и на догнавшей реплике)
+CREATE OR REPLACE FUNCTION replica_lag_seconds()
+RETURNS DOUBLE PRECISION
+LANGUAGE sql STABLE AS $$
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END::double precision;
+$$;
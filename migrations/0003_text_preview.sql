@@ -0,0 +1,2 @@
+-- Короткий текст поста для списков (списки не тянут полный текст)
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS text_preview TEXT GENERATED ALWAYS AS (left(text, 64)) STORED;
@@ -0,0 +1,71 @@
+-- Такт планировщика за два запроса: забрать посты в работу и записать итоги
+
+-- Время, когда пост взят планировщиком в публикацию
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP WITH TIME ZONE;
+
+-- Один такт планировщика: забрать готовые посты (с данными канала) и пометить
+-- их как взятые в работу, плюс посты, по которым пора напомнить автору
+CREATE OR REPLACE FUNCTION scheduler_claim(p_now TIMESTAMPTZ DEFAULT NOW(), p_lease_seconds INTEGER DEFAULT 300)
+RETURNS JSONB
+LANGUAGE plpgsql VOLATILE AS $$
+DECLARE
+    v_due JSONB;
+    v_notify JSONB;
+BEGIN
+    WITH due AS (
+        SELECT p.id FROM posts p
+        WHERE NOT p.published AND NOT p.draft AND p.publish_time <= p_now
+          AND (p.claimed_at IS NULL OR p.claimed_at < p_now - make_interval(secs => p_lease_seconds))
+        FOR UPDATE SKIP LOCKED
+    ), claimed AS (
+        UPDATE posts p SET claimed_at = p_now FROM due WHERE p.id = due.id
+        RETURNING p.id, p.channel_id, p.chat_id, p.created_by, p.publish_time, p.repeat_interval,
+                  p.text, p.media_type, p.media_id, p.parse_mode, p.buttons
+    )
+    SELECT COALESCE(jsonb_agg(to_jsonb(c) || jsonb_build_object(
+               'chat_id', COALESCE(NULLIF(c.chat_id, 0), ch.chat_id),
+               'channel_name', ch.name) ORDER BY c.publish_time), '[]'::jsonb)
+    INTO v_due
+    FROM claimed c LEFT JOIN channels ch ON ch.id = c.channel_id;
+
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+               'id', p.id, 'channel_id', p.channel_id, 'chat_id', COALESCE(NULLIF(p.chat_id, 0), ch.chat_id),
+               'created_by', p.created_by, 'publish_time', p.publish_time,
+               'channel_name', ch.name, 'language', u.language)), '[]'::jsonb)
+    INTO v_notify
+    FROM posts p
+    JOIN users u ON u.user_id = p.created_by
+    LEFT JOIN channels ch ON ch.id = p.channel_id
+    WHERE NOT p.published AND NOT p.draft AND NOT p.notified
+      AND u.notify_before > 0
+      AND p.publish_time > p_now
+      AND p.publish_time - make_interval(mins => u.notify_before) <= p_now;
+
+    RETURN jsonb_build_object('due', v_due, 'notify', v_notify);
+END;
+$$;
+
+-- Итоги такта одним запросом: опубликованные (повторы переносятся на
+-- следующий интервал), пропущенные и отправленные напоминания
+CREATE OR REPLACE FUNCTION scheduler_complete(p_sent BIGINT[], p_skipped BIGINT[], p_notified BIGINT[] DEFAULT '{}')
+RETURNS TABLE (id BIGINT, channel_id BIGINT, published BOOLEAN, publish_time TIMESTAMPTZ)
+LANGUAGE sql VOLATILE AS $$
+    UPDATE posts p SET
+        published = CASE
+            WHEN p.id = ANY(p_sent) AND COALESCE(p.repeat_interval, 0) > 0 THEN FALSE
+            WHEN p.id = ANY(p_sent) OR p.id = ANY(p_skipped) THEN TRUE
+            ELSE p.published END,
+        publish_time = CASE
+            WHEN p.id = ANY(p_sent) AND COALESCE(p.repeat_interval, 0) > 0
+                THEN p.publish_time + make_interval(secs => p.repeat_interval)
+            ELSE p.publish_time END,
+        notified = CASE
+            WHEN p.id = ANY(p_sent) AND COALESCE(p.repeat_interval, 0) > 0 THEN FALSE
+            WHEN p.id = ANY(p_notified) THEN TRUE
+            ELSE p.notified END,
+        claimed_at = CASE
+            WHEN p.id = ANY(p_sent) OR p.id = ANY(p_skipped) THEN NULL
+            ELSE p.claimed_at END
+    WHERE p.id = ANY(p_sent) OR p.id = ANY(p_skipped) OR p.id = ANY(p_notified)
+    RETURNING p.id, p.channel_id, p.published, p.publish_time;
+$$;
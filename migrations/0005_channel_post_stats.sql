@@ -0,0 +1,77 @@
+-- Счетчики постов по каналам, которые поддерживают триггеры на posts
+-- (меню и статистика читают готовые числа вместо подсчета по posts)
+CREATE TABLE IF NOT EXISTS channel_post_stats (
+    channel_id BIGINT PRIMARY KEY REFERENCES channels(id) ON DELETE CASCADE,
+    scheduled BIGINT NOT NULL DEFAULT 0,
+    drafts BIGINT NOT NULL DEFAULT 0,
+    published BIGINT NOT NULL DEFAULT 0,
+    total BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Прибавить (p_sign = 1) или вычесть (-1) пост из счетчиков канала.
+-- Строки удаленного канала не создаются (каскадное удаление постов)
+CREATE OR REPLACE FUNCTION channel_post_stats_apply(p_channel_id BIGINT, p_published BOOLEAN, p_draft BOOLEAN,
+                                                    p_publish_time TIMESTAMPTZ, p_sign INTEGER)
+RETURNS VOID
+LANGUAGE sql VOLATILE AS $$
+    INSERT INTO channel_post_stats AS s (channel_id, scheduled, drafts, published, total, updated_at)
+    SELECT p_channel_id,
+           p_sign * (NOT COALESCE(p_published, FALSE) AND NOT COALESCE(p_draft, FALSE) AND p_publish_time IS NOT NULL)::int,
+           p_sign * COALESCE(p_draft, FALSE)::int,
+           p_sign * COALESCE(p_published, FALSE)::int,
+           p_sign,
+           NOW()
+    WHERE EXISTS (SELECT 1 FROM channels WHERE id = p_channel_id)
+    ON CONFLICT (channel_id) DO UPDATE SET
+        scheduled = s.scheduled + EXCLUDED.scheduled,
+        drafts = s.drafts + EXCLUDED.drafts,
+        published = s.published + EXCLUDED.published,
+        total = s.total + EXCLUDED.total,
+        updated_at = NOW();
+$$;
+
+CREATE OR REPLACE FUNCTION channel_post_stats_trigger()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM channel_post_stats_apply(OLD.channel_id, OLD.published, OLD.draft, OLD.publish_time, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM channel_post_stats_apply(NEW.channel_id, NEW.published, NEW.draft, NEW.publish_time, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS posts_stats_insert_delete ON posts;
+CREATE TRIGGER posts_stats_insert_delete AFTER INSERT OR DELETE ON posts
+    FOR EACH ROW EXECUTE FUNCTION channel_post_stats_trigger();
+
+-- Обновление пересчитывается, только если меняется статус или канал
+DROP TRIGGER IF EXISTS posts_stats_update ON posts;
+CREATE TRIGGER posts_stats_update AFTER UPDATE OF channel_id, published, draft, publish_time ON posts
+    FOR EACH ROW
+    WHEN (OLD.channel_id IS DISTINCT FROM NEW.channel_id
+          OR OLD.published IS DISTINCT FROM NEW.published
+          OR OLD.draft IS DISTINCT FROM NEW.draft
+          OR (OLD.publish_time IS NULL) <> (NEW.publish_time IS NULL))
+    EXECUTE FUNCTION channel_post_stats_trigger();
+
+-- Полный пересчет (первое заполнение или ручная сверка)
+CREATE OR REPLACE FUNCTION rebuild_channel_post_stats()
+RETURNS VOID
+LANGUAGE sql VOLATILE AS $$
+    DELETE FROM channel_post_stats;
+    INSERT INTO channel_post_stats (channel_id, scheduled, drafts, published, total)
+    SELECT channel_id,
+           COUNT(*) FILTER (WHERE NOT published AND NOT draft AND publish_time IS NOT NULL),
+           COUNT(*) FILTER (WHERE draft),
+           COUNT(*) FILTER (WHERE published),
+           COUNT(*)
+    FROM posts
+    GROUP BY channel_id;
+$$;
+
+SELECT rebuild_channel_post_stats();
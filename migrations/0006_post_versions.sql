@@ -0,0 +1,22 @@
+-- Версия поста для оптимистичной блокировки при редактировании: любое
+-- изменение содержимого, времени или статуса увеличивает version
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION posts_bump_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF (NEW.text, NEW.media_type, NEW.media_id, NEW.parse_mode, NEW.buttons, NEW.publish_time,
+        NEW.repeat_interval, NEW.draft, NEW.published, NEW.channel_id, NEW.chat_id)
+       IS DISTINCT FROM
+       (OLD.text, OLD.media_type, OLD.media_id, OLD.parse_mode, OLD.buttons, OLD.publish_time,
+        OLD.repeat_interval, OLD.draft, OLD.published, OLD.channel_id, OLD.chat_id) THEN
+        NEW.version := OLD.version + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS posts_version ON posts;
+CREATE TRIGGER posts_version BEFORE UPDATE ON posts
+    FOR EACH ROW EXECUTE FUNCTION posts_bump_version();
@@ -0,0 +1,22 @@
+-- Индексы под горячие запросы вместо одностолбцовых.
+-- Создаются без CONCURRENTLY: миграция выполняется в одной транзакции
+
+-- Планировщик: готовые к публикации посты (get_due_posts, scheduler_claim)
+-- и напоминания (publish_time > now). В индекс попадают только
+-- неопубликованные не-черновики, поэтому он не растет с архивом
+CREATE INDEX IF NOT EXISTS idx_posts_due ON posts(publish_time)
+    WHERE NOT published AND NOT draft;
+
+-- Списки по каналам: channel_id IN (...), published = false, сортировка по publish_time
+CREATE INDEX IF NOT EXISTS idx_posts_channel_published_time ON posts(channel_id, published, publish_time);
+
+-- Черновики и опубликованные по каналам, новые сверху
+CREATE INDEX IF NOT EXISTS idx_posts_channel_drafts ON posts(channel_id, created_at DESC)
+    WHERE draft;
+CREATE INDEX IF NOT EXISTS idx_posts_channel_published_created ON posts(channel_id, created_at DESC)
+    WHERE published;
+
+-- Покрыты новыми индексами (channel_id - префикс составного индекса)
+DROP INDEX IF EXISTS idx_posts_channel_id;
+DROP INDEX IF EXISTS idx_posts_publish_time;
+DROP INDEX IF EXISTS idx_posts_published_draft;
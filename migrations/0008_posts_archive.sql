@@ -0,0 +1,98 @@
+-- Архив опубликованных постов: старые опубликованные посты без повтора
+-- переносятся из posts пачками, чтобы планировщик, списки и индексы posts
+-- не росли вместе с историей. Архив читают только просмотры истории
+
+CREATE TABLE IF NOT EXISTS posts_archive (
+    id BIGINT PRIMARY KEY, -- id из posts сохраняется
+    channel_id BIGINT NOT NULL,
+    chat_id BIGINT NOT NULL,
+    created_by BIGINT,
+    text TEXT,
+    media_type TEXT,
+    media_id TEXT,
+    parse_mode TEXT,
+    buttons JSONB,
+    publish_time TIMESTAMP WITH TIME ZONE,
+    repeat_interval INTEGER DEFAULT 0,
+    draft BOOLEAN DEFAULT FALSE,
+    published BOOLEAN DEFAULT TRUE,
+    notified BOOLEAN DEFAULT FALSE,
+    version INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP WITH TIME ZONE,
+    archived_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    text_preview TEXT GENERATED ALWAYS AS (left(text, 64)) STORED,
+    FOREIGN KEY (channel_id) REFERENCES channels(id) ON DELETE CASCADE
+);
+
+-- История по каналам, новые сверху (как idx_posts_channel_published_created)
+CREATE INDEX IF NOT EXISTS idx_posts_archive_channel_created ON posts_archive(channel_id, created_at DESC);
+
+-- Кандидаты в архив: в индекс попадают только опубликованные посты без
+-- повтора, которые еще лежат в posts
+CREATE INDEX IF NOT EXISTS idx_posts_archivable ON posts(publish_time)
+    WHERE published AND COALESCE(repeat_interval, 0) = 0;
+
+-- Счетчики channel_post_stats считают посты за все время: перенос в архив
+-- вычитает пост из posts и прибавляет его в архиве
+DROP TRIGGER IF EXISTS posts_archive_stats ON posts_archive;
+CREATE TRIGGER posts_archive_stats AFTER INSERT OR DELETE ON posts_archive
+    FOR EACH ROW EXECUTE FUNCTION channel_post_stats_trigger();
+
+CREATE OR REPLACE FUNCTION rebuild_channel_post_stats()
+RETURNS VOID
+LANGUAGE sql VOLATILE AS $$
+    DELETE FROM channel_post_stats;
+    INSERT INTO channel_post_stats (channel_id, scheduled, drafts, published, total)
+    SELECT channel_id,
+           COUNT(*) FILTER (WHERE NOT published AND NOT draft AND publish_time IS NOT NULL),
+           COUNT(*) FILTER (WHERE draft),
+           COUNT(*) FILTER (WHERE published),
+           COUNT(*)
+    FROM (
+        SELECT channel_id, published, draft, publish_time FROM posts
+        UNION ALL
+        SELECT channel_id, published, draft, publish_time FROM posts_archive
+    ) p
+    GROUP BY channel_id;
+$$;
+
+CREATE OR REPLACE FUNCTION count_posts_by_status(channel_ids BIGINT[])
+RETURNS TABLE (scheduled BIGINT, drafts BIGINT, published BIGINT, total BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT
+        COUNT(*) FILTER (WHERE NOT published AND NOT draft AND publish_time IS NOT NULL),
+        COUNT(*) FILTER (WHERE draft),
+        COUNT(*) FILTER (WHERE published),
+        COUNT(*)
+    FROM (
+        SELECT published, draft, publish_time FROM posts WHERE channel_id = ANY(channel_ids)
+        UNION ALL
+        SELECT published, draft, publish_time FROM posts_archive WHERE channel_id = ANY(channel_ids)
+    ) p;
+$$;
+
+-- Перенести одну пачку (не больше p_batch постов, сначала самые старые)
+-- одним запросом. Строки, занятые другой транзакцией, пропускаются.
+-- Возвращает перенесенные посты
+CREATE OR REPLACE FUNCTION archive_published_posts(p_older_than_days INTEGER, p_batch INTEGER DEFAULT 500)
+RETURNS TABLE (id BIGINT, channel_id BIGINT)
+LANGUAGE sql VOLATILE AS $$
+    WITH batch AS (
+        SELECT p.id FROM posts p
+        WHERE p.published AND COALESCE(p.repeat_interval, 0) = 0
+          AND p.publish_time < NOW() - make_interval(days => p_older_than_days)
+        ORDER BY p.publish_time
+        LIMIT p_batch
+        FOR UPDATE SKIP LOCKED
+    ), moved AS (
+        DELETE FROM posts p USING batch WHERE p.id = batch.id
+        RETURNING p.id, p.channel_id, p.chat_id, p.created_by, p.text, p.media_type, p.media_id, p.parse_mode,
+                  p.buttons, p.publish_time, p.repeat_interval, p.draft, p.published, p.notified, p.version,
+                  p.created_at
+    )
+    INSERT INTO posts_archive AS a (id, channel_id, chat_id, created_by, text, media_type, media_id, parse_mode,
+                                    buttons, publish_time, repeat_interval, draft, published, notified, version,
+                                    created_at)
+    SELECT * FROM moved
+    RETURNING a.id, a.channel_id;
+$$;
@@ -14,7 +14,7 @@ async def cmd_project(message: Message, bot: Bot, state: FSMContext):
     user_id = message.from_user.id
     args = message.text.split(maxsplit=2)
     lang = "ru"
-    user = supabase_db.db.get_user(user_id)
+    user = await supabase_db.db.get_user(user_id)
     if user:
         lang = user.get("language", "ru")
     
@@ -23,7 +23,7 @@ async def cmd_project(message: Message, bot: Bot, state: FSMContext):
         if not user:
             await message.answer(TEXTS[lang]['projects_not_found'])
             return
-        projects = supabase_db.db.list_projects(user_id)
+        projects = await supabase_db.db.list_projects(user_id)
         if not projects:
             # Нет проектов - предлагаем создать
             keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -80,12 +80,12 @@ async def cmd_project(message: Message, bot: Bot, state: FSMContext):
         if not proj_name:
             await message.answer("Название проекта не может быть пустым." if lang == "ru" else "Project name cannot be empty.")
             return
-        project = supabase_db.db.create_project(user_id, proj_name)
+        project = await supabase_db.db.create_project(user_id, proj_name)
         if not project:
             await message.answer("Ошибка: не удалось создать проект." if lang == "ru" else "Error: Failed to create project.")
             return
         # Set as current project
-        supabase_db.db.update_user(user_id, {"current_project": project["id"]})
+        await supabase_db.db.update_user(user_id, {"current_project": project["id"]})
         await message.answer(TEXTS[lang]['projects_created'].format(name=proj_name))
     elif sub == "switch":
         if len(args) < 3:
@@ -97,14 +97,14 @@ async def cmd_project(message: Message, bot: Bot, state: FSMContext):
             await message.answer(TEXTS[lang]['projects_not_found'])
             return
         # Verify membership
-        if not supabase_db.db.is_user_in_project(user_id, pid):
+        if not await supabase_db.db.is_user_in_project(user_id, pid):
             await message.answer(TEXTS[lang]['projects_not_found'])
             return
-        project = supabase_db.db.get_project(pid)
+        project = await supabase_db.db.get_project(pid)
         if not project:
             await message.answer(TEXTS[lang]['projects_not_found'])
             return
-        supabase_db.db.update_user(user_id, {"current_project": pid})
+        await supabase_db.db.update_user(user_id, {"current_project": pid})
         await message.answer(TEXTS[lang]['projects_switched'].format(name=project.get("name", "")))
     elif sub == "invite":
         if len(args) < 3:
@@ -124,18 +124,18 @@ async def cmd_project(message: Message, bot: Bot, state: FSMContext):
             return
         proj_id = user["current_project"]
         # Check if invitee has started bot
-        invitee_user = supabase_db.db.get_user(invitee_id)
+        invitee_user = await supabase_db.db.get_user(invitee_id)
         if not invitee_user:
             await message.answer(TEXTS[lang]['projects_invite_not_found'])
             return
         # Add user to project
-        added = supabase_db.db.add_user_to_project(invitee_id, proj_id, role="admin")
+        added = await supabase_db.db.add_user_to_project(invitee_id, proj_id, role="admin")
         if not added:
             await message.answer("Пользователь уже в проекте." if lang == "ru" else "User is already a member of the project.")
             return
         await message.answer(TEXTS[lang]['projects_invite_success'].format(user_id=invitee_id))
         # Notify invited user
-        proj = supabase_db.db.get_project(proj_id)
+        proj = await supabase_db.db.get_project(proj_id)
         inviter_name = message.from_user.full_name or f"user {user_id}"
         invitee_lang = invitee_user.get("language", "ru")
         notify_text = TEXTS[invitee_lang]['projects_invited_notify'].format(project=proj.get("name", ""), user=inviter_name)
@@ -160,21 +160,21 @@ async def on_switch_project(callback: CallbackQuery):
     except:
         await callback.answer()
         return
-    user = supabase_db.db.get_user(user_id)
+    user = await supabase_db.db.get_user(user_id)
     lang = user.get("language", "ru") if user else "ru"
-    if not supabase_db.db.is_user_in_project(user_id, proj_id):
+    if not await supabase_db.db.is_user_in_project(user_id, proj_id):
         await callback.answer(TEXTS[lang]['projects_not_found'], show_alert=True)
         return
-    project = supabase_db.db.get_project(proj_id)
+    project = await supabase_db.db.get_project(proj_id)
     if not project:
         await callback.answer(TEXTS[lang]['projects_not_found'], show_alert=True)
         return
     # Update current project
-    supabase_db.db.update_user(user_id, {"current_project": proj_id})
+    await supabase_db.db.update_user(user_id, {"current_project": proj_id})
     
     # Возвращаем обновленное меню проектов
     try:
-        projects = supabase_db.db.list_projects(user_id)
+        projects = await supabase_db.db.list_projects(user_id)
         text = "📁 **Ваши проекты:**\n\n"
         current_proj = proj_id  # Только что переключились
         
@@ -208,9 +208,9 @@ async def on_switch_project(callback: CallbackQuery):
 @router.callback_query(F.data == "proj_new")
 async def on_new_project(callback: CallbackQuery, state: FSMContext):
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = await supabase_db.db.get_user(user_id)
     if not user:
-        user = supabase_db.db.ensure_user(user_id)
+        user = await supabase_db.db.ensure_user(user_id)
     lang = user.get("language", "ru") if user else "ru"
     
     # Устанавливаем состояние для создания проекта
@@ -237,10 +237,10 @@ async def on_new_project_cancel(callback: CallbackQuery, state: FSMContext):
     
     # Возвращаемся к меню проектов
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = await supabase_db.db.get_user(user_id)
     
     try:
-        projects = supabase_db.db.list_projects(user_id)
+        projects = await supabase_db.db.list_projects(user_id)
         
         if not projects:
             keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -296,7 +296,7 @@ async def on_new_project_cancel(callback: CallbackQuery, state: FSMContext):
 async def create_new_project_name(message: Message, state: FSMContext):
     user_id = message.from_user.id
     project_name = message.text.strip()
-    user = supabase_db.db.get_user(user_id)
+    user = await supabase_db.db.get_user(user_id)
     lang = user.get("language", "ru") if user else "ru"
     
     # Проверка на команды отмены
@@ -327,14 +327,14 @@ async def create_new_project_name(message: Message, state: FSMContext):
     
     # Создаем проект
     try:
-        project = supabase_db.db.create_project(user_id, project_name)
+        project = await supabase_db.db.create_project(user_id, project_name)
         if not project:
             await message.answer("❌ Ошибка при создании проекта. Попробуйте еще раз.")
             await state.clear()
             return
         
         # Set new project as current
-        supabase_db.db.update_user(user_id, {"current_project": project["id"]})
+        await supabase_db.db.update_user(user_id, {"current_project": project["id"]})
         
         # Показываем успешное создание с меню действий
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -0,0 +1,60 @@
+import threading
+import time
+
+
+class ReplicaRouter:
+    """Picks the client for read-only queries: the replica while its lag stays under ``max_lag``."""
+
+    def __init__(self, primary, replica=None, max_lag: float = 5.0, check_interval: float = 10.0):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag = None
+        # Unknown until the first lag check
+        self.healthy = False
+        self._checked_at = None
+        self._check_lock = threading.Lock()
+        self.replica_reads = 0
+        self.primary_reads = 0
+
+    def _refresh(self):
+        # Only one thread measures; the others keep using the last verdict
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            try:
+                res = self.replica.rpc("replica_lag_seconds", {}).execute()
+                self.lag = float(res.data or 0)
+                self.healthy = self.lag <= self.max_lag
+                if not self.healthy:
+                    print(f"Read replica lags {self.lag:.1f}s (max {self.max_lag}s), reading from primary")
+            except Exception as e:
+                print(f"Read replica lag check failed, reading from primary: {e}")
+                self.lag = None
+                self.healthy = False
+            self._checked_at = time.monotonic()
+        finally:
+            self._check_lock.release()
+
+    def reader(self):
+        """Client for a read-only query."""
+        if self.replica is None:
+            self.primary_reads += 1
+            return self.primary
+        if self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval:
+            self._refresh()
+        if self.healthy:
+            self.replica_reads += 1
+            return self.replica
+        self.primary_reads += 1
+        return self.primary
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.replica is not None,
+            "healthy": self.healthy,
+            "lag": self.lag,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+        }
@@ -233,14 +233,14 @@ def validate_post_content(data: dict) -> tuple[bool, str]:
     return True, ""
 
 @router.message(Command("create"))
-async def cmd_create_post(message: Message, state: FSMContext):
+async def cmd_create_post(message: Message, state: FSMContext, db_user: dict = None, user_channels: list = None):
     """Начать создание поста"""
     user_id = message.from_user.id
-    user = supabase_db.db.ensure_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     # Проверяем наличие каналов у пользователя
-    channels = supabase_db.db.get_user_channels(user_id)
+    channels = user_channels
     if not channels:
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="📺 Добавить канал", callback_data="channels_add")],
@@ -274,13 +274,13 @@ async def cmd_create_post(message: Message, state: FSMContext):
 
 # Быстрое создание поста одной командой
 @router.message(Command("quickpost"))
-async def cmd_quick_post(message: Message, state: FSMContext):
+async def cmd_quick_post(message: Message, state: FSMContext, db_user: dict = None, user_channels: list = None):
     """Быстрое создание поста: /quickpost <канал> <время> <текст>"""
     user_id = message.from_user.id
-    user = supabase_db.db.ensure_user(user_id)
+    user = db_user
     
     # Получаем каналы пользователя
-    channels = supabase_db.db.get_user_channels(user_id)
+    channels = user_channels
     if not channels:
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="📺 Добавить канал", callback_data="channels_add")],
@@ -374,7 +374,7 @@ async def cmd_quick_post(message: Message, state: FSMContext):
         "published": False
     }
     
-    post = supabase_db.db.add_post(post_data)
+    post = await supabase_db.db.add_post(post_data)
     
     if post:
         status = "📝 черновик" if draft else "⏰ запланирован" if publish_time else "создан"
@@ -414,9 +414,9 @@ async def start_text_step(message: Message, state: FSMContext, lang: str):
     await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
 
 @router.message(PostCreationFlow.step_text, F.text)
-async def handle_text_input(message: Message, state: FSMContext):
+async def handle_text_input(message: Message, state: FSMContext, db_user: dict = None):
     """Обработка ввода текста"""
-    user = supabase_db.db.get_user(message.from_user.id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     # Проверяем текстовые команды
@@ -462,9 +462,9 @@ async def start_media_step(message: Message, state: FSMContext, lang: str):
     await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
 
 @router.message(PostCreationFlow.step_media, F.text | F.photo | F.video | F.animation)
-async def handle_media_input(message: Message, state: FSMContext):
+async def handle_media_input(message: Message, state: FSMContext, db_user: dict = None):
     """Обработка медиа или команд"""
-    user = supabase_db.db.get_user(message.from_user.id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     # Проверяем текстовые команды
@@ -545,9 +545,9 @@ async def show_content_missing_dialog(message: Message, state: FSMContext, lang:
     await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
 
 @router.callback_query(F.data == "missing_content_add_text")
-async def handle_missing_content_add_text(callback: CallbackQuery, state: FSMContext):
+async def handle_missing_content_add_text(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Добавить текст когда контент отсутствует"""
-    user = supabase_db.db.get_user(callback.from_user.id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     # Возвращаемся к шагу текста
@@ -561,9 +561,9 @@ async def handle_missing_content_add_text(callback: CallbackQuery, state: FSMCon
     await start_text_step(callback.message, state, lang)
 
 @router.callback_query(F.data == "missing_content_add_media")
-async def handle_missing_content_add_media(callback: CallbackQuery, state: FSMContext):
+async def handle_missing_content_add_media(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Добавить медиа когда контент отсутствует"""
-    user = supabase_db.db.get_user(callback.from_user.id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     await callback.answer()
@@ -591,9 +591,9 @@ async def start_format_step(message: Message, state: FSMContext, lang: str):
     await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
 
 @router.message(PostCreationFlow.step_format, F.text)
-async def handle_format_text_input(message: Message, state: FSMContext):
+async def handle_format_text_input(message: Message, state: FSMContext, db_user: dict = None):
     """Обработка текстового выбора формата"""
-    user = supabase_db.db.get_user(message.from_user.id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     text_lower = message.text.lower().strip()
@@ -653,9 +653,9 @@ async def handle_format_text_input(message: Message, state: FSMContext):
         )
 
 @router.callback_query(F.data.startswith("format_"))
-async def handle_format_selection(callback: CallbackQuery, state: FSMContext):
+async def handle_format_selection(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Обработка выбора формата через кнопки"""
-    user = supabase_db.db.get_user(callback.from_user.id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     format_map = {
@@ -696,9 +696,9 @@ async def start_buttons_step(message: Message, state: FSMContext, lang: str):
     await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
 
 @router.message(PostCreationFlow.step_buttons, F.text)
-async def handle_buttons_input(message: Message, state: FSMContext):
+async def handle_buttons_input(message: Message, state: FSMContext, db_user: dict = None):
     """Обработка ввода кнопок"""
-    user = supabase_db.db.get_user(message.from_user.id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     # Проверяем команды
@@ -707,7 +707,7 @@ async def handle_buttons_input(message: Message, state: FSMContext):
         data["buttons"] = None
         data["step_history"].append("step_buttons")
         await state.set_data(data)
-        await start_time_step(message, state, lang)
+        await start_time_step(message, state, lang, user)
         return
     
     if is_command(message.text, "back"):
@@ -758,7 +758,7 @@ async def handle_buttons_input(message: Message, state: FSMContext):
         data["step_history"].append("step_buttons")
         await state.set_data(data)
         
-        await start_time_step(message, state, lang)
+        await start_time_step(message, state, lang, user)
         
     except Exception as e:
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -773,12 +773,13 @@ async def handle_buttons_input(message: Message, state: FSMContext):
             reply_markup=keyboard
         )
 
-async def start_time_step(message: Message, state: FSMContext, lang: str):
+async def start_time_step(message: Message, state: FSMContext, lang: str, user: dict = None):
     """Шаг 5: Выбор времени публикации"""
     await state.set_state(PostCreationFlow.step_time)
     
     data = await state.get_data()
-    user = supabase_db.db.get_user(data["user_id"])
+    if user is None:
+        user = await supabase_db.db.get_user(data["user_id"])
     timezone = user.get("timezone", "UTC") if user else "UTC"
     
     text = (
@@ -797,9 +798,9 @@ async def start_time_step(message: Message, state: FSMContext, lang: str):
     await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
 
 @router.message(PostCreationFlow.step_time, F.text)
-async def handle_time_text_input(message: Message, state: FSMContext):
+async def handle_time_text_input(message: Message, state: FSMContext, db_user: dict = None):
     """Обработка текстового ввода времени"""
-    user = supabase_db.db.get_user(message.from_user.id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     text_lower = message.text.lower().strip()
@@ -880,9 +881,9 @@ async def handle_time_text_input(message: Message, state: FSMContext):
     await start_channel_step(message, state, lang)
 
 @router.callback_query(F.data == "time_now")
-async def handle_time_now(callback: CallbackQuery, state: FSMContext):
+async def handle_time_now(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Опубликовать сейчас"""
-    user = supabase_db.db.get_user(callback.from_user.id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     data = await state.get_data()
@@ -895,9 +896,9 @@ async def handle_time_now(callback: CallbackQuery, state: FSMContext):
     await start_channel_step(callback.message, state, lang)
 
 @router.callback_query(F.data == "time_draft")
-async def handle_time_draft(callback: CallbackQuery, state: FSMContext):
+async def handle_time_draft(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Сохранить как черновик"""
-    user = supabase_db.db.get_user(callback.from_user.id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     data = await state.get_data()
@@ -910,16 +911,15 @@ async def handle_time_draft(callback: CallbackQuery, state: FSMContext):
     await start_channel_step(callback.message, state, lang)
 
 @router.callback_query(F.data == "time_schedule")
-async def handle_time_schedule(callback: CallbackQuery, state: FSMContext):
+async def handle_time_schedule(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Запланировать время"""
-    user = supabase_db.db.get_user(callback.from_user.id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     # Меняем состояние для ожидания ввода времени
     await state.set_state(PostCreationFlow.step_time)
     
-    user = supabase_db.db.get_user(callback.from_user.id)
-    tz_name = user.get("timezone", "UTC")
+    tz_name = user.get("timezone", "UTC") if user else "UTC"
     
     text = (
         f"📅 **Введите дату и время публикации**\n\n"
@@ -952,7 +952,7 @@ async def start_channel_step(message: Message, state: FSMContext, lang: str):
     user_id = data["user_id"]
     
     # Получаем каналы пользователя
-    channels = supabase_db.db.get_user_channels(user_id)
+    channels = await supabase_db.db.get_user_channels(user_id)
     
     text = (
         "📺 **Создание поста - Шаг 6/7**\n\n"
@@ -976,9 +976,9 @@ async def start_channel_step(message: Message, state: FSMContext, lang: str):
     await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
 
 @router.message(PostCreationFlow.step_channel, F.text)
-async def handle_channel_text_input(message: Message, state: FSMContext):
+async def handle_channel_text_input(message: Message, state: FSMContext, db_user: dict = None, user_channels: list = None):
     """Обработка текстового выбора канала"""
-    user = supabase_db.db.get_user(message.from_user.id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     # Проверяем команды
@@ -996,7 +996,7 @@ async def handle_channel_text_input(message: Message, state: FSMContext):
     
     data = await state.get_data()
     user_id = data["user_id"]
-    channels = supabase_db.db.get_user_channels(user_id)
+    channels = user_channels
     
     text = message.text.strip()
     channel = None
@@ -1036,12 +1036,12 @@ async def handle_channel_text_input(message: Message, state: FSMContext):
     data["step_history"].append("step_channel")
     await state.set_data(data)
     
-    await start_preview_step(message, state, lang)
+    await start_preview_step(message, state, lang, user)
 
 @router.callback_query(F.data.startswith("channel_select:"))
-async def handle_channel_selection(callback: CallbackQuery, state: FSMContext):
+async def handle_channel_selection(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Обработка выбора канала через кнопку"""
-    user = supabase_db.db.get_user(callback.from_user.id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     channel_id = int(callback.data.split(":", 1)[1])
@@ -1052,16 +1052,16 @@ async def handle_channel_selection(callback: CallbackQuery, state: FSMContext):
     await state.set_data(data)
     
     await callback.answer()
-    await start_preview_step(callback.message, state, lang)
+    await start_preview_step(callback.message, state, lang, user)
 
-async def start_preview_step(message: Message, state: FSMContext, lang: str):
+async def start_preview_step(message: Message, state: FSMContext, lang: str, user: dict = None):
     """Шаг 7: Предварительный просмотр (БЕЗ валидации - она уже была)"""
     await state.set_state(PostCreationFlow.step_preview)
     
     data = await state.get_data()
     
     # Получаем информацию о канале
-    channel = supabase_db.db.get_channel(data["channel_id"])
+    channel = await supabase_db.db.get_channel(data["channel_id"])
     
     # Сначала отправляем превью самого поста
     await send_post_preview(message, data)
@@ -1072,7 +1072,8 @@ async def start_preview_step(message: Message, state: FSMContext, lang: str):
     
     if data.get("publish_time"):
         if isinstance(data["publish_time"], datetime):
-            user = supabase_db.db.get_user(data["user_id"])
+            if user is None:
+                user = await supabase_db.db.get_user(data["user_id"])
             user_tz = user.get('timezone', 'UTC') if user else 'UTC'
             try:
                 user_tz_obj = ZoneInfo(user_tz)
@@ -1105,9 +1106,9 @@ async def start_preview_step(message: Message, state: FSMContext, lang: str):
     await message.answer(info_text, reply_markup=keyboard, parse_mode="Markdown")
 
 @router.message(PostCreationFlow.step_preview, F.text)
-async def handle_preview_text_input(message: Message, state: FSMContext):
+async def handle_preview_text_input(message: Message, state: FSMContext, db_user: dict = None):
     """Обработка текстовых команд в предпросмотре"""
-    user = supabase_db.db.get_user(message.from_user.id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     if is_command(message.text, "confirm"):
@@ -1268,11 +1269,11 @@ async def handle_post_confirmation_text(message: Message, state: FSMContext, is_
     """Подтверждение создания поста"""
     try:
         data = await state.get_data()
-        user = supabase_db.db.get_user(data.get("user_id"))
+        user = await supabase_db.db.get_user(data.get("user_id"))
         lang = user.get("language", "ru") if user else "ru"
         
         # Получаем канал для получения chat_id
-        channel = supabase_db.db.get_channel(data["channel_id"])
+        channel = await supabase_db.db.get_channel(data["channel_id"])
         if not channel:
             error_text = "❌ **Ошибка**: Канал не найден"
             keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -1313,7 +1314,7 @@ async def handle_post_confirmation_text(message: Message, state: FSMContext, is_
         print(f"Создание поста: {post_data}")  # Логирование для отладки
         
         # Создаем пост
-        post = supabase_db.db.add_post(post_data)
+        post = await supabase_db.db.add_post(post_data)
         
         if post:
             if data.get("draft"):
@@ -1410,7 +1411,7 @@ async def handle_post_confirmation_text(message: Message, state: FSMContext, is_
         await state.clear()
 
 @router.callback_query(F.data == "edit_offer_accept")
-async def handle_edit_offer_accept(callback: CallbackQuery, state: FSMContext):
+async def handle_edit_offer_accept(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Принятие предложения редактирования"""
     # Извлекаем post_id из текста сообщения
     try:
@@ -1427,16 +1428,16 @@ async def handle_edit_offer_accept(callback: CallbackQuery, state: FSMContext):
         return
     
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     
     # Получаем пост
-    post = supabase_db.db.get_post(post_id)
+    post = await supabase_db.db.get_post_for_admin(post_id, user_id)
     if not post:
         await callback.answer("❌ Пост не найден!")
         return
     
     # Проверяем доступ через канал
-    if not supabase_db.db.is_channel_admin(post.get("channel_id"), user_id):
+    if not post["is_admin"]:
         await callback.answer("❌ У вас нет доступа к этому посту!")
         return
     
@@ -1531,9 +1532,9 @@ async def handle_edit_menu_text(message: Message, state: FSMContext, is_callback
         await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
 
 @router.callback_query(F.data == "post_preview")
-async def handle_back_to_preview(callback: CallbackQuery, state: FSMContext):
+async def handle_back_to_preview(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Вернуться к предпросмотру после редактирования"""
-    user = supabase_db.db.get_user(callback.from_user.id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     # Очищаем флаги редактирования
@@ -1544,13 +1545,13 @@ async def handle_back_to_preview(callback: CallbackQuery, state: FSMContext):
         del data["editing_mode"]
     await state.set_data(data)
     
-    await start_preview_step(callback.message, state, lang)
+    await start_preview_step(callback.message, state, lang, user)
     await callback.answer()
 
 @router.callback_query(F.data == "post_nav_back")
-async def handle_nav_back(callback: CallbackQuery, state: FSMContext):
+async def handle_nav_back(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Возврат к предыдущему шагу"""
-    user = supabase_db.db.get_user(callback.from_user.id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     await go_back_step(callback.message, state, lang)
@@ -1604,12 +1605,12 @@ async def go_back_step(message: Message, state: FSMContext, lang: str):
             await step_functions[prev_step](message, state, lang)
 
 @router.callback_query(F.data == "post_nav_skip")
-async def handle_nav_skip(callback: CallbackQuery, state: FSMContext):
+async def handle_nav_skip(callback: CallbackQuery, state: FSMContext, db_user: dict = None):
     """Пропустить текущий шаг"""
     current_state = await state.get_state()
     data = await state.get_data()
     
-    user = supabase_db.db.get_user(callback.from_user.id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     # Определяем следующий шаг
@@ -1638,7 +1639,7 @@ async def handle_nav_skip(callback: CallbackQuery, state: FSMContext):
         data["buttons"] = None
         data["step_history"].append("step_buttons")
         await state.set_data(data)
-        await start_time_step(callback.message, state, lang)
+        await start_time_step(callback.message, state, lang, user)
     
     await callback.answer()
 
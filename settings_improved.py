@@ -63,12 +63,10 @@ def format_user_settings(user: dict) -> str:
     return text
 
 @router.message(Command("settings"))
-async def cmd_settings(message: Message):
+async def cmd_settings(message: Message, db_user: dict = None):
     """Показать настройки пользователя"""
     user_id = message.from_user.id
-    user = supabase_db.db.get_user(user_id)
-    if not user:
-        user = supabase_db.db.ensure_user(user_id)
+    user = db_user
     
     lang = user.get("language", "ru") if user else "ru"
     
@@ -78,10 +76,10 @@ async def cmd_settings(message: Message):
     await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
 
 @router.callback_query(F.data == "settings_timezone")
-async def callback_settings_timezone(callback: CallbackQuery):
+async def callback_settings_timezone(callback: CallbackQuery, db_user: dict = None):
     """Настройка часового пояса"""
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     
     current_tz = user.get("timezone", "UTC") if user else "UTC"
     
@@ -119,10 +117,10 @@ async def callback_settings_timezone(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "settings_language")
-async def callback_settings_language(callback: CallbackQuery):
+async def callback_settings_language(callback: CallbackQuery, db_user: dict = None):
     """Настройка языка"""
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     
     current_lang = user.get("language", "ru") if user else "ru"
     
@@ -148,10 +146,10 @@ async def callback_settings_language(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "settings_date_format")
-async def callback_settings_date_format(callback: CallbackQuery):
+async def callback_settings_date_format(callback: CallbackQuery, db_user: dict = None):
     """Настройка формата даты"""
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     
     current_format = user.get("date_format", "YYYY-MM-DD") if user else "YYYY-MM-DD"
     
@@ -182,10 +180,10 @@ async def callback_settings_date_format(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "settings_time_format")
-async def callback_settings_time_format(callback: CallbackQuery):
+async def callback_settings_time_format(callback: CallbackQuery, db_user: dict = None):
     """Настройка формата времени"""
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     
     current_format = user.get("time_format", "HH:MM") if user else "HH:MM"
     
@@ -214,10 +212,10 @@ async def callback_settings_time_format(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "settings_notifications")
-async def callback_settings_notifications(callback: CallbackQuery):
+async def callback_settings_notifications(callback: CallbackQuery, db_user: dict = None):
     """Настройка уведомлений"""
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     
     current_notify = user.get("notify_before", 0) if user else 0
     
@@ -255,12 +253,10 @@ async def callback_settings_notifications(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "settings_menu")
-async def callback_settings_menu(callback: CallbackQuery):
+async def callback_settings_menu(callback: CallbackQuery, db_user: dict = None):
     """Вернуться в главное меню настроек"""
     user_id = callback.from_user.id
-    user = supabase_db.db.get_user(user_id)
-    if not user:
-        user = supabase_db.db.ensure_user(user_id)
+    user = db_user
     
     lang = user.get("language", "ru") if user else "ru"
     
@@ -283,10 +279,9 @@ async def callback_set_timezone(callback: CallbackQuery):
         return
     
     # Обновляем настройки
-    success = supabase_db.db.update_user(user_id, {"timezone": timezone})
+    user = await supabase_db.db.update_user(user_id, {"timezone": timezone})
     
-    if success:
-        user = supabase_db.db.get_user(user_id)
+    if user:
         text = format_user_settings(user)
         keyboard = get_settings_main_menu(user.get("language", "ru"))
         
@@ -306,10 +301,9 @@ async def callback_set_language(callback: CallbackQuery):
         return
     
     # Обновляем настройки
-    success = supabase_db.db.update_user(user_id, {"language": language})
+    user = await supabase_db.db.update_user(user_id, {"language": language})
     
-    if success:
-        user = supabase_db.db.get_user(user_id)
+    if user:
         text = format_user_settings(user)
         keyboard = get_settings_main_menu(language)
         
@@ -331,10 +325,9 @@ async def callback_set_date_format(callback: CallbackQuery):
         return
     
     # Обновляем настройки
-    success = supabase_db.db.update_user(user_id, {"date_format": date_format})
+    user = await supabase_db.db.update_user(user_id, {"date_format": date_format})
     
-    if success:
-        user = supabase_db.db.get_user(user_id)
+    if user:
         text = format_user_settings(user)
         keyboard = get_settings_main_menu(user.get("language", "ru"))
         
@@ -355,10 +348,9 @@ async def callback_set_time_format(callback: CallbackQuery):
         return
     
     # Обновляем настройки
-    success = supabase_db.db.update_user(user_id, {"time_format": time_format})
+    user = await supabase_db.db.update_user(user_id, {"time_format": time_format})
     
-    if success:
-        user = supabase_db.db.get_user(user_id)
+    if user:
         text = format_user_settings(user)
         keyboard = get_settings_main_menu(user.get("language", "ru"))
         
@@ -383,10 +375,9 @@ async def callback_set_notifications(callback: CallbackQuery):
         return
     
     # Обновляем настройки
-    success = supabase_db.db.update_user(user_id, {"notify_before": notify_minutes})
+    user = await supabase_db.db.update_user(user_id, {"notify_before": notify_minutes})
     
-    if success:
-        user = supabase_db.db.get_user(user_id)
+    if user:
         text = format_user_settings(user)
         keyboard = get_settings_main_menu(user.get("language", "ru"))
         
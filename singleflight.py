@@ -0,0 +1,39 @@
+import asyncio
+import copy
+
+
+class SingleFlight:
+    """Collapses concurrent identical async calls into one; waiters get a deep copy of the result."""
+
+    def __init__(self):
+        self._calls = {}
+        self.calls = 0
+        self.deduplicated = 0
+
+    async def do(self, key, func):
+        """Await ``func()`` unless an identical call is already in flight."""
+        task = self._calls.get(key)
+        if task is not None:
+            self.deduplicated += 1
+            # shield: a cancelled waiter must not cancel the shared call
+            return copy.deepcopy(await asyncio.shield(task))
+        # A task of its own, so a cancelled leader leaves it running for the waiters
+        task = asyncio.ensure_future(func())
+        self._calls[key] = task
+        self.calls += 1
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Retrieved here so a call without waiters does not log "never retrieved"
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "deduplicated": self.deduplicated,
+        }
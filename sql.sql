@@ -1,15 +1,31 @@
--- Удаляем старые таблицы в правильном порядке (сначала зависимые)
-DROP TABLE IF EXISTS notification_settings CASCADE;
-DROP TABLE IF EXISTS posts CASCADE;
+-- Схема базы данных: все миграции из migrations/ по порядку.
+-- Файл генерируется: python migrate.py > sql.sql (не редактировать вручную).
+-- Бот применяет новые миграции сам при запуске (SupabaseDB.init_schema).
+
+-- 0001 base_schema
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+SELECT pg_advisory_xact_lock(hashtext('schema_migrations'));
+
+-- Базовая схема: пользователи, каналы, админы каналов, посты, настройки уведомлений
+
+-- Таблицы старой схемы с проектами больше не используются
 DROP TABLE IF EXISTS user_projects CASCADE;
-DROP TABLE IF EXISTS channels CASCADE;
 DROP TABLE IF EXISTS projects CASCADE;
--- users оставляем, но уберем current_project
 
--- Удаляем столбец current_project из users
-ALTER TABLE users DROP COLUMN IF EXISTS current_project;
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    timezone TEXT DEFAULT 'UTC',
+    language TEXT DEFAULT 'ru',
+    date_format TEXT DEFAULT 'YYYY-MM-DD',
+    time_format TEXT DEFAULT 'HH:MM',
+    notify_before INTEGER DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
 
--- Создаем упрощенную структуру без проектов
 CREATE TABLE IF NOT EXISTS channels (
     id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
     chat_id BIGINT NOT NULL UNIQUE,
@@ -50,7 +66,6 @@ CREATE TABLE IF NOT EXISTS posts (
     FOREIGN KEY (channel_id) REFERENCES channels(id) ON DELETE CASCADE
 );
 
--- Настройки уведомлений (оставляем как есть)
 CREATE TABLE IF NOT EXISTS notification_settings (
     user_id BIGINT PRIMARY KEY,
     post_published BOOLEAN DEFAULT TRUE,
@@ -59,9 +74,438 @@ CREATE TABLE IF NOT EXISTS notification_settings (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Базы со старой схемой: убираем столбцы проектов, переименовываем user_id
+ALTER TABLE users DROP COLUMN IF EXISTS current_project;
+ALTER TABLE channels DROP COLUMN IF EXISTS project_id;
+ALTER TABLE channels DROP COLUMN IF EXISTS user_id;
+ALTER TABLE posts DROP COLUMN IF EXISTS project_id;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema() AND table_name='posts' AND column_name='user_id') THEN
+        ALTER TABLE posts RENAME COLUMN user_id TO created_by;
+    END IF;
+END $$;
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS created_by BIGINT;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS chat_id BIGINT NOT NULL DEFAULT 0;
+
 -- Индексы для производительности
 CREATE INDEX IF NOT EXISTS idx_posts_channel_id ON posts(channel_id);
 CREATE INDEX IF NOT EXISTS idx_posts_publish_time ON posts(publish_time);
 CREATE INDEX IF NOT EXISTS idx_posts_published_draft ON posts(published, draft);
 CREATE INDEX IF NOT EXISTS idx_channel_admins_user_id ON channel_admins(user_id);
 CREATE INDEX IF NOT EXISTS idx_channels_chat_id ON channels(chat_id);
+
+INSERT INTO schema_migrations (version, name) VALUES (1, 'base_schema')
+ON CONFLICT (version) DO NOTHING;
+
+-- 0002 read_functions
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+SELECT pg_advisory_xact_lock(hashtext('schema_migrations'));
+
+-- Функции чтения: счетчики постов, пользователь одним запросом, отставание реплики
+
+-- Счетчики постов по статусам без выборки строк (меню и статистика)
+CREATE OR REPLACE FUNCTION count_posts_by_status(channel_ids BIGINT[])
+RETURNS TABLE (scheduled BIGINT, drafts BIGINT, published BIGINT, total BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT
+        COUNT(*) FILTER (WHERE NOT published AND NOT draft AND publish_time IS NOT NULL),
+        COUNT(*) FILTER (WHERE draft),
+        COUNT(*) FILTER (WHERE published),
+        COUNT(*)
+    FROM posts
+    WHERE channel_id = ANY(channel_ids);
+$$;
+
+-- Получить или создать пользователя одним запросом (новому ставится p_language)
+CREATE OR REPLACE FUNCTION ensure_user(p_user_id BIGINT, p_language TEXT DEFAULT 'ru')
+RETURNS SETOF users
+LANGUAGE sql VOLATILE AS $$
+    INSERT INTO users (user_id, language) VALUES (p_user_id, p_language)
+    ON CONFLICT (user_id) DO UPDATE SET user_id = EXCLUDED.user_id
+    RETURNING *;
+$$;
+
+-- Отставание реплики в секундах (0 на основной базе и на догнавшей реплике)
+CREATE OR REPLACE FUNCTION replica_lag_seconds()
+RETURNS DOUBLE PRECISION
+LANGUAGE sql STABLE AS $$
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END::double precision;
+$$;
+
+INSERT INTO schema_migrations (version, name) VALUES (2, 'read_functions')
+ON CONFLICT (version) DO NOTHING;
+
+-- 0003 text_preview
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+SELECT pg_advisory_xact_lock(hashtext('schema_migrations'));
+
+-- Короткий текст поста для списков (списки не тянут полный текст)
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS text_preview TEXT GENERATED ALWAYS AS (left(text, 64)) STORED;
+
+INSERT INTO schema_migrations (version, name) VALUES (3, 'text_preview')
+ON CONFLICT (version) DO NOTHING;
+
+-- 0004 scheduler_tick
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+SELECT pg_advisory_xact_lock(hashtext('schema_migrations'));
+
+-- Такт планировщика за два запроса: забрать посты в работу и записать итоги
+
+-- Время, когда пост взят планировщиком в публикацию
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP WITH TIME ZONE;
+
+-- Один такт планировщика: забрать готовые посты (с данными канала) и пометить
+-- их как взятые в работу, плюс посты, по которым пора напомнить автору
+CREATE OR REPLACE FUNCTION scheduler_claim(p_now TIMESTAMPTZ DEFAULT NOW(), p_lease_seconds INTEGER DEFAULT 300)
+RETURNS JSONB
+LANGUAGE plpgsql VOLATILE AS $$
+DECLARE
+    v_due JSONB;
+    v_notify JSONB;
+BEGIN
+    WITH due AS (
+        SELECT p.id FROM posts p
+        WHERE NOT p.published AND NOT p.draft AND p.publish_time <= p_now
+          AND (p.claimed_at IS NULL OR p.claimed_at < p_now - make_interval(secs => p_lease_seconds))
+        FOR UPDATE SKIP LOCKED
+    ), claimed AS (
+        UPDATE posts p SET claimed_at = p_now FROM due WHERE p.id = due.id
+        RETURNING p.id, p.channel_id, p.chat_id, p.created_by, p.publish_time, p.repeat_interval,
+                  p.text, p.media_type, p.media_id, p.parse_mode, p.buttons
+    )
+    SELECT COALESCE(jsonb_agg(to_jsonb(c) || jsonb_build_object(
+               'chat_id', COALESCE(NULLIF(c.chat_id, 0), ch.chat_id),
+               'channel_name', ch.name) ORDER BY c.publish_time), '[]'::jsonb)
+    INTO v_due
+    FROM claimed c LEFT JOIN channels ch ON ch.id = c.channel_id;
+
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+               'id', p.id, 'channel_id', p.channel_id, 'chat_id', COALESCE(NULLIF(p.chat_id, 0), ch.chat_id),
+               'created_by', p.created_by, 'publish_time', p.publish_time,
+               'channel_name', ch.name, 'language', u.language)), '[]'::jsonb)
+    INTO v_notify
+    FROM posts p
+    JOIN users u ON u.user_id = p.created_by
+    LEFT JOIN channels ch ON ch.id = p.channel_id
+    WHERE NOT p.published AND NOT p.draft AND NOT p.notified
+      AND u.notify_before > 0
+      AND p.publish_time > p_now
+      AND p.publish_time - make_interval(mins => u.notify_before) <= p_now;
+
+    RETURN jsonb_build_object('due', v_due, 'notify', v_notify);
+END;
+$$;
+
+-- Итоги такта одним запросом: опубликованные (повторы переносятся на
+-- следующий интервал), пропущенные и отправленные напоминания
+CREATE OR REPLACE FUNCTION scheduler_complete(p_sent BIGINT[], p_skipped BIGINT[], p_notified BIGINT[] DEFAULT '{}')
+RETURNS TABLE (id BIGINT, channel_id BIGINT, published BOOLEAN, publish_time TIMESTAMPTZ)
+LANGUAGE sql VOLATILE AS $$
+    UPDATE posts p SET
+        published = CASE
+            WHEN p.id = ANY(p_sent) AND COALESCE(p.repeat_interval, 0) > 0 THEN FALSE
+            WHEN p.id = ANY(p_sent) OR p.id = ANY(p_skipped) THEN TRUE
+            ELSE p.published END,
+        publish_time = CASE
+            WHEN p.id = ANY(p_sent) AND COALESCE(p.repeat_interval, 0) > 0
+                THEN p.publish_time + make_interval(secs => p.repeat_interval)
+            ELSE p.publish_time END,
+        notified = CASE
+            WHEN p.id = ANY(p_sent) AND COALESCE(p.repeat_interval, 0) > 0 THEN FALSE
+            WHEN p.id = ANY(p_notified) THEN TRUE
+            ELSE p.notified END,
+        claimed_at = CASE
+            WHEN p.id = ANY(p_sent) OR p.id = ANY(p_skipped) THEN NULL
+            ELSE p.claimed_at END
+    WHERE p.id = ANY(p_sent) OR p.id = ANY(p_skipped) OR p.id = ANY(p_notified)
+    RETURNING p.id, p.channel_id, p.published, p.publish_time;
+$$;
+
+INSERT INTO schema_migrations (version, name) VALUES (4, 'scheduler_tick')
+ON CONFLICT (version) DO NOTHING;
+
+-- 0005 channel_post_stats
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+SELECT pg_advisory_xact_lock(hashtext('schema_migrations'));
+
+-- Счетчики постов по каналам, которые поддерживают триггеры на posts
+-- (меню и статистика читают готовые числа вместо подсчета по posts)
+CREATE TABLE IF NOT EXISTS channel_post_stats (
+    channel_id BIGINT PRIMARY KEY REFERENCES channels(id) ON DELETE CASCADE,
+    scheduled BIGINT NOT NULL DEFAULT 0,
+    drafts BIGINT NOT NULL DEFAULT 0,
+    published BIGINT NOT NULL DEFAULT 0,
+    total BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Прибавить (p_sign = 1) или вычесть (-1) пост из счетчиков канала.
+-- Строки удаленного канала не создаются (каскадное удаление постов)
+CREATE OR REPLACE FUNCTION channel_post_stats_apply(p_channel_id BIGINT, p_published BOOLEAN, p_draft BOOLEAN,
+                                                    p_publish_time TIMESTAMPTZ, p_sign INTEGER)
+RETURNS VOID
+LANGUAGE sql VOLATILE AS $$
+    INSERT INTO channel_post_stats AS s (channel_id, scheduled, drafts, published, total, updated_at)
+    SELECT p_channel_id,
+           p_sign * (NOT COALESCE(p_published, FALSE) AND NOT COALESCE(p_draft, FALSE) AND p_publish_time IS NOT NULL)::int,
+           p_sign * COALESCE(p_draft, FALSE)::int,
+           p_sign * COALESCE(p_published, FALSE)::int,
+           p_sign,
+           NOW()
+    WHERE EXISTS (SELECT 1 FROM channels WHERE id = p_channel_id)
+    ON CONFLICT (channel_id) DO UPDATE SET
+        scheduled = s.scheduled + EXCLUDED.scheduled,
+        drafts = s.drafts + EXCLUDED.drafts,
+        published = s.published + EXCLUDED.published,
+        total = s.total + EXCLUDED.total,
+        updated_at = NOW();
+$$;
+
+CREATE OR REPLACE FUNCTION channel_post_stats_trigger()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM channel_post_stats_apply(OLD.channel_id, OLD.published, OLD.draft, OLD.publish_time, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM channel_post_stats_apply(NEW.channel_id, NEW.published, NEW.draft, NEW.publish_time, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS posts_stats_insert_delete ON posts;
+CREATE TRIGGER posts_stats_insert_delete AFTER INSERT OR DELETE ON posts
+    FOR EACH ROW EXECUTE FUNCTION channel_post_stats_trigger();
+
+-- Обновление пересчитывается, только если меняется статус или канал
+DROP TRIGGER IF EXISTS posts_stats_update ON posts;
+CREATE TRIGGER posts_stats_update AFTER UPDATE OF channel_id, published, draft, publish_time ON posts
+    FOR EACH ROW
+    WHEN (OLD.channel_id IS DISTINCT FROM NEW.channel_id
+          OR OLD.published IS DISTINCT FROM NEW.published
+          OR OLD.draft IS DISTINCT FROM NEW.draft
+          OR (OLD.publish_time IS NULL) <> (NEW.publish_time IS NULL))
+    EXECUTE FUNCTION channel_post_stats_trigger();
+
+-- Полный пересчет (первое заполнение или ручная сверка)
+CREATE OR REPLACE FUNCTION rebuild_channel_post_stats()
+RETURNS VOID
+LANGUAGE sql VOLATILE AS $$
+    DELETE FROM channel_post_stats;
+    INSERT INTO channel_post_stats (channel_id, scheduled, drafts, published, total)
+    SELECT channel_id,
+           COUNT(*) FILTER (WHERE NOT published AND NOT draft AND publish_time IS NOT NULL),
+           COUNT(*) FILTER (WHERE draft),
+           COUNT(*) FILTER (WHERE published),
+           COUNT(*)
+    FROM posts
+    GROUP BY channel_id;
+$$;
+
+SELECT rebuild_channel_post_stats();
+
+INSERT INTO schema_migrations (version, name) VALUES (5, 'channel_post_stats')
+ON CONFLICT (version) DO NOTHING;
+
+-- 0006 post_versions
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+SELECT pg_advisory_xact_lock(hashtext('schema_migrations'));
+
+-- Версия поста для оптимистичной блокировки при редактировании: любое
+-- изменение содержимого, времени или статуса увеличивает version
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION posts_bump_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF (NEW.text, NEW.media_type, NEW.media_id, NEW.parse_mode, NEW.buttons, NEW.publish_time,
+        NEW.repeat_interval, NEW.draft, NEW.published, NEW.channel_id, NEW.chat_id)
+       IS DISTINCT FROM
+       (OLD.text, OLD.media_type, OLD.media_id, OLD.parse_mode, OLD.buttons, OLD.publish_time,
+        OLD.repeat_interval, OLD.draft, OLD.published, OLD.channel_id, OLD.chat_id) THEN
+        NEW.version := OLD.version + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS posts_version ON posts;
+CREATE TRIGGER posts_version BEFORE UPDATE ON posts
+    FOR EACH ROW EXECUTE FUNCTION posts_bump_version();
+
+INSERT INTO schema_migrations (version, name) VALUES (6, 'post_versions')
+ON CONFLICT (version) DO NOTHING;
+
+-- 0007 scheduler_indexes
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+SELECT pg_advisory_xact_lock(hashtext('schema_migrations'));
+
+-- Индексы под горячие запросы вместо одностолбцовых.
+-- Создаются без CONCURRENTLY: миграция выполняется в одной транзакции
+
+-- Планировщик: готовые к публикации посты (get_due_posts, scheduler_claim)
+-- и напоминания (publish_time > now). В индекс попадают только
+-- неопубликованные не-черновики, поэтому он не растет с архивом
+CREATE INDEX IF NOT EXISTS idx_posts_due ON posts(publish_time)
+    WHERE NOT published AND NOT draft;
+
+-- Списки по каналам: channel_id IN (...), published = false, сортировка по publish_time
+CREATE INDEX IF NOT EXISTS idx_posts_channel_published_time ON posts(channel_id, published, publish_time);
+
+-- Черновики и опубликованные по каналам, новые сверху
+CREATE INDEX IF NOT EXISTS idx_posts_channel_drafts ON posts(channel_id, created_at DESC)
+    WHERE draft;
+CREATE INDEX IF NOT EXISTS idx_posts_channel_published_created ON posts(channel_id, created_at DESC)
+    WHERE published;
+
+-- Покрыты новыми индексами (channel_id - префикс составного индекса)
+DROP INDEX IF EXISTS idx_posts_channel_id;
+DROP INDEX IF EXISTS idx_posts_publish_time;
+DROP INDEX IF EXISTS idx_posts_published_draft;
+
+INSERT INTO schema_migrations (version, name) VALUES (7, 'scheduler_indexes')
+ON CONFLICT (version) DO NOTHING;
+
+-- 0008 posts_archive
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+SELECT pg_advisory_xact_lock(hashtext('schema_migrations'));
+
+-- Архив опубликованных постов: старые опубликованные посты без повтора
+-- переносятся из posts пачками, чтобы планировщик, списки и индексы posts
+-- не росли вместе с историей. Архив читают только просмотры истории
+
+CREATE TABLE IF NOT EXISTS posts_archive (
+    id BIGINT PRIMARY KEY, -- id из posts сохраняется
+    channel_id BIGINT NOT NULL,
+    chat_id BIGINT NOT NULL,
+    created_by BIGINT,
+    text TEXT,
+    media_type TEXT,
+    media_id TEXT,
+    parse_mode TEXT,
+    buttons JSONB,
+    publish_time TIMESTAMP WITH TIME ZONE,
+    repeat_interval INTEGER DEFAULT 0,
+    draft BOOLEAN DEFAULT FALSE,
+    published BOOLEAN DEFAULT TRUE,
+    notified BOOLEAN DEFAULT FALSE,
+    version INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP WITH TIME ZONE,
+    archived_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    text_preview TEXT GENERATED ALWAYS AS (left(text, 64)) STORED,
+    FOREIGN KEY (channel_id) REFERENCES channels(id) ON DELETE CASCADE
+);
+
+-- История по каналам, новые сверху (как idx_posts_channel_published_created)
+CREATE INDEX IF NOT EXISTS idx_posts_archive_channel_created ON posts_archive(channel_id, created_at DESC);
+
+-- Кандидаты в архив: в индекс попадают только опубликованные посты без
+-- повтора, которые еще лежат в posts
+CREATE INDEX IF NOT EXISTS idx_posts_archivable ON posts(publish_time)
+    WHERE published AND COALESCE(repeat_interval, 0) = 0;
+
+-- Счетчики channel_post_stats считают посты за все время: перенос в архив
+-- вычитает пост из posts и прибавляет его в архиве
+DROP TRIGGER IF EXISTS posts_archive_stats ON posts_archive;
+CREATE TRIGGER posts_archive_stats AFTER INSERT OR DELETE ON posts_archive
+    FOR EACH ROW EXECUTE FUNCTION channel_post_stats_trigger();
+
+CREATE OR REPLACE FUNCTION rebuild_channel_post_stats()
+RETURNS VOID
+LANGUAGE sql VOLATILE AS $$
+    DELETE FROM channel_post_stats;
+    INSERT INTO channel_post_stats (channel_id, scheduled, drafts, published, total)
+    SELECT channel_id,
+           COUNT(*) FILTER (WHERE NOT published AND NOT draft AND publish_time IS NOT NULL),
+           COUNT(*) FILTER (WHERE draft),
+           COUNT(*) FILTER (WHERE published),
+           COUNT(*)
+    FROM (
+        SELECT channel_id, published, draft, publish_time FROM posts
+        UNION ALL
+        SELECT channel_id, published, draft, publish_time FROM posts_archive
+    ) p
+    GROUP BY channel_id;
+$$;
+
+CREATE OR REPLACE FUNCTION count_posts_by_status(channel_ids BIGINT[])
+RETURNS TABLE (scheduled BIGINT, drafts BIGINT, published BIGINT, total BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT
+        COUNT(*) FILTER (WHERE NOT published AND NOT draft AND publish_time IS NOT NULL),
+        COUNT(*) FILTER (WHERE draft),
+        COUNT(*) FILTER (WHERE published),
+        COUNT(*)
+    FROM (
+        SELECT published, draft, publish_time FROM posts WHERE channel_id = ANY(channel_ids)
+        UNION ALL
+        SELECT published, draft, publish_time FROM posts_archive WHERE channel_id = ANY(channel_ids)
+    ) p;
+$$;
+
+-- Перенести одну пачку (не больше p_batch постов, сначала самые старые)
+-- одним запросом. Строки, занятые другой транзакцией, пропускаются.
+-- Возвращает перенесенные посты
+CREATE OR REPLACE FUNCTION archive_published_posts(p_older_than_days INTEGER, p_batch INTEGER DEFAULT 500)
+RETURNS TABLE (id BIGINT, channel_id BIGINT)
+LANGUAGE sql VOLATILE AS $$
+    WITH batch AS (
+        SELECT p.id FROM posts p
+        WHERE p.published AND COALESCE(p.repeat_interval, 0) = 0
+          AND p.publish_time < NOW() - make_interval(days => p_older_than_days)
+        ORDER BY p.publish_time
+        LIMIT p_batch
+        FOR UPDATE SKIP LOCKED
+    ), moved AS (
+        DELETE FROM posts p USING batch WHERE p.id = batch.id
+        RETURNING p.id, p.channel_id, p.chat_id, p.created_by, p.text, p.media_type, p.media_id, p.parse_mode,
+                  p.buttons, p.publish_time, p.repeat_interval, p.draft, p.published, p.notified, p.version,
+                  p.created_at
+    )
+    INSERT INTO posts_archive AS a (id, channel_id, chat_id, created_by, text, media_type, media_id, parse_mode,
+                                    buttons, publish_time, repeat_interval, draft, published, notified, version,
+                                    created_at)
+    SELECT * FROM moved
+    RETURNING a.id, a.channel_id;
+$$;
+
+INSERT INTO schema_migrations (version, name) VALUES (8, 'posts_archive')
+ON CONFLICT (version) DO NOTHING;
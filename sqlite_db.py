@@ -0,0 +1,953 @@
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from storage import KEYSET_ORDER, StorageBackend, decode_cursor, post_columns
+
+# Columns stored as 0/1 that Supabase returns as booleans
+BOOL_COLUMNS = {"draft", "published", "notified", "is_admin_verified", "post_published", "post_failed", "daily_summary"}
+
+# Timestamps are stored as fixed-width UTC ISO strings so that text
+# comparison (publish_time <= now) matches time order
+NOW_SQL = "(strftime('%Y-%m-%dT%H:%M:%f000+00:00', 'now'))"
+
+# Ids per IN (...) list in batch lookups (SQLite caps bound parameters)
+ID_CHUNK_SIZE = 500
+
+
+
+def _post_stats_upsert(row: str, sign: int) -> str:
+    """Trigger statement adding (sign=1) or removing (-1) post ``row`` from channel_post_stats."""
+    return f"""
+    INSERT INTO channel_post_stats (channel_id, scheduled, drafts, published, total, updated_at)
+    SELECT {row}.channel_id,
+           {sign} * (COALESCE({row}.published, 0) = 0 AND COALESCE({row}.draft, 0) = 0 AND {row}.publish_time IS NOT NULL),
+           {sign} * (COALESCE({row}.draft, 0) = 1),
+           {sign} * (COALESCE({row}.published, 0) = 1),
+           {sign},
+           {NOW_SQL}
+    WHERE EXISTS (SELECT 1 FROM channels WHERE id = {row}.channel_id)
+    ON CONFLICT (channel_id) DO UPDATE SET
+        scheduled = scheduled + excluded.scheduled,
+        drafts = drafts + excluded.drafts,
+        published = published + excluded.published,
+        total = total + excluded.total,
+        updated_at = excluded.updated_at;"""
+
+
+SCHEMA_SQL = f"""
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    timezone TEXT DEFAULT 'UTC',
+    language TEXT DEFAULT 'ru',
+    date_format TEXT DEFAULT 'YYYY-MM-DD',
+    time_format TEXT DEFAULT 'HH:MM',
+    notify_before INTEGER DEFAULT 0,
+    created_at TEXT DEFAULT {NOW_SQL}
+);
+
+CREATE TABLE IF NOT EXISTS channels (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    username TEXT,
+    is_admin_verified INTEGER DEFAULT 0,
+    admin_check_date TEXT,
+    created_at TEXT DEFAULT {NOW_SQL}
+);
+
+CREATE TABLE IF NOT EXISTS channel_admins (
+    channel_id INTEGER,
+    user_id INTEGER,
+    role TEXT DEFAULT 'admin',
+    added_at TEXT DEFAULT {NOW_SQL},
+    PRIMARY KEY (channel_id, user_id),
+    FOREIGN KEY (channel_id) REFERENCES channels(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    created_by INTEGER,
+    text TEXT,
+    media_type TEXT,
+    media_id TEXT,
+    parse_mode TEXT DEFAULT 'HTML',
+    buttons TEXT,
+    publish_time TEXT,
+    repeat_interval INTEGER DEFAULT 0,
+    draft INTEGER DEFAULT 0,
+    published INTEGER DEFAULT 0,
+    notified INTEGER DEFAULT 0,
+    claimed_at TEXT,
+    version INTEGER NOT NULL DEFAULT 1,
+    text_preview TEXT GENERATED ALWAYS AS (substr(text, 1, 64)) STORED,
+    created_at TEXT DEFAULT {NOW_SQL},
+    FOREIGN KEY (channel_id) REFERENCES channels(id) ON DELETE CASCADE
+);
+
+-- Old published posts moved out of posts (as in migrations/0008_posts_archive.sql)
+CREATE TABLE IF NOT EXISTS posts_archive (
+    id INTEGER PRIMARY KEY,
+    channel_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    created_by INTEGER,
+    text TEXT,
+    media_type TEXT,
+    media_id TEXT,
+    parse_mode TEXT,
+    buttons TEXT,
+    publish_time TEXT,
+    repeat_interval INTEGER DEFAULT 0,
+    draft INTEGER DEFAULT 0,
+    published INTEGER DEFAULT 1,
+    notified INTEGER DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 1,
+    text_preview TEXT GENERATED ALWAYS AS (substr(text, 1, 64)) STORED,
+    created_at TEXT,
+    archived_at TEXT DEFAULT {NOW_SQL},
+    FOREIGN KEY (channel_id) REFERENCES channels(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS notification_settings (
+    user_id INTEGER PRIMARY KEY,
+    post_published INTEGER DEFAULT 1,
+    post_failed INTEGER DEFAULT 1,
+    daily_summary INTEGER DEFAULT 0,
+    created_at TEXT DEFAULT {NOW_SQL}
+);
+
+-- Per-channel post counters maintained by the triggers below (as in migrations/0005_channel_post_stats.sql)
+CREATE TABLE IF NOT EXISTS channel_post_stats (
+    channel_id INTEGER PRIMARY KEY REFERENCES channels(id) ON DELETE CASCADE,
+    scheduled INTEGER NOT NULL DEFAULT 0,
+    drafts INTEGER NOT NULL DEFAULT 0,
+    published INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT DEFAULT {NOW_SQL}
+);
+
+CREATE TRIGGER IF NOT EXISTS posts_stats_insert AFTER INSERT ON posts
+BEGIN{_post_stats_upsert("NEW", 1)}
+END;
+
+CREATE TRIGGER IF NOT EXISTS posts_stats_delete AFTER DELETE ON posts
+BEGIN{_post_stats_upsert("OLD", -1)}
+END;
+
+CREATE TRIGGER IF NOT EXISTS posts_stats_update AFTER UPDATE OF channel_id, published, draft, publish_time ON posts
+WHEN OLD.channel_id IS NOT NEW.channel_id
+  OR OLD.published IS NOT NEW.published
+  OR OLD.draft IS NOT NEW.draft
+  OR (OLD.publish_time IS NULL) <> (NEW.publish_time IS NULL)
+BEGIN{_post_stats_upsert("OLD", -1)}{_post_stats_upsert("NEW", 1)}
+END;
+
+-- Counters cover archived posts too, so moving a post leaves them unchanged
+CREATE TRIGGER IF NOT EXISTS posts_archive_stats_insert AFTER INSERT ON posts_archive
+BEGIN{_post_stats_upsert("NEW", 1)}
+END;
+
+CREATE TRIGGER IF NOT EXISTS posts_archive_stats_delete AFTER DELETE ON posts_archive
+BEGIN{_post_stats_upsert("OLD", -1)}
+END;
+
+-- Content, schedule or status changes bump the post version (as in migrations/0006_post_versions.sql)
+CREATE TRIGGER IF NOT EXISTS posts_version
+AFTER UPDATE OF text, media_type, media_id, parse_mode, buttons, publish_time, repeat_interval, draft, published,
+                channel_id, chat_id ON posts
+WHEN NEW.version = OLD.version
+  AND (OLD.text IS NOT NEW.text OR OLD.media_type IS NOT NEW.media_type OR OLD.media_id IS NOT NEW.media_id
+       OR OLD.parse_mode IS NOT NEW.parse_mode OR OLD.buttons IS NOT NEW.buttons
+       OR OLD.publish_time IS NOT NEW.publish_time OR OLD.repeat_interval IS NOT NEW.repeat_interval
+       OR OLD.draft IS NOT NEW.draft OR OLD.published IS NOT NEW.published
+       OR OLD.channel_id IS NOT NEW.channel_id OR OLD.chat_id IS NOT NEW.chat_id)
+BEGIN
+    UPDATE posts SET version = OLD.version + 1 WHERE id = NEW.id;
+END;
+
+-- Same indexes as the Supabase migrations (partial index conditions are
+-- written like POST_STATUS_FILTER so the planner can match them)
+CREATE INDEX IF NOT EXISTS idx_posts_due ON posts(publish_time) WHERE published = 0 AND draft = 0;
+CREATE INDEX IF NOT EXISTS idx_posts_channel_published_time ON posts(channel_id, published, publish_time);
+CREATE INDEX IF NOT EXISTS idx_posts_channel_drafts ON posts(channel_id, created_at DESC) WHERE draft = 1;
+CREATE INDEX IF NOT EXISTS idx_posts_channel_published_created ON posts(channel_id, created_at DESC) WHERE published = 1;
+DROP INDEX IF EXISTS idx_posts_channel_id;
+DROP INDEX IF EXISTS idx_posts_publish_time;
+DROP INDEX IF EXISTS idx_posts_published_draft;
+CREATE INDEX IF NOT EXISTS idx_posts_archivable ON posts(publish_time)
+    WHERE published = 1 AND COALESCE(repeat_interval, 0) = 0;
+CREATE INDEX IF NOT EXISTS idx_posts_archive_channel_created ON posts_archive(channel_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_channel_admins_user_id ON channel_admins(user_id);
+CREATE INDEX IF NOT EXISTS idx_channels_chat_id ON channels(chat_id);
+"""
+
+# Columns that can be written through insert/update helpers
+WRITABLE_COLUMNS = {
+    "users": {"user_id", "timezone", "language", "date_format", "time_format", "notify_before"},
+    "channels": {"chat_id", "name", "username", "is_admin_verified", "admin_check_date"},
+    "posts": {"channel_id", "chat_id", "created_by", "text", "media_type", "media_id", "parse_mode", "buttons",
+              "publish_time", "repeat_interval", "draft", "published", "notified"},
+    "notification_settings": {"user_id", "post_published", "post_failed", "daily_summary"},
+}
+
+TIMESTAMP_COLUMNS = {"publish_time", "admin_check_date"}
+
+# posts columns added after the first release (ALTERed into older files)
+POSTS_ADDED_COLUMNS = {
+    "claimed_at": "TEXT",
+    "version": "INTEGER NOT NULL DEFAULT 1",
+}
+
+# Columns copied from posts into posts_archive
+ARCHIVE_COLUMNS = ("id, channel_id, chat_id, created_by, text, media_type, media_id, parse_mode, buttons, publish_time, "
+                   "repeat_interval, draft, published, notified, version, created_at")
+
+# Channel columns embedded as channels(name, chat_id) in post lists
+CHANNEL_EMBED = "c.name AS _channel_name, c.chat_id AS _channel_chat_id"
+
+POST_ORDER = {
+    # Postgres sorts NULL publish_time last in ascending order
+    "publish_time": "p.publish_time IS NULL, p.publish_time",
+    "scheduled": "p.publish_time IS NULL, p.publish_time",
+    "drafts": "p.created_at DESC",
+    "published": "p.created_at DESC",
+    # Unpublished posts by publish_time, published ones newest first (as before paging)
+    "all": "p.published, p.draft, CASE WHEN p.published THEN 0 ELSE p.publish_time IS NULL END, "
+           "CASE WHEN p.published THEN NULL ELSE p.publish_time END, p.created_at DESC, p.id DESC",
+}
+
+POST_STATUS_FILTER = {
+    "scheduled": "p.published = 0 AND p.draft = 0",
+    "drafts": "p.draft = 1",
+    "published": "p.published = 1",
+    "all": "1 = 1",
+}
+
+
+def utc_timestamp(value=None) -> str:
+    """Normalize a datetime/ISO string (or now) to the stored UTC format."""
+    if value is None or value == "now()":
+        value = datetime.now(timezone.utc)
+    elif isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+class SQLiteDB(StorageBackend):
+    """SQLite implementation of the SupabaseDB interface (one connection per worker thread)."""
+
+    def __init__(self, path: str = "botautopub.sqlite3", busy_timeout: float = 5.0):
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        if path == ":memory:":
+            self._target = f"file:botautopub-{uuid.uuid4().hex}?mode=memory&cache=shared"
+            self._uri = True
+        else:
+            self._target = path
+            self._uri = False
+        # Keeps a shared in-memory database alive between thread connections
+        self._keeper = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._target, timeout=self.busy_timeout, uri=self._uri, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        if not self._uri:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+
+    def init_schema(self):
+        """Create tables and indexes if they do not exist."""
+        with self.conn:
+            has_stats = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'channel_post_stats'"
+            ).fetchone()
+            self.conn.executescript(SCHEMA_SQL)
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(posts)")}
+            for column, definition in POSTS_ADDED_COLUMNS.items():
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE posts ADD COLUMN {column} {definition}")
+        if not has_stats:
+            self._rebuild_post_stats()
+
+    def _rebuild_post_stats(self):
+        """Recount channel_post_stats from posts and posts_archive (first run on an existing file)."""
+        with self.conn:
+            self.conn.execute("DELETE FROM channel_post_stats")
+            self.conn.execute(
+                "INSERT INTO channel_post_stats (channel_id, scheduled, drafts, published, total) "
+                "SELECT channel_id, "
+                "SUM(CASE WHEN published = 0 AND draft = 0 AND publish_time IS NOT NULL THEN 1 ELSE 0 END), "
+                "SUM(CASE WHEN draft = 1 THEN 1 ELSE 0 END), "
+                "SUM(CASE WHEN published = 1 THEN 1 ELSE 0 END), "
+                "COUNT(*) FROM (SELECT channel_id, published, draft, publish_time FROM posts "
+                "UNION ALL SELECT channel_id, published, draft, publish_time FROM posts_archive) GROUP BY channel_id"
+            )
+
+    # Row helpers
+    @staticmethod
+    def _row(row) -> dict:
+        if row is None:
+            return None
+        data = dict(row)
+        for key in BOOL_COLUMNS.intersection(data):
+            if data[key] is not None:
+                data[key] = bool(data[key])
+        if "_channel_name" in data:
+            data["channels"] = {"name": data.pop("_channel_name"), "chat_id": data.pop("_channel_chat_id")}
+        return data
+
+    def _fetchall(self, sql: str, params=()) -> list:
+        return [self._row(row) for row in self.conn.execute(sql, params).fetchall()]
+
+    def _fetchone(self, sql: str, params=()):
+        return self._row(self.conn.execute(sql, params).fetchone())
+
+    @staticmethod
+    def _values(table: str, values: dict) -> dict:
+        unknown = set(values) - WRITABLE_COLUMNS[table]
+        if unknown:
+            raise ValueError(f"Unknown {table} columns: {', '.join(sorted(unknown))}")
+        result = {}
+        for key, value in values.items():
+            if key in TIMESTAMP_COLUMNS and value is not None:
+                value = utc_timestamp(value)
+            elif key == "buttons" and isinstance(value, (list, dict)):
+                value = json.dumps(value)
+            result[key] = value
+        return result
+
+    def _insert(self, table: str, values: dict) -> dict:
+        values = self._values(table, values)
+        columns = ", ".join(values)
+        placeholders = ", ".join(f":{key}" for key in values)
+        with self.conn:
+            row = self.conn.execute(
+                f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) RETURNING *", values
+            ).fetchone()
+        return self._row(row)
+
+    def _update(self, table: str, key_column: str, key, updates: dict) -> dict:
+        values = self._values(table, updates)
+        assignments = ", ".join(f"{column} = :{column}" for column in values)
+        values["_key"] = key
+        with self.conn:
+            row = self.conn.execute(
+                f"UPDATE {table} SET {assignments} WHERE {key_column} = :_key RETURNING *", values
+            ).fetchone()
+            if row is not None and table == "posts":
+                # RETURNING does not see the version bumped by the AFTER trigger
+                row = self.conn.execute("SELECT * FROM posts WHERE id = ?", (row["id"],)).fetchone()
+        return self._row(row)
+
+    @staticmethod
+    def _post_select(projection: str, embed_channel: bool = False) -> str:
+        columns = post_columns(projection)
+        if columns == "*":
+            select = "p.*"
+        else:
+            select = ", ".join(f"p.{column.strip()}" for column in columns.split(","))
+        if embed_channel:
+            select += ", " + CHANNEL_EMBED
+        return select
+
+    def _admin_channel_ids(self, user_id: int) -> list:
+        rows = self.conn.execute("SELECT channel_id FROM channel_admins WHERE user_id = ?", (user_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def _in(ids: list) -> str:
+        return ", ".join("?" for _ in ids)
+
+    def _fetch_by_ids(self, select: str, table: str, column: str, ids: list) -> list:
+        ids = list(dict.fromkeys(i for i in ids if i))
+        rows = []
+        for start in range(0, len(ids), ID_CHUNK_SIZE):
+            chunk = ids[start:start + ID_CHUNK_SIZE]
+            rows.extend(self._fetchall(f"SELECT {select} FROM {table} WHERE {column} IN ({self._in(chunk)})", chunk))
+        return rows
+
+    # Users
+    def get_user(self, user_id: int):
+        try:
+            return self._fetchone("SELECT * FROM users WHERE user_id = ?", (user_id,))
+        except Exception as e:
+            print(f"Error getting user {user_id}: {e}")
+            return None
+
+    def get_users(self, user_ids: list) -> dict:
+        try:
+            return {row["user_id"]: row for row in self._fetch_by_ids("*", "users", "user_id", user_ids)}
+        except Exception as e:
+            print(f"Error getting users {list(user_ids)}: {e}")
+            return {}
+
+    def ensure_user(self, user_id: int, default_lang: str = None):
+        try:
+            with self.conn:
+                row = self.conn.execute(
+                    "INSERT INTO users (user_id, language) VALUES (?, ?) "
+                    "ON CONFLICT (user_id) DO UPDATE SET user_id = excluded.user_id RETURNING *",
+                    (user_id, default_lang or "ru"),
+                ).fetchone()
+            return self._row(row)
+        except Exception as e:
+            print(f"Error ensuring user {user_id}: {e}")
+            return None
+
+    def update_user(self, user_id: int, updates: dict):
+        if not updates:
+            return None
+        try:
+            return self._update("users", "user_id", user_id, updates)
+        except Exception as e:
+            print(f"Error updating user {user_id}: {e}")
+            return None
+
+    # Channel management
+    def add_channel(self, chat_id: int, name: str, username: str = None, is_admin_verified: bool = False):
+        try:
+            data = self._values("channels", {
+                "chat_id": chat_id,
+                "name": name,
+                "username": username,
+                "is_admin_verified": is_admin_verified,
+                "admin_check_date": "now()" if is_admin_verified else None,
+            })
+            with self.conn:
+                row = self.conn.execute(
+                    "INSERT INTO channels (chat_id, name, username, is_admin_verified, admin_check_date) "
+                    "VALUES (:chat_id, :name, :username, :is_admin_verified, :admin_check_date) "
+                    "ON CONFLICT (chat_id) DO UPDATE SET name = excluded.name, username = excluded.username, "
+                    "is_admin_verified = excluded.is_admin_verified, admin_check_date = excluded.admin_check_date "
+                    "RETURNING *",
+                    data,
+                ).fetchone()
+            return self._row(row)
+        except Exception as e:
+            print(f"Error adding channel {chat_id}: {e}")
+            return None
+
+    def list_channels(self, user_id: int = None):
+        try:
+            if user_id:
+                return self._fetchall(
+                    "SELECT c.* FROM channels c JOIN channel_admins a ON a.channel_id = c.id WHERE a.user_id = ?",
+                    (user_id,),
+                )
+            return self._fetchall("SELECT * FROM channels")
+        except Exception as e:
+            print(f"Error listing channels: {e}")
+            return []
+
+    def get_channel(self, channel_id: int):
+        try:
+            if not channel_id:
+                return None
+            return self._fetchone("SELECT * FROM channels WHERE id = ?", (channel_id,))
+        except Exception as e:
+            print(f"Error getting channel {channel_id}: {e}")
+            return None
+
+    def get_channels(self, channel_ids: list) -> dict:
+        try:
+            return {row["id"]: row for row in self._fetch_by_ids("*", "channels", "id", channel_ids)}
+        except Exception as e:
+            print(f"Error getting channels {list(channel_ids)}: {e}")
+            return {}
+
+    def get_channel_by_chat_id(self, chat_id: int):
+        try:
+            return self._fetchone("SELECT * FROM channels WHERE chat_id = ?", (chat_id,))
+        except Exception as e:
+            print(f"Error getting channel by chat_id {chat_id}: {e}")
+            return None
+
+    def remove_channel(self, channel_id: int):
+        try:
+            with self.conn:
+                self.conn.execute("DELETE FROM channels WHERE id = ?", (channel_id,))
+            return True
+        except Exception as e:
+            print(f"Error removing channel {channel_id}: {e}")
+            return False
+
+    def add_channel_admin(self, channel_id: int, user_id: int, role: str = "admin"):
+        try:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO channel_admins (channel_id, user_id, role) VALUES (?, ?, ?) "
+                    "ON CONFLICT (channel_id, user_id) DO NOTHING",
+                    (channel_id, user_id, role),
+                )
+            return True
+        except Exception:
+            return False
+
+    def remove_channel_admin(self, channel_id: int, user_id: int):
+        try:
+            with self.conn:
+                self.conn.execute(
+                    "DELETE FROM channel_admins WHERE channel_id = ? AND user_id = ?", (channel_id, user_id)
+                )
+            return True
+        except Exception:
+            return False
+
+    def is_channel_admin(self, channel_id: int, user_id: int):
+        try:
+            row = self.conn.execute(
+                "SELECT 1 FROM channel_admins WHERE channel_id = ? AND user_id = ?", (channel_id, user_id)
+            ).fetchone()
+            return row is not None
+        except Exception as e:
+            print(f"Error checking admin {user_id} for channel {channel_id}: {e}")
+            return False
+
+    def get_user_channels(self, user_id: int):
+        try:
+            return self._fetchall(
+                "SELECT c.*, a.role AS admin_role FROM channel_admins a "
+                "JOIN channels c ON c.id = a.channel_id WHERE a.user_id = ?",
+                (user_id,),
+            )
+        except Exception as e:
+            print(f"Error getting user channels for {user_id}: {e}")
+            return []
+
+    def update_channel_admin_status(self, channel_id: int, is_admin: bool):
+        try:
+            return self._update("channels", "id", channel_id, {"is_admin_verified": is_admin, "admin_check_date": "now()"})
+        except Exception as e:
+            print(f"Error updating channel {channel_id} admin status: {e}")
+            return False
+
+    # Post management
+    def add_post(self, post_data: dict):
+        try:
+            post_data = dict(post_data)
+            if "format" in post_data:
+                post_data["parse_mode"] = post_data.pop("format")
+            if not post_data.get("parse_mode"):
+                post_data["parse_mode"] = "HTML"
+            if not post_data.get("chat_id") and post_data.get("channel_id"):
+                channel = self.get_channel(post_data["channel_id"])
+                if channel:
+                    post_data["chat_id"] = channel["chat_id"]
+            return self._insert("posts", post_data)
+        except Exception as e:
+            print(f"Error inserting post: {e}")
+            return None
+
+    def get_post(self, post_id: int):
+        try:
+            if not post_id:
+                return None
+            return self._fetchone("SELECT * FROM posts WHERE id = ?", (post_id,))
+        except Exception as e:
+            print(f"Error getting post {post_id}: {e}")
+            return None
+
+    def get_posts(self, post_ids: list, projection: str = "full") -> dict:
+        try:
+            rows = self._fetch_by_ids(self._post_select(projection), "posts p", "p.id", post_ids)
+            return {row["id"]: row for row in rows}
+        except Exception as e:
+            print(f"Error getting posts {list(post_ids)}: {e}")
+            return {}
+
+    def get_post_for_admin(self, post_id: int, user_id: int, include_archive: bool = False):
+        try:
+            if not post_id:
+                return None
+            post = self.get_post(post_id)
+            if not post and include_archive:
+                post = self._fetchone("SELECT * FROM posts_archive WHERE id = ?", (post_id,))
+            if not post:
+                return None
+            post["channels"] = self.get_channel(post["channel_id"])
+            post["is_admin"] = self.is_channel_admin(post["channel_id"], user_id)
+            return post
+        except Exception as e:
+            print(f"Error getting post {post_id} for user {user_id}: {e}")
+            return None
+
+    def list_posts(self, user_id: int = None, channel_id: int = None, only_pending: bool = True, projection: str = "full",
+                   use_replica: bool = True):
+        select = self._post_select(projection)
+        try:
+            where, params = [], []
+            if channel_id:
+                where.append("p.channel_id = ?")
+                params.append(channel_id)
+            elif user_id:
+                channel_ids = self._admin_channel_ids(user_id)
+                if not channel_ids:
+                    return []
+                where.append(f"p.channel_id IN ({self._in(channel_ids)})")
+                params.extend(channel_ids)
+            if only_pending:
+                where.append("p.published = 0")
+            sql = f"SELECT {select} FROM posts p"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            return self._fetchall(sql + f" ORDER BY {POST_ORDER['publish_time']}", params)
+        except Exception as e:
+            print(f"Error listing posts: {e}")
+            return []
+
+    def list_posts_page(self, user_id: int, status: str = "all", page: int = 0, page_size: int = 5,
+                        projection: str = "list_row"):
+        """Page of posts; the "all" list includes the archive (see SupabaseDB)."""
+        select = self._post_select(projection, embed_channel=True)
+        source = "posts"
+        if status == "all":
+            columns = ARCHIVE_COLUMNS + ", text_preview"
+            source = f"(SELECT {columns} FROM posts UNION ALL SELECT {columns} FROM posts_archive)"
+        try:
+            channel_ids = self._admin_channel_ids(user_id)
+            if not channel_ids:
+                return [], 0
+            where = f"p.channel_id IN ({self._in(channel_ids)}) AND {POST_STATUS_FILTER[status]}"
+            total = self.conn.execute(f"SELECT COUNT(*) FROM {source} p WHERE {where}", channel_ids).fetchone()[0]
+            page = max(page, 0)
+            offset = page * page_size
+            if offset >= total and total:
+                # Page vanished (posts deleted or published) - show the last one
+                offset = ((total - 1) // page_size) * page_size
+            posts = self._fetchall(
+                f"SELECT {select} FROM {source} p JOIN channels c ON c.id = p.channel_id "
+                f"WHERE {where} ORDER BY {POST_ORDER[status]} LIMIT ? OFFSET ?",
+                [*channel_ids, page_size, offset],
+            )
+            return posts, total
+        except Exception as e:
+            print(f"Error listing posts page for user {user_id}: {e}")
+            return [], 0
+
+    def list_posts_keyset(self, user_id: int, status: str, cursor: str = None, direction: str = "after",
+                          page_size: int = 5, projection: str = "list_row", include_archive: bool = False):
+        column, desc = KEYSET_ORDER[status]
+        select = self._post_select(projection, embed_channel=True)
+        source = "posts"
+        if include_archive and status == "published":
+            columns = ARCHIVE_COLUMNS + ", text_preview"
+            source = f"(SELECT {columns} FROM posts UNION ALL SELECT {columns} FROM posts_archive)"
+        try:
+            channel_ids = self._admin_channel_ids(user_id)
+            if not channel_ids:
+                return [], 0
+            total = self.count_posts_by_status(user_id)[status]
+            where = f"p.channel_id IN ({self._in(channel_ids)}) AND {POST_STATUS_FILTER[status]}"
+            params = list(channel_ids)
+            if status == "scheduled":
+                where += " AND p.publish_time IS NOT NULL"
+            if cursor and direction in ("after", "before"):
+                value, post_id = decode_cursor(cursor)
+                value = utc_timestamp(value)
+                op = ">" if (direction == "after") != desc else "<"
+                where += f" AND (p.{column} {op} ? OR (p.{column} = ? AND p.id {op} ?))"
+                params += [value, value, post_id]
+            backwards = direction in ("before", "last")
+            order = "DESC" if desc != backwards else "ASC"
+            limit = page_size
+            if direction == "last" and total:
+                limit = (total - 1) % page_size + 1
+            posts = self._fetchall(
+                f"SELECT {select} FROM {source} p JOIN channels c ON c.id = p.channel_id "
+                f"WHERE {where} ORDER BY p.{column} {order}, p.id {order} LIMIT ?",
+                [*params, limit],
+            )
+            if backwards:
+                posts.reverse()
+            if not posts and cursor:
+                return self.list_posts_keyset(user_id, status, None, "last" if direction == "after" else "after",
+                                              page_size, projection, include_archive)
+            return posts, total
+        except Exception as e:
+            print(f"Error listing {status} posts for user {user_id}: {e}")
+            return [], 0
+
+    def count_posts_by_status(self, user_id: int) -> dict:
+        """Sum of the user's channel_post_stats rows."""
+        counts = {"scheduled": 0, "drafts": 0, "published": 0, "total": 0}
+        try:
+            channel_ids = self._admin_channel_ids(user_id)
+            if not channel_ids:
+                return counts
+            for row in self.get_channel_post_stats(channel_ids).values():
+                for key in counts:
+                    counts[key] += row[key]
+            return counts
+        except Exception as e:
+            print(f"Error counting posts for user {user_id}: {e}")
+            return counts
+
+    def get_channel_post_stats(self, channel_ids: list) -> dict:
+        channel_ids = list(channel_ids)
+        stats = {cid: {"scheduled": 0, "drafts": 0, "published": 0, "total": 0} for cid in channel_ids}
+        if not channel_ids:
+            return stats
+        try:
+            rows = self.conn.execute(
+                "SELECT channel_id, scheduled, drafts, published, total FROM channel_post_stats "
+                f"WHERE channel_id IN ({self._in(channel_ids)})",
+                channel_ids,
+            ).fetchall()
+            for row in rows:
+                stats[row["channel_id"]] = {key: row[key] for key in stats[row["channel_id"]]}
+        except Exception as e:
+            print(f"Error getting post stats for channels {channel_ids}: {e}")
+        return stats
+
+    def update_post(self, post_id: int, updates: dict):
+        try:
+            updates = dict(updates)
+            if "format" in updates:
+                updates["parse_mode"] = updates.pop("format")
+            return self._update("posts", "id", post_id, updates)
+        except Exception as e:
+            print(f"Error updating post {post_id}: {e}")
+            return None
+
+    def update_post_if(self, post_id: int, expected_version, changes: dict):
+        """Conditional update of an unpublished post (see SupabaseDB)."""
+        try:
+            changes = dict(changes)
+            if "format" in changes:
+                changes["parse_mode"] = changes.pop("format")
+            values = self._values("posts", changes)
+            assignments = ", ".join(f"{column} = :{column}" for column in values)
+            values.update({"_id": post_id, "_version": expected_version})
+            with self.conn:
+                updated = self.conn.execute(
+                    f"UPDATE posts SET {assignments} WHERE id = :_id AND published = 0 "
+                    "AND (:_version IS NULL OR version = :_version)",
+                    values,
+                ).rowcount
+                current = self._fetchone("SELECT * FROM posts WHERE id = ?", (post_id,))
+            if updated:
+                return current, "ok"
+            if not current:
+                return None, "missing"
+            return current, "published" if current.get("published") else "conflict"
+        except Exception as e:
+            print(f"Error updating post {post_id} at version {expected_version}: {e}")
+            return None, "error"
+
+    def delete_post(self, post_id: int):
+        try:
+            with self.conn:
+                if not self.conn.execute("DELETE FROM posts WHERE id = ?", (post_id,)).rowcount:
+                    self.conn.execute("DELETE FROM posts_archive WHERE id = ?", (post_id,))
+            return True
+        except Exception as e:
+            print(f"Error deleting post {post_id}: {e}")
+            return False
+
+    def archive_published_posts(self, older_than_days: int, batch_size: int = 500) -> int:
+        """Move one batch of old published posts into posts_archive (see SupabaseDB)."""
+        try:
+            cutoff = utc_timestamp(datetime.now(timezone.utc) - timedelta(days=older_than_days))
+            with self.conn:
+                ids = [row[0] for row in self.conn.execute(
+                    "SELECT id FROM posts WHERE published = 1 AND COALESCE(repeat_interval, 0) = 0 "
+                    "AND publish_time < ? ORDER BY publish_time LIMIT ?",
+                    (cutoff, batch_size),
+                ).fetchall()]
+                if not ids:
+                    return 0
+                self.conn.execute(
+                    f"INSERT INTO posts_archive ({ARCHIVE_COLUMNS}) "
+                    f"SELECT {ARCHIVE_COLUMNS} FROM posts WHERE id IN ({self._in(ids)})",
+                    ids,
+                )
+                self.conn.execute(f"DELETE FROM posts WHERE id IN ({self._in(ids)})", ids)
+            return len(ids)
+        except Exception as e:
+            print(f"Error archiving published posts: {e}")
+            return 0
+
+    def get_due_posts(self, current_time, projection: str = "publish_row"):
+        select = self._post_select(projection)
+        try:
+            try:
+                now_str = utc_timestamp(current_time)
+            except Exception:
+                now_str = utc_timestamp()
+            return self._fetchall(
+                f"SELECT {select} FROM posts p WHERE p.published = 0 AND p.draft = 0 AND p.publish_time <= ?",
+                (now_str,),
+            )
+        except Exception as e:
+            print(f"Error getting due posts: {e}")
+            return []
+
+    def mark_post_published(self, post_id: int):
+        try:
+            return self._update("posts", "id", post_id, {"published": True})
+        except Exception as e:
+            print(f"Error marking post {post_id} as published: {e}")
+            return False
+
+    def mark_post_notified(self, post_id: int):
+        return self.update_post(post_id, {"notified": True})
+
+    def claim_scheduler_tick(self, current_time, lease_seconds: int = 300) -> dict:
+        """Claim due posts and collect due reminders (see SupabaseDB)."""
+        tick = {"due": [], "notify": []}
+        try:
+            try:
+                now = datetime.fromisoformat(utc_timestamp(current_time))
+            except Exception:
+                now = datetime.fromisoformat(utc_timestamp())
+            now_str = utc_timestamp(now)
+            lease_str = utc_timestamp(now - timedelta(seconds=lease_seconds))
+            select = self._post_select("publish_row")
+            with self.conn:
+                # One statement selects and claims, so no other writer can claim the same rows
+                ids = [row[0] for row in self.conn.execute(
+                    "UPDATE posts SET claimed_at = ? WHERE id IN (SELECT id FROM posts "
+                    "WHERE published = 0 AND draft = 0 AND publish_time <= ? "
+                    "AND (claimed_at IS NULL OR claimed_at < ?)) RETURNING id",
+                    (now_str, now_str, lease_str),
+                ).fetchall()]
+            rows = self.conn.execute(
+                f"SELECT {select}, c.chat_id AS _chat_id, c.name AS channel_name FROM posts p "
+                f"LEFT JOIN channels c ON c.id = p.channel_id WHERE p.id IN ({self._in(ids)}) "
+                "ORDER BY p.publish_time",
+                ids,
+            ).fetchall() if ids else []
+            for row in rows:
+                post = self._row(row)
+                post["chat_id"] = post.get("chat_id") or post.pop("_chat_id")
+                post.pop("_chat_id", None)
+                tick["due"].append(post)
+
+            rows = self._fetchall(
+                "SELECT p.id, p.channel_id, COALESCE(NULLIF(p.chat_id, 0), c.chat_id) AS chat_id, p.created_by, "
+                "p.publish_time, c.name AS channel_name, u.language, u.notify_before FROM posts p "
+                "JOIN users u ON u.user_id = p.created_by LEFT JOIN channels c ON c.id = p.channel_id "
+                "WHERE p.published = 0 AND p.draft = 0 AND p.notified = 0 AND u.notify_before > 0 "
+                "AND p.publish_time > ?",
+                (now_str,),
+            )
+            for post in rows:
+                notify_before = post.pop("notify_before")
+                if datetime.fromisoformat(post["publish_time"]) - timedelta(minutes=notify_before) <= now:
+                    tick["notify"].append(post)
+        except Exception as e:
+            print(f"Error claiming scheduler tick: {e}")
+        return tick
+
+    def complete_scheduler_tick(self, sent: list = (), skipped: list = (), notified: list = ()):
+        """Record the outcome of a scheduler pass in one transaction (see SupabaseDB)."""
+        sent, skipped, notified = list(sent), list(skipped), list(notified)
+        ids = sent + skipped + notified
+        if not ids:
+            return []
+        try:
+            rows = []
+            with self.conn:
+                posts = self.conn.execute(
+                    f"SELECT id, publish_time, repeat_interval FROM posts WHERE id IN ({self._in(ids)})", ids
+                ).fetchall()
+                for post in posts:
+                    changes = {}
+                    if post["id"] in sent and (post["repeat_interval"] or 0) > 0 and post["publish_time"]:
+                        next_time = datetime.fromisoformat(post["publish_time"]) + timedelta(seconds=post["repeat_interval"])
+                        changes = {"publish_time": utc_timestamp(next_time), "published": 0, "notified": 0}
+                    elif post["id"] in sent or post["id"] in skipped:
+                        changes = {"published": 1}
+                    if post["id"] in notified and "notified" not in changes:
+                        changes["notified"] = 1
+                    assignments = ", ".join(f"{column} = :{column}" for column in changes)
+                    if post["id"] in sent or post["id"] in skipped:
+                        assignments += (", " if assignments else "") + "claimed_at = NULL"
+                    changes["_id"] = post["id"]
+                    rows.append(self.conn.execute(
+                        f"UPDATE posts SET {assignments} WHERE id = :_id "
+                        "RETURNING id, channel_id, published, publish_time",
+                        changes,
+                    ).fetchone())
+            return [self._row(row) for row in rows]
+        except Exception as e:
+            print(f"Error completing scheduler tick: {e}")
+            return None
+
+    def list_posts_by_channel(self, channel_id: int, only_pending: bool = False, projection: str = "full"):
+        return self.list_posts(channel_id=channel_id, only_pending=only_pending, projection=projection) if channel_id else []
+
+    def _posts_with_channel(self, condition: str, order: str, user_id: int = None, projection: str = "full"):
+        select = self._post_select(projection, embed_channel=True)
+        params = []
+        if user_id:
+            channel_ids = self._admin_channel_ids(user_id)
+            if not channel_ids:
+                return []
+            condition += f" AND p.channel_id IN ({self._in(channel_ids)})"
+            params = channel_ids
+        return self._fetchall(
+            f"SELECT {select} FROM posts p JOIN channels c ON c.id = p.channel_id WHERE {condition} ORDER BY {order}",
+            params,
+        )
+
+    def get_scheduled_posts_by_channel(self, user_id: int = None, projection: str = "full"):
+        try:
+            return self._posts_with_channel(POST_STATUS_FILTER["scheduled"], POST_ORDER["scheduled"], user_id, projection)
+        except Exception as e:
+            print(f"Error getting scheduled posts by channel: {e}")
+            return []
+
+    def get_draft_posts_by_channel(self, user_id: int = None, projection: str = "full"):
+        try:
+            return self._posts_with_channel(POST_STATUS_FILTER["drafts"], POST_ORDER["drafts"], user_id, projection)
+        except Exception as e:
+            print(f"Error getting draft posts by channel: {e}")
+            return []
+
+    # Notification settings
+    def get_notification_settings(self, user_id: int):
+        try:
+            return self._fetchone("SELECT * FROM notification_settings WHERE user_id = ?", (user_id,))
+        except Exception as e:
+            print(f"Error getting notification settings for user {user_id}: {e}")
+            return None
+
+    def create_notification_settings(self, settings: dict):
+        try:
+            return self._insert("notification_settings", settings)
+        except Exception as e:
+            print(f"Error creating notification settings: {e}")
+            return None
+
+    def update_notification_settings(self, user_id: int, updates: dict):
+        try:
+            return self._update("notification_settings", "user_id", user_id, updates)
+        except Exception as e:
+            print(f"Error updating notification settings for user {user_id}: {e}")
+            return None
@@ -4,33 +4,28 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 import supabase_db
 from __init__ import TEXTS
+from middlewares import default_language
 
 router = Router()
 
 @router.message(Command("start"))
-async def cmd_start(message: Message, state: FSMContext):
-    user_id = message.from_user.id
+async def cmd_start(message: Message, state: FSMContext, db_user: dict = None):
     # Determine default language from user's Telegram settings
-    lang_code = message.from_user.language_code or ""
-    default_lang = "ru"
-    if lang_code.startswith("en"):
-        default_lang = "en"
-    elif lang_code.startswith("ru"):
-        default_lang = "ru"
+    default_lang = default_language(message.from_user.language_code)
     
-    # Ensure user exists with default settings
-    user = supabase_db.db.ensure_user(user_id, default_lang=default_lang)
+    # The user row is created with these defaults by DBContextMiddleware
+    user = db_user
     
     # Greet in user's language
     lang = user.get("language", default_lang) if user else default_lang
     await message.answer(TEXTS[lang]['start_welcome'])
 
 @router.message(Command("cancel"))
-async def cmd_cancel(message: Message, state: FSMContext):
+async def cmd_cancel(message: Message, state: FSMContext, db_user: dict = None):
     current_state = await state.get_state()
     user_id = message.from_user.id
     lang = "ru"
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     if user:
         lang = user.get("language", "ru")
     if not current_state:
@@ -0,0 +1,264 @@
+"""Storage backend interface shared by SupabaseDB and SQLiteDB (same methods, same row shapes)."""
+
+import re
+from datetime import datetime, timedelta, timezone
+
+# Named column sets for post queries, so list views and the scheduler do not
+# pull full bodies they never read
+POST_PROJECTIONS = {
+    "full": "*",
+    # List views: status flags plus the stored 64-char text_preview
+    "list_row": "id, channel_id, published, draft, publish_time, created_at, text_preview",
+    # Scheduling metadata (notifications, repeats) without the post body
+    "scheduler_row": "id, channel_id, chat_id, created_by, publish_time, repeat_interval, published, draft, notified",
+    # Everything needed to send a post
+    "publish_row": "id, channel_id, chat_id, created_by, publish_time, repeat_interval, published, draft, notified, "
+                   "text, media_type, media_id, parse_mode, buttons",
+}
+
+
+# Keyset (cursor) pagination: list status -> (sort column, newest first).
+# Rows are ordered by (column, id); "all" mixes orders and stays on offsets
+KEYSET_ORDER = {
+    "scheduled": ("publish_time", False),
+    "drafts": ("created_at", True),
+    "published": ("created_at", True),
+}
+
+
+# PostgREST trims trailing zeros of the fraction ("12:00:00.5+00:00"), which
+# fromisoformat only accepts from Python 3.11 on
+_SHORT_FRACTION = re.compile(r"\.(\d{1,5})(?!\d)")
+
+
+def _epoch_micros(value) -> int:
+    if isinstance(value, str):
+        value = _SHORT_FRACTION.sub(lambda m: "." + m.group(1).ljust(6, "0"), value.replace("Z", "+00:00"))
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def encode_cursor(post: dict, status: str) -> str:
+    """Position of ``post`` in a keyset list: "<sort value as epoch µs>.<id>" (fits callback data)."""
+    return f"{_epoch_micros(post[KEYSET_ORDER[status][0]])}.{post['id']}"
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """(UTC datetime, post id) from encode_cursor() output."""
+    micros, post_id = cursor.split(".")
+    value = datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=int(micros))
+    return value, int(post_id)
+
+
+def merge_keyset_rows(row_lists: list, status: str, backwards: bool, limit: int) -> list:
+    """First ``limit`` rows of keyset reads from posts and posts_archive, in read order."""
+    column, desc = KEYSET_ORDER[status]
+    rows = [row for rows in row_lists for row in rows]
+    rows.sort(key=lambda row: (_epoch_micros(row[column]), row["id"]), reverse=desc != backwards)
+    return rows[:limit]
+
+
+def post_columns(projection: str = "full", embed: str = None) -> str:
+    """Select string for a named projection, optionally with an embedded resource."""
+    if projection not in POST_PROJECTIONS:
+        raise ValueError(f"Unknown post projection: {projection}")
+    columns = POST_PROJECTIONS[projection]
+    return f"{columns}, {embed}" if embed else columns
+
+
+# What each method returns when it fails, so a call that misses its deadline
+# answers like one that hit an error
+FAILURE_RESULTS = {
+    "get_users": dict,
+    "get_channels": dict,
+    "get_posts": dict,
+    "list_channels": list,
+    "get_user_channels": list,
+    "list_posts": list,
+    "list_posts_page": lambda: ([], 0),
+    "list_posts_keyset": lambda: ([], 0),
+    "count_posts_by_status": lambda: {"scheduled": 0, "drafts": 0, "published": 0, "total": 0},
+    "get_channel_post_stats": dict,
+    "update_post_if": lambda: (None, "error"),
+    "get_due_posts": list,
+    "claim_scheduler_tick": lambda: {"due": [], "notify": []},
+    "list_posts_by_channel": list,
+    "get_scheduled_posts_by_channel": list,
+    "get_draft_posts_by_channel": list,
+    "is_channel_admin": bool,
+    "is_user_in_project": bool,
+    "remove_channel": bool,
+    "remove_channel_admin": bool,
+    "delete_post": bool,
+    "archive_published_posts": int,
+    "prewarm_connections": int,
+}
+
+
+def failure_result(name: str):
+    """Failure value of method ``name`` (None unless listed in FAILURE_RESULTS)."""
+    factory = FAILURE_RESULTS.get(name)
+    return factory() if factory else None
+
+
+class StorageBackend:
+    """Methods every backend implements (see SupabaseDB for the reference)."""
+
+    def init_schema(self):
+        raise NotImplementedError
+
+    def close(self):
+        """Release connections."""
+
+    def cache_stats(self) -> dict:
+        return {}
+
+    def prewarm_connections(self, connections: int) -> int:
+        return 0
+
+    def replica_stats(self) -> dict:
+        return {}
+
+    def breaker_stats(self) -> dict:
+        return {}
+
+    def record_timeout(self, name: str):
+        """A call to method ``name`` missed its deadline."""
+
+    def fallback_result(self, name: str, *args, **kwargs):
+        """Answer for a call to ``name`` that failed or missed its deadline."""
+        return failure_result(name)
+
+    # Users
+    def get_user(self, user_id: int):
+        raise NotImplementedError
+
+    def get_users(self, user_ids: list) -> dict:
+        raise NotImplementedError
+
+    def ensure_user(self, user_id: int, default_lang: str = None):
+        raise NotImplementedError
+
+    def update_user(self, user_id: int, updates: dict):
+        raise NotImplementedError
+
+    # Channel management
+    def add_channel(self, chat_id: int, name: str, username: str = None, is_admin_verified: bool = False):
+        raise NotImplementedError
+
+    def list_channels(self, user_id: int = None):
+        raise NotImplementedError
+
+    def get_channel(self, channel_id: int):
+        raise NotImplementedError
+
+    def get_channels(self, channel_ids: list) -> dict:
+        raise NotImplementedError
+
+    def get_channel_by_chat_id(self, chat_id: int):
+        raise NotImplementedError
+
+    def remove_channel(self, channel_id: int):
+        raise NotImplementedError
+
+    def add_channel_admin(self, channel_id: int, user_id: int, role: str = "admin"):
+        raise NotImplementedError
+
+    def remove_channel_admin(self, channel_id: int, user_id: int):
+        raise NotImplementedError
+
+    def is_channel_admin(self, channel_id: int, user_id: int):
+        raise NotImplementedError
+
+    def get_user_channels(self, user_id: int):
+        raise NotImplementedError
+
+    def update_channel_admin_status(self, channel_id: int, is_admin: bool):
+        raise NotImplementedError
+
+    # Post management
+    def add_post(self, post_data: dict):
+        raise NotImplementedError
+
+    def get_post(self, post_id: int):
+        raise NotImplementedError
+
+    def get_posts(self, post_ids: list, projection: str = "full") -> dict:
+        raise NotImplementedError
+
+    def get_post_for_admin(self, post_id: int, user_id: int, include_archive: bool = False):
+        raise NotImplementedError
+
+    def list_posts(self, user_id: int = None, channel_id: int = None, only_pending: bool = True, projection: str = "full",
+                   use_replica: bool = True):
+        raise NotImplementedError
+
+    def list_posts_page(self, user_id: int, status: str = "all", page: int = 0, page_size: int = 5,
+                        projection: str = "list_row"):
+        raise NotImplementedError
+
+    def list_posts_keyset(self, user_id: int, status: str, cursor: str = None, direction: str = "after",
+                          page_size: int = 5, projection: str = "list_row", include_archive: bool = False):
+        raise NotImplementedError
+
+    def count_posts_by_status(self, user_id: int) -> dict:
+        raise NotImplementedError
+
+    def get_channel_post_stats(self, channel_ids: list) -> dict:
+        raise NotImplementedError
+
+    def update_post(self, post_id: int, updates: dict):
+        raise NotImplementedError
+
+    def update_post_if(self, post_id: int, expected_version, changes: dict):
+        raise NotImplementedError
+
+    def delete_post(self, post_id: int):
+        raise NotImplementedError
+
+    def archive_published_posts(self, older_than_days: int, batch_size: int = 500) -> int:
+        raise NotImplementedError
+
+    def get_due_posts(self, current_time, projection: str = "publish_row"):
+        raise NotImplementedError
+
+    def mark_post_published(self, post_id: int):
+        raise NotImplementedError
+
+    def mark_post_notified(self, post_id: int):
+        raise NotImplementedError
+
+    def claim_scheduler_tick(self, current_time, lease_seconds: int = 300) -> dict:
+        raise NotImplementedError
+
+    def complete_scheduler_tick(self, sent: list = (), skipped: list = (), notified: list = ()):
+        raise NotImplementedError
+
+    def list_posts_by_channel(self, channel_id: int, only_pending: bool = False, projection: str = "full"):
+        raise NotImplementedError
+
+    def get_scheduled_posts_by_channel(self, user_id: int = None, projection: str = "full"):
+        raise NotImplementedError
+
+    def get_draft_posts_by_channel(self, user_id: int = None, projection: str = "full"):
+        raise NotImplementedError
+
+    # Notification settings
+    def get_notification_settings(self, user_id: int):
+        raise NotImplementedError
+
+    def create_notification_settings(self, settings: dict):
+        raise NotImplementedError
+
+    def update_notification_settings(self, user_id: int, updates: dict):
+        raise NotImplementedError
+
+    # Legacy compatibility
+    def is_user_in_project(self, user_id: int, project_id: int):
+        try:
+            return len(self.get_user_channels(user_id)) > 0
+        except Exception:
+            return False
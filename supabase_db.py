@@ -1,160 +1,283 @@
+import asyncio
+import functools
+import inspect
 import json
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
 from datetime import datetime, timezone
 from supabase import create_client, Client
+from breaker import CircuitBreaker
+from cache import ChannelACLCache, ListResultCache, TTLCache
+from http_pool import install_postgrest_session, prewarm
+from migrate import apply_migrations, load_migrations
+from replica import ReplicaRouter
+from singleflight import SingleFlight
+from storage import (KEYSET_ORDER, POST_PROJECTIONS, StorageBackend, decode_cursor, failure_result,
+                     merge_keyset_rows, post_columns)
 
 # Global database instance (to be set in main)
 db = None
 
-class SupabaseDB:
-    def __init__(self, url: str, key: str):
+# Ids per in.(...) filter in batch lookups, keeps request URLs short
+ID_CHUNK_SIZE = 200
+
+
+class QueryBudget:
+    """Counts PostgREST requests sent while handling a single update (cache hits are free)."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.calls = []
+
+    def record(self, name: str):
+        # list.append is atomic: worker threads of one update record concurrently
+        self.calls.append(name)
+
+    @property
+    def count(self) -> int:
+        return len(self.calls)
+
+    @property
+    def exceeded(self) -> bool:
+        return self.count > self.limit
+
+
+# Budget of the update being handled (set by middlewares.DBContextMiddleware)
+current_budget: ContextVar = ContextVar("current_budget", default=None)
+
+
+def _record_request(request):
+    """Charge a sent PostgREST request to the current update's budget."""
+    budget = current_budget.get()
+    if budget is not None:
+        budget.record(f"{request.method} {request.url.path.rsplit('/', 1)[-1]}")
+
+
+def _utc_iso(current_time) -> str:
+    """ISO string in UTC for a datetime (naive means UTC) or an ISO string."""
+    if hasattr(current_time, "tzinfo") and current_time.tzinfo is None:
+        current_time = current_time.replace(tzinfo=timezone.utc)
+    elif not hasattr(current_time, "tzinfo"):
+        # Fallback for strings or naive values
+        try:
+            current_time = datetime.fromisoformat(str(current_time))
+        except Exception:
+            current_time = datetime.now(timezone.utc)
+    return current_time.astimezone(timezone.utc).isoformat()
+
+
+class SupabaseDB(StorageBackend):
+    def __init__(self, url: str, key: str, user_cache_size: int = 1024, user_cache_ttl: float = 300.0,
+                 acl_cache_size: int = 4096, acl_cache_ttl: float = 600.0,
+                 list_cache_size: int = 2048, list_cache_ttl: float = 120.0,
+                 http_pool_size: int = 20, http_keepalive: int = 20, http_keepalive_expiry: float = 60.0,
+                 http2: bool = False, http_timeout: float = 5.0, http_connect_timeout: float = 2.0,
+                 replica_url: str = None, replica_max_lag: float = 5.0, replica_check_interval: float = 10.0,
+                 breaker_threshold: int = 5, breaker_reset: float = 30.0):
+        # Opens after consecutive primary failures: requests then fail fast
+        # and the cached reads below answer with their last known value
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset, name="Supabase")
+        http_settings = {
+            "pool_size": http_pool_size,
+            "keepalive": http_keepalive,
+            "keepalive_expiry": http_keepalive_expiry,
+            "http2": http2,
+            "timeout": http_timeout,
+            "connect_timeout": http_connect_timeout,
+            "on_request": _record_request,
+        }
         self.client: Client = create_client(url, key)
+        # All DB traffic goes through one PostgREST session: size its pool
+        # for the worker threads and keep idle connections warm
+        install_postgrest_session(self.client, breaker=self.breaker, **http_settings)
+        # List and statistics reads go to the read replica while it keeps up;
+        # scheduler queries and all writes stay on self.client (the primary)
+        replica = None
+        if replica_url:
+            replica = create_client(replica_url, key)
+            install_postgrest_session(replica, **http_settings)
+        self.replicas = ReplicaRouter(self.client, replica, replica_max_lag, replica_check_interval)
+        # Write-through cache of users rows (settings change rarely)
+        self.user_cache = TTLCache(maxsize=user_cache_size, ttl=user_cache_ttl)
+        # user -> administered channels, invalidated by admin/channel writes
+        self.acl_cache = ChannelACLCache(maxsize=acl_cache_size, ttl=acl_cache_ttl)
+        # Post list pages and counters per user, validated by per-channel
+        # versions that every post write bumps
+        self.list_cache = ListResultCache(maxsize=list_cache_size, ttl=list_cache_ttl)
+
+    def cache_stats(self) -> dict:
+        """Hit/miss counters of the in-process caches."""
+        return {
+            "users": self.user_cache.stats(),
+            "channel_acl": self.acl_cache.stats(),
+            "post_lists": self.list_cache.stats(),
+        }
+
+    def _posts_changed(self, rows, channel_id=None):
+        """Bump list versions of the channels a post write touched (all lists if unknown)."""
+        channel_ids = {row.get("channel_id") for row in rows or []}
+        if channel_id is not None:
+            channel_ids.add(channel_id)
+        if not channel_ids or None in channel_ids:
+            self.list_cache.bump_all()
+            return
+        for cid in channel_ids:
+            self.list_cache.bump(cid)
+
+    def _list_settle(self, reader) -> float:
+        # Replica results may predate a write made within the allowed lag
+        return self.replicas.max_lag if reader is not self.client else 0.0
+
+    def replica_stats(self) -> dict:
+        """Read routing counters and the last measured replica lag."""
+        return self.replicas.stats()
+
+    def breaker_stats(self) -> dict:
+        """Circuit breaker state and counters of the primary connection."""
+        return self.breaker.stats()
+
+    def record_timeout(self, name: str):
+        self.breaker.record_timeout()
+
+    def fallback_result(self, name: str, *args, **kwargs):
+        """Last cached answer of a failed read, else the method's failure value."""
+        method = getattr(type(self), name, None)
+        stale = None
+        if method is not None:
+            try:
+                call = inspect.signature(method).bind(self, *args, **kwargs)
+                call.apply_defaults()
+                stale = self._stale_result(name, call.arguments)
+            except TypeError:
+                stale = None
+        if stale is None:
+            return failure_result(name)
+        self.breaker.record_stale_read()
+        return stale
+
+    def _stale_result(self, name: str, args: dict):
+        if name in ("get_user", "ensure_user"):
+            user = self.user_cache.get_stale(args["user_id"])
+            return dict(user) if user is not None else None
+        if name in ("get_user_channels", "is_channel_admin"):
+            channels = self.acl_cache.get_stale(args["user_id"])
+            if channels is None:
+                return None
+            if name == "is_channel_admin":
+                return args["channel_id"] in channels
+            return [dict(channel) for channel in channels.values()]
+        if name == "list_posts_page":
+            key = ("page", args["user_id"], args["status"], max(args["page"], 0), args["page_size"], args["projection"])
+            cached = self.list_cache.get_stale(key)
+            if cached is None:
+                return None
+            posts, total = cached
+            return [dict(post) for post in posts], total
+        if name == "list_posts_keyset":
+            key = ("keyset", args["user_id"], args["status"], args["cursor"], args["direction"], args["page_size"],
+                   args["projection"], args["include_archive"] and args["status"] == "published")
+            cached = self.list_cache.get_stale(key)
+            if cached is None:
+                return None
+            posts, total = cached
+            return [dict(post) for post in posts], total
+        if name == "count_posts_by_status":
+            cached = self.list_cache.get_stale(("counts", args["user_id"]))
+            return dict(cached) if cached is not None else None
+        return None
+
+    def prewarm_connections(self, connections: int) -> int:
+        """Open pooled connections up front so the first updates skip the handshake."""
+        return prewarm(lambda: self.client.table("users").select("user_id").limit(1).execute(), connections)
     
     def init_schema(self):
-        """Ensure the necessary tables exist (or create/alter them if possible)."""
+        """Apply pending migrations from migrations/ through the sql() RPC (see migrate.py)."""
+        migrations = load_migrations()
+        current = self._schema_version()
+        if not migrations or current >= migrations[-1].version:
+            return
+
+        def execute(sql):
+            self.client.postgrest.rpc("sql", {"sql": sql}).execute()
+
+        apply_migrations(execute, current, migrations)
+
+    def _schema_version(self) -> int:
+        """Highest applied migration (0 before the first migration run)."""
         try:
-            # Check if essential tables exist by querying a small portion
-            self.client.table("channels").select("id").limit(1).execute()
-            self.client.table("posts").select("id").limit(1).execute()
-            self.client.table("users").select("user_id").limit(1).execute()
-        except Exception:
-            # Attempt to create missing tables and columns via SQL
-            schema_sql = """
-            -- Create tables if they don't exist
-            CREATE TABLE IF NOT EXISTS users (
-                user_id BIGINT PRIMARY KEY,
-                timezone TEXT DEFAULT 'UTC',
-                language TEXT DEFAULT 'ru',
-                date_format TEXT DEFAULT 'YYYY-MM-DD',
-                time_format TEXT DEFAULT 'HH:MM',
-                notify_before INTEGER DEFAULT 0,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-            );
-            
-            CREATE TABLE IF NOT EXISTS channels (
-                id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-                chat_id BIGINT NOT NULL UNIQUE,
-                name TEXT NOT NULL,
-                username TEXT,
-                is_admin_verified BOOLEAN DEFAULT FALSE,
-                admin_check_date TIMESTAMP WITH TIME ZONE,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-            );
-            
-            CREATE TABLE IF NOT EXISTS channel_admins (
-                channel_id BIGINT,
-                user_id BIGINT,
-                role TEXT DEFAULT 'admin',
-                added_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                PRIMARY KEY (channel_id, user_id),
-                FOREIGN KEY (channel_id) REFERENCES channels(id) ON DELETE CASCADE
-            );
-            
-            CREATE TABLE IF NOT EXISTS posts (
-                id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-                channel_id BIGINT NOT NULL,
-                chat_id BIGINT NOT NULL,
-                created_by BIGINT,
-                text TEXT,
-                media_type TEXT,
-                media_id TEXT,
-                parse_mode TEXT DEFAULT 'HTML',
-                buttons JSONB,
-                publish_time TIMESTAMP WITH TIME ZONE,
-                repeat_interval INTEGER DEFAULT 0,
-                draft BOOLEAN DEFAULT FALSE,
-                published BOOLEAN DEFAULT FALSE,
-                notified BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                FOREIGN KEY (channel_id) REFERENCES channels(id) ON DELETE CASCADE
-            );
-            
-            CREATE TABLE IF NOT EXISTS notification_settings (
-                user_id BIGINT PRIMARY KEY,
-                post_published BOOLEAN DEFAULT TRUE,
-                post_failed BOOLEAN DEFAULT TRUE,
-                daily_summary BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-            );
-            
-            -- Add missing columns if they don't exist
-            DO $$ 
-            BEGIN
-                -- Remove old project-related columns
-                IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='users' AND column_name='current_project') THEN
-                    ALTER TABLE users DROP COLUMN current_project;
-                END IF;
-                
-                IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='channels' AND column_name='project_id') THEN
-                    ALTER TABLE channels DROP COLUMN project_id;
-                END IF;
-                
-                IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='channels' AND column_name='user_id') THEN
-                    ALTER TABLE channels DROP COLUMN user_id;
-                END IF;
-                
-                IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='posts' AND column_name='project_id') THEN
-                    ALTER TABLE posts DROP COLUMN project_id;
-                END IF;
-                
-                IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='posts' AND column_name='user_id') THEN
-                    ALTER TABLE posts RENAME COLUMN user_id TO created_by;
-                END IF;
-                
-                -- Add new columns if missing
-                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='posts' AND column_name='created_by') THEN
-                    ALTER TABLE posts ADD COLUMN created_by BIGINT;
-                END IF;
-                
-                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='posts' AND column_name='chat_id') THEN
-                    ALTER TABLE posts ADD COLUMN chat_id BIGINT NOT NULL DEFAULT 0;
-                END IF;
-            END $$;
-            
-            -- Create indexes
-            CREATE INDEX IF NOT EXISTS idx_posts_channel_id ON posts(channel_id);
-            CREATE INDEX IF NOT EXISTS idx_posts_publish_time ON posts(publish_time);
-            CREATE INDEX IF NOT EXISTS idx_posts_published_draft ON posts(published, draft);
-            CREATE INDEX IF NOT EXISTS idx_channel_admins_user_id ON channel_admins(user_id);
-            CREATE INDEX IF NOT EXISTS idx_channels_chat_id ON channels(chat_id);
-            """
-            try:
-                self.client.postgrest.rpc("sql", {"sql": schema_sql}).execute()
-            except Exception as e:
-                print(f"Warning: Could not execute schema SQL: {e}")
+            res = self.client.table("schema_migrations").select("version").order("version", desc=True).limit(1).execute()
+            return res.data[0]["version"] if res.data else 0
+        except Exception as e:
+            print(f"schema_migrations not readable, applying all migrations: {e}")
+            return 0
 
     # User management
     def get_user(self, user_id: int):
         """Retrieve user settings by Telegram user_id."""
+        cached = self.user_cache.get(user_id)
+        if cached is not None:
+            return dict(cached)
+        stamp = self.user_cache.stamp()
         try:
             res = self.client.table("users").select("*").eq("user_id", user_id).execute()
             data = res.data or []
-            return data[0] if data else None
+            if not data:
+                return None
+            self.user_cache.set(user_id, dict(data[0]), stamp=stamp)
+            return data[0]
         except Exception as e:
             print(f"Error getting user {user_id}: {e}")
-            return None
+            return self.fallback_result("get_user", user_id)
+
+    def get_users(self, user_ids: list) -> dict:
+        """{user_id: user} for the given ids, cached rows first (missing users are left out)."""
+        users = {}
+        missing = []
+        for user_id in dict.fromkeys(uid for uid in user_ids if uid):
+            cached = self.user_cache.get(user_id)
+            if cached is not None:
+                users[user_id] = dict(cached)
+            else:
+                missing.append(user_id)
+        stamp = self.user_cache.stamp()
+        try:
+            for user in self._fetch_by_ids(self.client, "users", "user_id", missing):
+                self.user_cache.set(user["user_id"], dict(user), stamp=stamp)
+                users[user["user_id"]] = user
+        except Exception as e:
+            print(f"Error getting users {missing}: {e}")
+            for user_id in missing:
+                stale = self.user_cache.get_stale(user_id)
+                if stale is not None:
+                    users[user_id] = dict(stale)
+        return users
+
+    @staticmethod
+    def _fetch_by_ids(client, table: str, column: str, ids: list, columns: str = "*") -> list:
+        """Rows of ``table`` whose ``column`` is in ``ids``, chunked by ID_CHUNK_SIZE."""
+        ids = list(dict.fromkeys(i for i in ids if i))
+        rows = []
+        for start in range(0, len(ids), ID_CHUNK_SIZE):
+            chunk = ids[start:start + ID_CHUNK_SIZE]
+            res = client.table(table).select(columns).in_(column, chunk).execute()
+            rows.extend(res.data or [])
+        return rows
 
     def ensure_user(self, user_id: int, default_lang: str = None):
-        """Ensure a user exists in the users table. Creates with defaults if not present."""
+        """Get the user row, creating it with defaults (one ensure_user() RPC on a cache miss)."""
+        cached = self.user_cache.get(user_id)
+        if cached is not None:
+            return dict(cached)
+        stamp = self.user_cache.stamp()
         try:
-            user = self.get_user(user_id)
-            if user:
-                return user
-            
-            # Create new user with default settings
-            lang = default_lang or 'ru'
-            new_user = {
-                "user_id": user_id,
-                "timezone": "UTC",
-                "language": lang,
-                "date_format": "YYYY-MM-DD",
-                "time_format": "HH:MM",
-                "notify_before": 0
-            }
-            res_user = self.client.table("users").insert(new_user).execute()
-            return res_user.data[0] if res_user.data else None
+            res = self.client.rpc("ensure_user", {"p_user_id": user_id, "p_language": default_lang or "ru"}).execute()
+            if not res.data:
+                return None
+            self.user_cache.set(user_id, dict(res.data[0]), stamp=stamp)
+            return res.data[0]
         except Exception as e:
             print(f"Error ensuring user {user_id}: {e}")
-            return None
+            return self.fallback_result("ensure_user", user_id, default_lang)
 
     def update_user(self, user_id: int, updates: dict):
         """Update user settings and return the updated record."""
@@ -162,29 +285,20 @@ class SupabaseDB:
             return None
         try:
             res = self.client.table("users").update(updates).eq("user_id", user_id).execute()
-            return res.data[0] if res.data else None
+            if not res.data:
+                self.user_cache.pop(user_id)
+                return None
+            self.user_cache.set(user_id, dict(res.data[0]))
+            return res.data[0]
         except Exception as e:
+            self.user_cache.pop(user_id)
             print(f"Error updating user {user_id}: {e}")
             return None
 
     # Channel management
     def add_channel(self, chat_id: int, name: str, username: str = None, is_admin_verified: bool = False):
-        """Add a new channel or update existing one."""
+        """Add a new channel or update existing one (single upsert on chat_id)."""
         try:
-            # Check if channel exists
-            res = self.client.table("channels").select("*").eq("chat_id", chat_id).execute()
-            if res.data:
-                # Update existing channel
-                update_data = {
-                    "name": name,
-                    "username": username,
-                    "is_admin_verified": is_admin_verified,
-                    "admin_check_date": "now()" if is_admin_verified else None
-                }
-                res_update = self.client.table("channels").update(update_data).eq("chat_id", chat_id).execute()
-                return res_update.data[0] if res_update.data else None
-            
-            # Create new channel
             data = {
                 "chat_id": chat_id,
                 "name": name,
@@ -192,8 +306,13 @@ class SupabaseDB:
                 "is_admin_verified": is_admin_verified,
                 "admin_check_date": "now()" if is_admin_verified else None
             }
-            res_insert = self.client.table("channels").insert(data).execute()
-            return res_insert.data[0] if res_insert.data else None
+            res = self.client.table("channels").upsert(data, on_conflict="chat_id").execute()
+            if not res.data:
+                return None
+            self.acl_cache.invalidate_channel(res.data[0]["id"])
+            # Lists embed the channel name
+            self.list_cache.bump(res.data[0]["id"])
+            return res.data[0]
         except Exception as e:
             print(f"Error adding channel {chat_id}: {e}")
             return None
@@ -230,6 +349,14 @@ class SupabaseDB:
             print(f"Error getting channel {channel_id}: {e}")
             return None
 
+    def get_channels(self, channel_ids: list) -> dict:
+        """{channel_id: channel} for the given internal ids (missing ones left out)."""
+        try:
+            return {row["id"]: row for row in self._fetch_by_ids(self.client, "channels", "id", channel_ids)}
+        except Exception as e:
+            print(f"Error getting channels {list(channel_ids)}: {e}")
+            return {}
+
     def get_channel_by_chat_id(self, chat_id: int):
         """Retrieve a single channel by Telegram chat_id."""
         try:
@@ -245,19 +372,25 @@ class SupabaseDB:
         try:
             # Delete channel (cascade will delete posts and admins)
             self.client.table("channels").delete().eq("id", channel_id).execute()
+            self.acl_cache.invalidate_channel(channel_id)
+            self.list_cache.bump(channel_id)
             return True
         except Exception as e:
             print(f"Error removing channel {channel_id}: {e}")
             return False
 
     def add_channel_admin(self, channel_id: int, user_id: int, role: str = "admin"):
-        """Add user as admin to channel."""
+        """Add user as admin to channel (an existing admin keeps their role)."""
         try:
             data = {"channel_id": channel_id, "user_id": user_id, "role": role}
-            self.client.table("channel_admins").insert(data).execute()
+            self.client.table("channel_admins").upsert(
+                data, on_conflict="channel_id,user_id", ignore_duplicates=True
+            ).execute()
             return True
         except Exception:
             return False
+        finally:
+            self.acl_cache.invalidate_user(user_id)
 
     def remove_channel_admin(self, channel_id: int, user_id: int):
         """Remove user from channel admins."""
@@ -266,18 +399,23 @@ class SupabaseDB:
             return True
         except Exception:
             return False
+        finally:
+            self.acl_cache.invalidate_user(user_id)
 
     def is_channel_admin(self, channel_id: int, user_id: int):
         """Check if user is admin of the channel."""
-        try:
-            res = self.client.table("channel_admins").select("user_id").eq("channel_id", channel_id).eq("user_id", user_id).execute()
-            return bool(res.data)
-        except Exception as e:
-            print(f"Error checking if user {user_id} is admin of channel {channel_id}: {e}")
-            return False
+        return channel_id in self._admin_channels(user_id)
 
     def get_user_channels(self, user_id: int):
         """Get all channels where user is admin."""
+        return [dict(channel) for channel in self._admin_channels(user_id).values()]
+
+    def _admin_channels(self, user_id: int) -> dict:
+        """{channel_id: channel} the user administers, served from the ACL cache."""
+        channels = self.acl_cache.get(user_id)
+        if channels is not None:
+            return channels
+        stamp = self.acl_cache.stamp(user_id)
         try:
             res = self.client.table("channel_admins").select("*, channels(*)").eq("user_id", user_id).execute()
             channels = []
@@ -286,10 +424,14 @@ class SupabaseDB:
                     channel = admin_record["channels"]
                     channel["admin_role"] = admin_record.get("role", "admin")
                     channels.append(channel)
-            return channels
+            return self.acl_cache.set(user_id, channels, stamp=stamp)
         except Exception as e:
             print(f"Error getting user channels for {user_id}: {e}")
-            return []
+            stale = self.acl_cache.get_stale(user_id)
+            if stale is None:
+                return {}
+            self.breaker.record_stale_read()
+            return stale
 
     # Post management
     def add_post(self, post_data: dict):
@@ -315,6 +457,7 @@ class SupabaseDB:
             print(f"Inserting post data: {post_data}")  # Debug log
             
             res = self.client.table("posts").insert(post_data).execute()
+            self._posts_changed(res.data, post_data.get("channel_id"))
             return res.data[0] if res.data else None
         except Exception as e:
             print(f"Error inserting post: {e}")
@@ -332,12 +475,54 @@ class SupabaseDB:
             print(f"Error getting post {post_id}: {e}")
             return None
 
-    def list_posts(self, user_id: int = None, channel_id: int = None, only_pending: bool = True):
-        """List posts for channels user has access to."""
+    def get_posts(self, post_ids: list, projection: str = "full") -> dict:
+        """{post_id: post} for the given ids (missing ones left out)."""
+        columns = post_columns(projection)
         try:
+            return {row["id"]: row for row in self._fetch_by_ids(self.client, "posts", "id", post_ids, columns)}
+        except Exception as e:
+            print(f"Error getting posts {list(post_ids)}: {e}")
+            return {}
+
+    def get_post_for_admin(self, post_id: int, user_id: int, include_archive: bool = False):
+        """Post with its ``channels`` row and ``is_admin`` for user_id in one query, or None."""
+        try:
+            if not post_id:
+                return None
+            tables = ["posts", "posts_archive"] if include_archive else ["posts"]
+            data = []
+            for table in tables:
+                res = (
+                    self.client.table(table)
+                    .select("*, channels(*, channel_admins(user_id, role))")
+                    .eq("id", post_id)
+                    .eq("channels.channel_admins.user_id", user_id)
+                    .execute()
+                )
+                data = res.data or []
+                if data:
+                    break
+            if not data:
+                return None
+            post = data[0]
+            channel = post.get("channels") or {}
+            admins = channel.pop("channel_admins", None) or []
+            post["channels"] = channel or None
+            post["is_admin"] = bool(admins)
+            return post
+        except Exception as e:
+            print(f"Error getting post {post_id} for user {user_id}: {e}")
+            return None
+
+    def list_posts(self, user_id: int = None, channel_id: int = None, only_pending: bool = True, projection: str = "full",
+                   use_replica: bool = True):
+        """List posts for channels user has access to (use_replica=False reads the primary)."""
+        columns = post_columns(projection)
+        try:
+            reader = self.replicas.reader() if use_replica else self.client
             if channel_id:
                 # Get posts for specific channel
-                query = self.client.table("posts").select("*").eq("channel_id", channel_id)
+                query = reader.table("posts").select(columns).eq("channel_id", channel_id)
             elif user_id:
                 # Get posts for all channels user is admin of
                 user_channels = self.get_user_channels(user_id)
@@ -345,9 +530,9 @@ class SupabaseDB:
                     return []
                 
                 channel_ids = [ch["id"] for ch in user_channels]
-                query = self.client.table("posts").select("*").in_("channel_id", channel_ids)
+                query = reader.table("posts").select(columns).in_("channel_id", channel_ids)
             else:
-                query = self.client.table("posts").select("*")
+                query = reader.table("posts").select(columns)
             
             if only_pending:
                 query = query.eq("published", False)
@@ -359,6 +544,186 @@ class SupabaseDB:
             print(f"Error listing posts: {e}")
             return []
 
+    def list_posts_page(self, user_id: int, status: str = "all", page: int = 0, page_size: int = 5,
+                        projection: str = "list_row"):
+        """One cached page of the user's posts by status plus the exact total: (posts, total).
+
+        The "all" list includes archived posts, so its total matches count_posts_by_status.
+        """
+        columns = post_columns(projection, embed="channels(name, chat_id)")
+        try:
+            channel_ids = list(self._admin_channels(user_id))
+            if not channel_ids:
+                return [], 0
+            page = max(page, 0)
+            cache_key = ("page", user_id, status, page, page_size, projection)
+            cached = self.list_cache.get(cache_key, channel_ids)
+            if cached is not None:
+                posts, total = cached
+                return [dict(post) for post in posts], total
+            counts = self.count_posts_by_status(user_id) if status == "all" else None
+            stamp = self.list_cache.stamp(channel_ids)
+            reader = self.replicas.reader()
+            
+            def build():
+                query = reader.table("posts").select(columns, count="exact").in_("channel_id", channel_ids)
+                if status == "scheduled":
+                    return query.eq("published", False).eq("draft", False).order("publish_time", desc=False)
+                if status == "drafts":
+                    return query.eq("draft", True).order("created_at", desc=True)
+                return query.eq("published", True).order("created_at", desc=True)
+            
+            def read(offset):
+                if status == "all":
+                    return self._all_posts_page(reader, columns, channel_ids, counts, offset, page_size)
+                res = build().range(offset, offset + page_size - 1).execute()
+                return res.data or [], res.count or 0
+            
+            posts, total = read(page * page_size)
+            if not posts and total and page > 0:
+                # Page vanished (posts deleted or published) - show the last one
+                posts, total = read(((total - 1) // page_size) * page_size)
+            self.list_cache.set(cache_key, ([dict(post) for post in posts], total), stamp, self._list_settle(reader))
+            return posts, total
+        except Exception as e:
+            print(f"Error listing posts page for user {user_id}: {e}")
+            return self.fallback_result("list_posts_page", user_id, status, page, page_size, projection)
+
+    @staticmethod
+    def _all_posts_page(reader, columns: str, channel_ids: list, counts: dict, offset: int, limit: int):
+        """Rows of the "all" list and its total: unpublished posts (scheduled, then drafts)
+        by publish_time, then published and archived ones newest first."""
+        # Sizes from channel_post_stats, so each part is only read within its range
+        published = counts["published"]
+        unpublished = counts["total"] - published
+        posts = []
+        if offset < unpublished:
+            res = (
+                reader.table("posts").select(columns)
+                .in_("channel_id", channel_ids).eq("published", False)
+                .order("draft").order("publish_time", desc=False)
+                .range(offset, offset + limit - 1).execute()
+            )
+            posts = res.data or []
+        skip = max(offset - unpublished, 0)
+        need = limit - len(posts)
+        if need and skip < published:
+            # Same union as the published keyset list: the top rows of both tables, merged
+            def top(table):
+                return (
+                    reader.table(table).select(columns)
+                    .in_("channel_id", channel_ids).eq("published", True)
+                    .order("created_at", desc=True).order("id", desc=True)
+                    .limit(skip + need).execute().data or []
+                )
+            
+            posts += merge_keyset_rows([top("posts"), top("posts_archive")], "published", False, skip + need)[skip:]
+        return posts, counts["total"]
+
+    def list_posts_keyset(self, user_id: int, status: str, cursor: str = None, direction: str = "after",
+                          page_size: int = 5, projection: str = "list_row", include_archive: bool = False):
+        """One cached page of a KEYSET_ORDER list after/before ``cursor`` (or the last page): (posts, total)."""
+        column, desc = KEYSET_ORDER[status]
+        columns = post_columns(projection, embed="channels(name, chat_id)")
+        try:
+            channel_ids = list(self._admin_channels(user_id))
+            if not channel_ids:
+                return [], 0
+            total = self.count_posts_by_status(user_id)[status]
+            include_archive = include_archive and status == "published"
+            cache_key = ("keyset", user_id, status, cursor, direction, page_size, projection, include_archive)
+            cached = self.list_cache.get(cache_key, channel_ids)
+            if cached is not None:
+                posts, total = cached
+                return [dict(post) for post in posts], total
+            stamp = self.list_cache.stamp(channel_ids)
+            reader = self.replicas.reader()
+            
+            # "before" and "last" read backwards from the cursor/end and flip the rows
+            backwards = direction in ("before", "last")
+            order_desc = desc != backwards
+            limit = page_size
+            if direction == "last" and total:
+                # Same page boundaries as paging forward from the first page
+                limit = (total - 1) % page_size + 1
+            
+            def page_query(table):
+                query = reader.table(table).select(columns).in_("channel_id", channel_ids)
+                if status == "scheduled":
+                    query = query.eq("published", False).eq("draft", False).not_.is_("publish_time", "null")
+                elif status == "drafts":
+                    query = query.eq("draft", True)
+                else:
+                    query = query.eq("published", True)
+                if cursor and direction in ("after", "before"):
+                    value, post_id = decode_cursor(cursor)
+                    value = _utc_iso(value)
+                    op = "gt" if (direction == "after") != desc else "lt"
+                    query = query.or_(f'{column}.{op}."{value}",and({column}.eq."{value}",id.{op}.{post_id})')
+                return query.order(column, desc=order_desc).order("id", desc=order_desc).limit(limit)
+            
+            posts = page_query("posts").execute().data or []
+            if include_archive:
+                archived = page_query("posts_archive").execute().data or []
+                posts = merge_keyset_rows([posts, archived], status, backwards, limit)
+            if backwards:
+                posts.reverse()
+            if not posts and cursor:
+                # Everything past the cursor is gone (deleted or published)
+                return self.list_posts_keyset(user_id, status, None, "last" if direction == "after" else "after",
+                                              page_size, projection, include_archive)
+            self.list_cache.set(cache_key, ([dict(post) for post in posts], total), stamp, self._list_settle(reader))
+            return posts, total
+        except Exception as e:
+            print(f"Error listing {status} posts for user {user_id}: {e}")
+            return self.fallback_result("list_posts_keyset", user_id, status, cursor, direction, page_size, projection,
+                                        include_archive)
+
+    def count_posts_by_status(self, user_id: int) -> dict:
+        """Post counts (scheduled, drafts, published, total) summed from channel_post_stats."""
+        counts = {"scheduled": 0, "drafts": 0, "published": 0, "total": 0}
+        try:
+            channel_ids = list(self._admin_channels(user_id))
+            if not channel_ids:
+                return counts
+            cache_key = ("counts", user_id)
+            cached = self.list_cache.get(cache_key, channel_ids)
+            if cached is not None:
+                return dict(cached)
+            stamp = self.list_cache.stamp(channel_ids)
+            reader = self.replicas.reader()
+            for row in self._channel_stats(reader, channel_ids).values():
+                for key in counts:
+                    counts[key] += row[key]
+            self.list_cache.set(cache_key, dict(counts), stamp, self._list_settle(reader))
+            return counts
+        except Exception as e:
+            print(f"Error counting posts for user {user_id}: {e}")
+            return self.fallback_result("count_posts_by_status", user_id)
+
+    def get_channel_post_stats(self, channel_ids: list) -> dict:
+        """{channel_id: counts} from channel_post_stats (zeros for channels without posts)."""
+        channel_ids = list(channel_ids)
+        if not channel_ids:
+            return {}
+        try:
+            return self._channel_stats(self.replicas.reader(), channel_ids)
+        except Exception as e:
+            print(f"Error getting post stats for channels {channel_ids}: {e}")
+            return {cid: {"scheduled": 0, "drafts": 0, "published": 0, "total": 0} for cid in channel_ids}
+
+    def _channel_stats(self, reader, channel_ids: list) -> dict:
+        res = (
+            reader.table("channel_post_stats")
+            .select("channel_id, scheduled, drafts, published, total")
+            .in_("channel_id", channel_ids)
+            .execute()
+        )
+        by_channel = {cid: {"scheduled": 0, "drafts": 0, "published": 0, "total": 0} for cid in channel_ids}
+        for row in res.data or []:
+            by_channel[row["channel_id"]] = {key: row.get(key) or 0 for key in by_channel[row["channel_id"]]}
+        return by_channel
+
     def update_post(self, post_id: int, updates: dict):
         """Update fields of a post and return the updated record."""
         try:
@@ -369,36 +734,80 @@ class SupabaseDB:
             if "buttons" in updates and isinstance(updates["buttons"], list):
                 updates["buttons"] = json.dumps(updates["buttons"])
             res = self.client.table("posts").update(updates).eq("id", post_id).execute()
+            if "channel_id" in updates:
+                # The post left a channel we do not know here
+                self.list_cache.bump_all()
+            else:
+                self._posts_changed(res.data)
             return res.data[0] if res.data else None
         except Exception as e:
             print(f"Error updating post {post_id}: {e}")
             return None
 
+    def update_post_if(self, post_id: int, expected_version, changes: dict):
+        """Update an unpublished post still at expected_version; returns (row, status)."""
+        try:
+            changes = dict(changes)
+            if "format" in changes:
+                changes["parse_mode"] = changes.pop("format")
+            if "buttons" in changes and isinstance(changes["buttons"], list):
+                changes["buttons"] = json.dumps(changes["buttons"])
+            query = self.client.table("posts").update(changes).eq("id", post_id).eq("published", False)
+            if expected_version is not None:
+                query = query.eq("version", expected_version)
+            res = query.execute()
+            if res.data:
+                if "channel_id" in changes:
+                    self.list_cache.bump_all()
+                else:
+                    self._posts_changed(res.data)
+                return res.data[0], "ok"
+            current = self.get_post(post_id)
+            if not current:
+                return None, "missing"
+            if current.get("published"):
+                return current, "published"
+            return current, "conflict"
+        except Exception as e:
+            print(f"Error updating post {post_id} at version {expected_version}: {e}")
+            return None, "error"
+
     def delete_post(self, post_id: int):
-        """Delete a post by id."""
+        """Delete a post by id (archived posts included)."""
         try:
-            self.client.table("posts").delete().eq("id", post_id).execute()
+            res = self.client.table("posts").delete().eq("id", post_id).execute()
+            if not res.data:
+                res = self.client.table("posts_archive").delete().eq("id", post_id).execute()
+            self._posts_changed(res.data)
             return True
         except Exception as e:
             print(f"Error deleting post {post_id}: {e}")
             return False
 
-    def get_due_posts(self, current_time):
+    def archive_published_posts(self, older_than_days: int, batch_size: int = 500) -> int:
+        """Move one batch of old published, non-repeating posts into posts_archive; returns how many moved."""
+        try:
+            res = self.client.rpc("archive_published_posts", {
+                "p_older_than_days": older_than_days,
+                "p_batch": batch_size,
+            }).execute()
+            rows = res.data or []
+            if rows:
+                # Lists without the archive lose these posts
+                self._posts_changed(rows)
+            return len(rows)
+        except Exception as e:
+            print(f"Error archiving published posts: {e}")
+            return 0
+
+    def get_due_posts(self, current_time, projection: str = "publish_row"):
         """Get posts scheduled up to the given time (not published or drafts)."""
+        columns = post_columns(projection)
         try:
-            # Ensure timezone aware value and format in UTC
-            if hasattr(current_time, "tzinfo") and current_time.tzinfo is None:
-                current_time = current_time.replace(tzinfo=timezone.utc)
-            elif not hasattr(current_time, "tzinfo"):
-                # Fallback for strings or naive values
-                try:
-                    current_time = datetime.fromisoformat(str(current_time))
-                except Exception:
-                    current_time = datetime.now(timezone.utc)
-            now_str = current_time.astimezone(timezone.utc).isoformat()
+            now_str = _utc_iso(current_time)
             res = (
                 self.client.table("posts")
-                .select("*")
+                .select(columns)
                 .eq("published", False)
                 .eq("draft", False)
                 .lte("publish_time", now_str)
@@ -410,31 +819,67 @@ class SupabaseDB:
             return []
 
     def mark_post_published(self, post_id: int):
-        """Mark a post as published."""
+        """Mark a post as published and return the updated record."""
         try:
-            self.client.table("posts").update({"published": True}).eq("id", post_id).execute()
-            return True
+            res = self.client.table("posts").update({"published": True}).eq("id", post_id).execute()
+            self._posts_changed(res.data)
+            return res.data[0] if res.data else None
         except Exception as e:
             print(f"Error marking post {post_id} as published: {e}")
             return False
 
+    def mark_post_notified(self, post_id: int):
+        """Mark that the pre-publication reminder was sent."""
+        return self.update_post(post_id, {"notified": True})
+
+    def claim_scheduler_tick(self, current_time, lease_seconds: int = 300) -> dict:
+        """Claim due posts and collect due reminders in one scheduler_claim() call."""
+        try:
+            res = self.client.rpc(
+                "scheduler_claim", {"p_now": _utc_iso(current_time), "p_lease_seconds": lease_seconds}
+            ).execute()
+            data = res.data or {}
+            return {"due": data.get("due") or [], "notify": data.get("notify") or []}
+        except Exception as e:
+            print(f"Error claiming scheduler tick: {e}")
+            return {"due": [], "notify": []}
+
+    def complete_scheduler_tick(self, sent: list = (), skipped: list = (), notified: list = ()):
+        """Store a pass's outcomes with scheduler_complete(); None on failure (retry with the same ids)."""
+        sent, skipped, notified = list(sent), list(skipped), list(notified)
+        if not (sent or skipped or notified):
+            return []
+        try:
+            res = self.client.rpc(
+                "scheduler_complete", {"p_sent": sent, "p_skipped": skipped, "p_notified": notified}
+            ).execute()
+            rows = res.data or []
+            self._posts_changed(rows)
+            return rows
+        except Exception as e:
+            print(f"Error completing scheduler tick: {e}")
+            return None
+
     def update_channel_admin_status(self, channel_id: int, is_admin: bool):
-        """Update channel admin verification status."""
+        """Update channel admin verification status and return the updated record."""
         try:
             update_data = {
                 "is_admin_verified": is_admin,
                 "admin_check_date": "now()"
             }
-            self.client.table("channels").update(update_data).eq("id", channel_id).execute()
-            return True
+            res = self.client.table("channels").update(update_data).eq("id", channel_id).execute()
+            self.acl_cache.invalidate_channel(channel_id)
+            return res.data[0] if res.data else None
         except Exception as e:
             print(f"Error updating channel {channel_id} admin status: {e}")
             return False
 
-    def list_posts_by_channel(self, channel_id: int, only_pending: bool = False):
+    def list_posts_by_channel(self, channel_id: int, only_pending: bool = False, projection: str = "full"):
         """List posts for a specific channel."""
+        columns = post_columns(projection)
         try:
-            query = self.client.table("posts").select("*").eq("channel_id", channel_id)
+            reader = self.replicas.reader()
+            query = reader.table("posts").select(columns).eq("channel_id", channel_id)
             if only_pending:
                 query = query.eq("published", False)
             query = query.order("publish_time", desc=False)
@@ -444,17 +889,19 @@ class SupabaseDB:
             print(f"Error listing posts for channel {channel_id}: {e}")
             return []
 
-    def get_scheduled_posts_by_channel(self, user_id: int = None):
+    def get_scheduled_posts_by_channel(self, user_id: int = None, projection: str = "full"):
         """Get scheduled posts for channels user has access to."""
+        columns = post_columns(projection, embed="channels(name, chat_id)")
         try:
+            reader = self.replicas.reader()
             if user_id:
                 user_channels = self.get_user_channels(user_id)
                 if not user_channels:
                     return []
                 channel_ids = [ch["id"] for ch in user_channels]
-                query = self.client.table("posts").select("*, channels(name, chat_id)").eq("published", False).eq("draft", False).in_("channel_id", channel_ids)
+                query = reader.table("posts").select(columns).eq("published", False).eq("draft", False).in_("channel_id", channel_ids)
             else:
-                query = self.client.table("posts").select("*, channels(name, chat_id)").eq("published", False).eq("draft", False)
+                query = reader.table("posts").select(columns).eq("published", False).eq("draft", False)
             
             query = query.order("publish_time", desc=False)
             res = query.execute()
@@ -463,17 +910,19 @@ class SupabaseDB:
             print(f"Error getting scheduled posts by channel: {e}")
             return []
 
-    def get_draft_posts_by_channel(self, user_id: int = None):
+    def get_draft_posts_by_channel(self, user_id: int = None, projection: str = "full"):
         """Get draft posts for channels user has access to."""
+        columns = post_columns(projection, embed="channels(name, chat_id)")
         try:
+            reader = self.replicas.reader()
             if user_id:
                 user_channels = self.get_user_channels(user_id)
                 if not user_channels:
                     return []
                 channel_ids = [ch["id"] for ch in user_channels]
-                query = self.client.table("posts").select("*, channels(name, chat_id)").eq("draft", True).in_("channel_id", channel_ids)
+                query = reader.table("posts").select(columns).eq("draft", True).in_("channel_id", channel_ids)
             else:
-                query = self.client.table("posts").select("*, channels(name, chat_id)").eq("draft", True)
+                query = reader.table("posts").select(columns).eq("draft", True)
             
             query = query.order("created_at", desc=True)
             res = query.execute()
@@ -518,3 +967,89 @@ class SupabaseDB:
             return len(user_channels) > 0
         except:
             return False
+
+
+# Per-method deadlines (seconds) for AsyncSupabaseDB; other methods use its
+# default. Writes get none: a write abandoned at its deadline would still
+# commit after the caller saw it fail, so they are bounded by the HTTP timeout
+DEFAULT_DEADLINES = {
+    "init_schema": None,
+    "prewarm_connections": None,
+    "close": None,
+    **dict.fromkeys((
+        "update_user", "add_channel", "remove_channel", "add_channel_admin", "remove_channel_admin",
+        "update_channel_admin_status", "add_post", "update_post", "update_post_if", "delete_post",
+        "archive_published_posts", "mark_post_published", "mark_post_notified",
+        "claim_scheduler_tick", "complete_scheduler_tick",
+        "create_notification_settings", "update_notification_settings",
+    )),
+}
+
+# Reads that AsyncSupabaseDB collapses when identical calls overlap (double
+# taps, bursts of callbacks); ensure_user is idempotent and runs per update
+SINGLE_FLIGHT_METHODS = {
+    "get_user", "ensure_user", "get_user_channels", "get_channel", "get_post", "get_post_for_admin",
+}
+
+
+class AsyncSupabaseDB:
+    """Awaitable facade: backend methods run on a bounded thread pool, with deadlines."""
+
+    def __init__(self, sync_db: StorageBackend, max_workers: int = 8, deadline: float = 8.0,
+                 deadlines: dict = None):
+        self.sync = sync_db
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="supabase-db")
+        self.deadline = deadline
+        self.deadlines = dict(DEFAULT_DEADLINES, **(deadlines or {}))
+        self.flights = SingleFlight()
+
+    def singleflight_stats(self) -> dict:
+        """Calls started vs. served from an identical call already in flight."""
+        return self.flights.stats()
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking callable on the DB thread pool (in the caller's context, for the budget)."""
+        loop = asyncio.get_running_loop()
+        context = copy_context()
+        return await loop.run_in_executor(self._executor, context.run, functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name: str):
+        # Expose every public SupabaseDB method as a coroutine function
+        if name.startswith("_"):
+            raise AttributeError(name)
+        method = getattr(self.sync, name)
+        if not callable(method):
+            return method
+
+        deadline = self.deadlines.get(name, self.deadline)
+
+        async def call(*args, **kwargs):
+            if deadline is None:
+                return await self.run(method, *args, **kwargs)
+            try:
+                return await asyncio.wait_for(self.run(method, *args, **kwargs), deadline)
+            except asyncio.TimeoutError:
+                # The worker thread finishes on its own (bounded by the HTTP timeout)
+                print(f"Database call {name} missed its {deadline:.1f}s deadline")
+                self.sync.record_timeout(name)
+                return self.sync.fallback_result(name, *args, **kwargs)
+
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            if name not in SINGLE_FLIGHT_METHODS:
+                return await call(*args, **kwargs)
+            key = (name, args, tuple(sorted(kwargs.items())))
+            return await self.flights.do(key, lambda: call(*args, **kwargs))
+
+        setattr(self, name, wrapper)
+        return wrapper
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker threads and close the backend (wait=False drops queued calls).
+
+        Calls already running always finish first: closing under them would break their connections.
+        """
+        self._executor.shutdown(wait=True, cancel_futures=not wait)
+        close = getattr(self.sync, "close", None)
+        if close:
+            close()
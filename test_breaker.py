@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Тест предохранителя (circuit breaker) обращений к базе
+"""
+
+import time
+
+from breaker import CircuitBreaker
+
+
+def test_opens_after_threshold():
+    """После N ошибок подряд обращения отклоняются"""
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow()
+    stats = breaker.stats()
+    assert stats["state"] == "open"
+    assert stats["opened"] == 1
+    assert stats["rejected"] == 1
+    assert stats["failures"] == 5
+
+
+def test_half_open_probe():
+    """После паузы пропускается одна пробная попытка"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+
+    assert breaker.allow()
+    assert not breaker.allow()
+    # Неудачная проба снова размыкает цепь
+    breaker.record_failure()
+    assert breaker.is_open
+    time.sleep(0.06)
+
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.stats()["state"] == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_timeouts_count_as_failures():
+    """Превышение дедлайна считается ошибкой"""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_timeout()
+    breaker.record_timeout()
+    assert breaker.is_open
+    assert breaker.stats()["timeouts"] == 2
+
+
+if __name__ == "__main__":
+    test_opens_after_threshold()
+    test_half_open_probe()
+    test_timeouts_count_as_failures()
+    print("✅ Все тесты предохранителя пройдены")
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Тест TTL/LRU кэша
+"""
+
+import time
+
+from cache import ChannelACLCache, ListResultCache, TTLCache
+
+
+def test_lru_eviction():
+    """Самая старая запись вытесняется при переполнении"""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    cache.get(1)  # 1 становится самой свежей
+    cache.set(3, "c")
+
+    assert cache.get(2) is None
+    assert cache.get(1) == "a"
+    assert cache.get(3) == "c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry():
+    """Запись истекает по TTL"""
+    cache = TTLCache(maxsize=10, ttl=0.05)
+    cache.set("user", {"language": "ru"})
+    assert cache.get("user") == {"language": "ru"}
+    time.sleep(0.06)
+    assert cache.get("user") is None
+
+
+def test_stale_reads():
+    """Последнее значение доступно после истечения TTL и смены версий"""
+    cache = TTLCache(maxsize=10, ttl=0.05)
+    cache.set("user", {"language": "ru"})
+    time.sleep(0.06)
+    assert cache.get("user") is None
+    assert cache.get_stale("user") == {"language": "ru"}
+    cache.pop("user")
+    assert cache.get_stale("user") is None
+
+    acl = ChannelACLCache(maxsize=10, ttl=0.05)
+    acl.set(1, [{"id": 10}])
+    time.sleep(0.06)
+    assert acl.get(1) is None
+    assert acl.get_stale(1) == {10: {"id": 10}}
+
+    lists = ListResultCache(maxsize=10, ttl=60)
+    lists.set("k", ["p1"], lists.stamp([10]))
+    lists.bump(10)
+    assert lists.get("k", [10]) is None
+    assert lists.get_stale("k") == ["p1"]
+
+
+def test_counters_and_invalidation():
+    """Счетчики попаданий/промахов и инвалидация"""
+    cache = TTLCache(maxsize=10, ttl=None)
+    cache.set(1, "x")
+    cache.get(1)
+    cache.get(2)
+    cache.pop(1)
+    cache.get(1)
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["size"] == 0
+
+
+def test_disabled_cache():
+    """maxsize=0 отключает кэш"""
+    cache = TTLCache(maxsize=0)
+    cache.set(1, "x")
+    assert cache.get(1) is None
+
+
+def test_channel_acl_invalidation():
+    """Удаление канала сбрасывает кэш всех его администраторов"""
+    acl = ChannelACLCache(maxsize=10, ttl=60)
+    acl.set(1, [{"id": 10, "admin_role": "owner"}, {"id": 11, "admin_role": "admin"}])
+    acl.set(2, [{"id": 10, "admin_role": "admin"}])
+    acl.set(3, [{"id": 12, "admin_role": "admin"}])
+
+    assert 10 in acl.get(1)
+    acl.invalidate_channel(10)
+    assert acl.get(1) is None
+    assert acl.get(2) is None
+    assert acl.get(3) == {12: {"id": 12, "admin_role": "admin"}}
+
+    acl.set(3, [])
+    assert acl.get(3) == {}
+    acl.invalidate_user(3)
+    assert acl.get(3) is None
+
+
+def test_read_through_stamp():
+    """Запись из запроса, начатого до обновления, не затирает свежее значение"""
+    cache = TTLCache(maxsize=10, ttl=60)
+    stamp = cache.stamp()
+    cache.set(1, {"language": "en"})  # update_user успел раньше
+    cache.set(1, {"language": "ru"}, stamp=stamp)  # ответ старого get_user
+    assert cache.get(1) == {"language": "en"}
+
+    stamp = cache.stamp()
+    cache.pop(2)
+    cache.set(2, "stale", stamp=stamp)
+    assert cache.get(2) is None
+
+    stamp = cache.stamp()
+    cache.set(3, "fresh", stamp=stamp)
+    assert cache.get(3) == "fresh"
+
+    # Запись в другой ключ не мешает
+    stamp = cache.stamp()
+    cache.set(4, "other")
+    cache.set(5, "fresh", stamp=stamp)
+    assert cache.get(5) == "fresh"
+
+
+def test_read_through_stamp_after_eviction():
+    """Вытесненный после обновления ключ не заменяется ответом старого запроса"""
+    cache = TTLCache(maxsize=2, ttl=60)
+    stamp = cache.stamp()
+    cache.set(1, "updated")
+    cache.set(2, "b")
+    cache.set(3, "c")  # 1 вытеснен
+    cache.set(1, "stale", stamp=stamp)
+    assert cache.get(1) is None
+
+
+def test_bounded_state():
+    """Служебное состояние кэша не растет с числом ключей"""
+    cache = TTLCache(maxsize=10, ttl=60)
+    for key in range(5000):
+        stamp = cache.stamp()
+        cache.set(key, key, stamp=stamp)
+        cache.set(key, key)
+        if key % 3 == 0:
+            cache.pop(key)
+    assert len(cache) <= 10
+    assert all(len(value) <= 10 for value in vars(cache).values() if isinstance(value, (dict, set, list)))
+
+
+def test_channel_acl_stamp():
+    """Список каналов, прочитанный до invalidate_*, в кэш не попадает"""
+    acl = ChannelACLCache(maxsize=10, ttl=60)
+    stamp = acl.stamp(1)
+    acl.invalidate_user(1)  # add_channel_admin между запросом и записью
+    by_id = acl.set(1, [{"id": 10}], stamp=stamp)
+    assert by_id == {10: {"id": 10}}
+    assert acl.get(1) is None
+
+    stamp = acl.stamp(1)
+    acl.invalidate_channel(10)  # канал удален, пока шел запрос
+    acl.set(1, [{"id": 10}, {"id": 11}], stamp=stamp)
+    assert acl.get(1) is None
+
+    # Инвалидация другого пользователя и другого канала не мешает
+    stamp = acl.stamp(1)
+    acl.invalidate_user(2)
+    acl.invalidate_channel(12)
+    acl.set(1, [{"id": 11}], stamp=stamp)
+    assert set(acl.get(1)) == {11}
+    acl.invalidate_channel(11)
+    assert acl.get(1) is None
+
+
+def test_channel_acl_bounded():
+    """Обратный индекс и журнал инвалидаций не растут с числом пользователей"""
+    acl = ChannelACLCache(maxsize=10, ttl=60, invalidation_window=8)
+    for user_id in range(5000):
+        acl.set(user_id, [{"id": user_id}, {"id": -1}], stamp=acl.stamp(user_id))
+        if user_id % 7 == 0:
+            acl.invalidate_user(user_id)
+    assert len(acl._users) <= 10
+    assert len(acl._channel_users) <= 11
+    assert len(acl._channel_users[-1]) <= 10
+    assert len(acl._recent) <= 8
+
+    # Повторная запись пользователя убирает его из старых каналов
+    acl.set(4999, [{"id": 1}])
+    assert 4999 not in acl._channel_users.get(4999, ())
+
+    # Инвалидации вытеснены из журнала - старый штамп уже не проверить
+    stamp = acl.stamp(1)
+    for channel_id in range(100, 120):
+        acl.invalidate_channel(channel_id)
+    acl.set(1, [{"id": 10}], stamp=stamp)
+    assert acl.get(1) is None
+
+    stamp = acl.stamp(1)
+    acl.clear()
+    assert not acl._channel_users and not acl._recent
+    acl.set(1, [{"id": 10}], stamp=stamp)
+    assert acl.get(1) is None
+    acl.set(1, [{"id": 10}], stamp=acl.stamp(1))
+    assert acl.get(1) == {10: {"id": 10}}
+
+
+def test_list_result_versions():
+    """Запись в канал делает устаревшими списки, построенные по нему"""
+    lists = ListResultCache(maxsize=10, ttl=60)
+    stamp = lists.stamp([10, 11])
+    lists.set(("page", 1, "all", 0), ["p1"], stamp)
+    lists.set(("page", 2, "all", 0), ["p2"], lists.stamp([12]))
+    assert lists.get(("page", 1, "all", 0), [11, 10]) == ["p1"]
+
+    lists.bump(11)
+    assert lists.get(("page", 1, "all", 0), [10, 11]) is None
+    assert lists.get(("page", 2, "all", 0), [12]) == ["p2"]
+
+    # Запись во время запроса: результат по старому штампу не используется
+    stamp = lists.stamp([10, 11])
+    lists.bump(10)
+    lists.set(("page", 1, "all", 0), ["old"], stamp)
+    assert lists.get(("page", 1, "all", 0), [10, 11]) is None
+
+    # Изменился набор каналов пользователя
+    lists.set(("page", 2, "all", 0), ["p2"], lists.stamp([12]))
+    assert lists.get(("page", 2, "all", 0), [12, 13]) is None
+
+    lists.set(("page", 2, "all", 0), ["p2"], lists.stamp([12]))
+    lists.bump_all()
+    assert lists.get(("page", 2, "all", 0), [12]) is None
+
+
+def test_list_result_settle():
+    """Результат с реплики сразу после записи не кэшируется"""
+    lists = ListResultCache(maxsize=10, ttl=60)
+    lists.bump(10)
+    lists.set("k", ["replica"], lists.stamp([10]), settle=5.0)
+    assert lists.get("k", [10]) is None
+    lists.set("k", ["primary"], lists.stamp([10]))
+    assert lists.get("k", [10]) == ["primary"]
+
+
+if __name__ == "__main__":
+    test_lru_eviction()
+    test_ttl_expiry()
+    test_stale_reads()
+    test_counters_and_invalidation()
+    test_disabled_cache()
+    test_channel_acl_invalidation()
+    test_read_through_stamp()
+    test_read_through_stamp_after_eviction()
+    test_bounded_state()
+    test_channel_acl_stamp()
+    test_channel_acl_bounded()
+    test_list_result_versions()
+    test_list_result_settle()
+    print("✅ Все тесты кэша пройдены")
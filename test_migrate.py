@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Тест миграций схемы Supabase
+"""
+
+import os
+
+from migrate import apply_migrations, full_script, load_migrations, migration_script
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_migrations_are_ordered():
+    """Миграции идут по возрастанию версии без повторов"""
+    migrations = load_migrations()
+    versions = [m.version for m in migrations]
+    assert versions == sorted(set(versions))
+    assert versions[0] == 1
+    script = migration_script(migrations[0])
+    assert "pg_advisory_xact_lock" in script
+    assert script.rstrip().endswith("ON CONFLICT (version) DO NOTHING;")
+
+
+def test_sql_file_matches_migrations():
+    """sql.sql сгенерирован из текущих миграций (python migrate.py > sql.sql)"""
+    with open(os.path.join(ROOT, "sql.sql"), encoding="utf-8") as f:
+        assert f.read() == full_script()
+
+
+def test_apply_pending_and_stop_on_error():
+    """Применяются только новые миграции, на ошибке применение останавливается"""
+    migrations = load_migrations()
+    executed = []
+
+    def execute(sql):
+        if "0004" in sql.splitlines()[0]:
+            raise RuntimeError("sql() is not deployed")
+        executed.append(sql.splitlines()[0])
+
+    assert apply_migrations(execute, 1, migrations) == 3
+    assert executed == ["-- 0002 read_functions", "-- 0003 text_preview"]
+
+    executed.clear()
+    last = migrations[-1].version
+    assert apply_migrations(lambda sql: executed.append(sql), last, migrations) == last
+    assert executed == []
+
+
+if __name__ == "__main__":
+    test_migrations_are_ordered()
+    test_sql_file_matches_migrations()
+    test_apply_pending_and_stop_on_error()
+    print("✅ Все тесты миграций пройдены")
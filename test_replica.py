@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Тест маршрутизации чтения на реплику
+"""
+
+from replica import ReplicaRouter
+
+
+class FakeReplica:
+    """Отдает заданное отставание из replica_lag_seconds()"""
+
+    def __init__(self, lag=0.0, fail=False):
+        self.lag = lag
+        self.fail = fail
+        self.checks = 0
+
+    def rpc(self, name, params):
+        assert name == "replica_lag_seconds"
+        return self
+
+    def execute(self):
+        self.checks += 1
+        if self.fail:
+            raise RuntimeError("replica down")
+        return type("Response", (), {"data": self.lag})()
+
+
+def test_no_replica_uses_primary():
+    """Без реплики все чтения идут в основную базу"""
+    primary = object()
+    router = ReplicaRouter(primary)
+    assert router.reader() is primary
+    assert router.stats()["primary_reads"] == 1
+
+
+def test_lag_threshold_and_recheck():
+    """Реплика используется, пока отставание не превышает порог"""
+    primary, replica = object(), FakeReplica(lag=1.0)
+    router = ReplicaRouter(primary, replica, max_lag=5.0, check_interval=0)
+
+    assert router.reader() is replica
+    replica.lag = 30.0
+    assert router.reader() is primary
+    replica.lag = 0.0
+    assert router.reader() is replica
+    assert router.stats()["replica_reads"] == 2
+
+
+def test_failed_check_falls_back():
+    """Ошибка проверки отставания переключает чтение на основную базу"""
+    primary, replica = object(), FakeReplica(fail=True)
+    router = ReplicaRouter(primary, replica, check_interval=60)
+    assert router.reader() is primary
+    assert router.reader() is primary
+    assert replica.checks == 1
+
+
+if __name__ == "__main__":
+    test_no_replica_uses_primary()
+    test_lag_threshold_and_recheck()
+    test_failed_check_falls_back()
+    print("✅ Все тесты реплики пройдены")
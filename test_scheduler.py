@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Тест планировщика: если итоги прохода не записались, посты не отправляются повторно
+"""
+
+import asyncio
+
+import auto_post_fixed
+import supabase_db
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+class FlakyDB:
+    """Пока итоги не записаны, каждый проход снова отдает тот же пост (аренда истекла)"""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.completed = []
+
+    async def claim_scheduler_tick(self, current_time):
+        due = [] if self.completed else [{"id": 1, "chat_id": -100, "created_by": 7, "text": "пост"}]
+        return {"due": due, "notify": []}
+
+    async def complete_scheduler_tick(self, sent=(), skipped=(), notified=()):
+        if self.failures:
+            self.failures -= 1
+            return None
+        self.completed.append(list(sent))
+        return [{"id": post_id, "published": True} for post_id in sent]
+
+    async def get_users(self, user_ids):
+        return {}
+
+
+def test_failed_complete_does_not_resend():
+    """Итоги не записались дважды - пост все равно отправлен один раз и записан на третьем проходе"""
+    bot = FakeBot()
+    db = supabase_db.db = FlakyDB(failures=2)
+
+    async def run():
+        task = asyncio.create_task(auto_post_fixed.start_scheduler(bot, check_interval=0))
+        while not db.completed:
+            await asyncio.sleep(0)
+        task.cancel()
+
+    asyncio.run(run())
+    assert len(bot.sent) == 1
+    assert db.completed == [[1]]
+
+
+if __name__ == "__main__":
+    test_failed_complete_does_not_resend()
+    print("✅ Все тесты планировщика пройдены")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Тест объединения одновременных одинаковых запросов (single-flight)
+"""
+
+import asyncio
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_result():
+    """Одновременные вызовы с одним ключом выполняются один раз"""
+    flights = SingleFlight()
+    started = []
+
+    async def load(post_id):
+        started.append(post_id)
+        await asyncio.sleep(0.01)
+        return {"id": post_id, "channels": {"name": "News"}}
+
+    async def main():
+        results = await asyncio.gather(
+            flights.do(("get_post", 1), lambda: load(1)),
+            flights.do(("get_post", 1), lambda: load(1)),
+            flights.do(("get_post", 2), lambda: load(2)),
+        )
+        # Ожидающие получают копию, а не общую строку
+        results[1]["channels"]["name"] = "changed"
+        assert results[0]["channels"]["name"] == "News"
+        return results
+
+    results = asyncio.run(main())
+    assert started == [1, 2]
+    assert [r["id"] for r in results] == [1, 1, 2]
+    assert flights.stats() == {"in_flight": 0, "calls": 2, "deduplicated": 1}
+
+
+def test_errors_are_shared_and_not_cached():
+    """Ошибка достается всем ожидающим, следующий вызов идет заново"""
+    flights = SingleFlight()
+    attempts = []
+
+    async def failing():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("db down")
+
+    async def main():
+        results = await asyncio.gather(
+            flights.do("k", failing), flights.do("k", failing), return_exceptions=True
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+        results = await asyncio.gather(flights.do("k", failing), return_exceptions=True)
+        assert isinstance(results[0], RuntimeError)
+
+    asyncio.run(main())
+    assert len(attempts) == 2
+
+
+
+def test_cancelled_leader_keeps_call():
+    """Отмена первого вызова не отменяет общий запрос: ожидающий получает результат"""
+    flights = SingleFlight()
+    started = []
+
+    async def load():
+        started.append(1)
+        await asyncio.sleep(0.02)
+        return {"id": 1}
+
+    async def main():
+        leader = asyncio.ensure_future(flights.do("k", load))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flights.do("k", load))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await waiter == {"id": 1}
+        assert leader.cancelled()
+
+    asyncio.run(main())
+    assert started == [1]
+    assert flights.stats() == {"in_flight": 0, "calls": 1, "deduplicated": 1}
+
+
+if __name__ == "__main__":
+    test_concurrent_calls_share_result()
+    test_errors_are_shared_and_not_cached()
+    test_cancelled_leader_keeps_call()
+    print("✅ Все тесты single-flight пройдены")
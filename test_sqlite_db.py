@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Тест SQLite-бэкенда (тот же интерфейс, что у SupabaseDB)
+"""
+
+import ast
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from sqlite_db import SQLiteDB, utc_timestamp
+
+
+def make_db() -> SQLiteDB:
+    db = SQLiteDB(":memory:")
+    db.init_schema()
+    return db
+
+
+def test_interface_matches_supabase_db():
+    """Все публичные методы SupabaseDB есть в SQLiteDB"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "supabase_db.py")
+    tree = ast.parse(open(path, encoding="utf-8").read())
+    cls = next(node for node in tree.body if isinstance(node, ast.ClassDef) and node.name == "SupabaseDB")
+    methods = {node.name for node in cls.body if isinstance(node, ast.FunctionDef) and not node.name.startswith("_")}
+
+    missing = sorted(name for name in methods if not callable(getattr(SQLiteDB, name, None)))
+    assert missing == []
+
+
+def test_channels_and_acl():
+    """Каналы пользователя приходят со встроенной ролью"""
+    db = make_db()
+    db.ensure_user(1, default_lang="en")
+    channel = db.add_channel(-100, "News", "news", is_admin_verified=True)
+    assert channel["is_admin_verified"] is True
+    assert db.add_channel_admin(channel["id"], 1, "owner")
+    assert db.add_channel_admin(channel["id"], 1)
+    assert db.add_channel(-100, "News 2")["id"] == channel["id"]
+
+    channels = db.get_user_channels(1)
+    assert [(ch["name"], ch["admin_role"]) for ch in channels] == [("News 2", "owner")]
+    assert db.is_channel_admin(channel["id"], 1)
+    assert not db.is_channel_admin(channel["id"], 2)
+    assert db.get_user(1)["language"] == "en"
+    db.update_user(1, {"timezone": "Europe/Moscow"})
+    assert db.ensure_user(1, default_lang="ru")["timezone"] == "Europe/Moscow"
+
+    db.remove_channel(channel["id"])
+    assert db.get_user_channels(1) == []
+
+
+def test_posts_flow():
+    """Планирование, выборка готовых постов, страницы и счетчики"""
+    db = make_db()
+    channel = db.add_channel(-100, "News")
+    db.add_channel_admin(channel["id"], 1)
+    now = datetime.now(timezone.utc)
+
+    due = db.add_post({"channel_id": channel["id"], "created_by": 1, "text": "x" * 100,
+                       "publish_time": (now - timedelta(minutes=1)).isoformat(), "buttons": [{"text": "a", "url": "b"}]})
+    later = db.add_post({"channel_id": channel["id"], "created_by": 1, "text": "later",
+                         "publish_time": now + timedelta(hours=1)})
+    db.add_post({"channel_id": channel["id"], "created_by": 1, "text": "draft", "draft": True})
+
+    assert due["chat_id"] == -100
+    assert due["text_preview"] == "x" * 64
+    assert due["published"] is False
+
+    assert [p["id"] for p in db.get_due_posts(now)] == [due["id"]]
+    assert db.mark_post_published(due["id"])
+    assert db.get_due_posts(now) == []
+
+    posts, total = db.list_posts_page(1, "scheduled", 0, 5)
+    assert total == 1 and posts[0]["id"] == later["id"]
+    assert posts[0]["channels"] == {"name": "News", "chat_id": -100}
+    assert "text" not in posts[0]
+
+    assert db.count_posts_by_status(1) == {"scheduled": 1, "drafts": 1, "published": 1, "total": 3}
+    assert [p["text"] for p in db.get_draft_posts_by_channel(1)] == ["draft"]
+
+    post = db.get_post_for_admin(later["id"], 2)
+    assert post["is_admin"] is False and post["channels"]["name"] == "News"
+    assert db.update_post(later["id"], {"format": "Markdown"})["parse_mode"] == "Markdown"
+
+
+def test_scheduler_tick():
+    """Такт планировщика: захват готовых постов, напоминания и итоги"""
+    db = make_db()
+    db.ensure_user(1)
+    db.update_user(1, {"notify_before": 30})
+    channel = db.add_channel(-100, "News")
+    now = datetime.now(timezone.utc)
+
+    once = db.add_post({"channel_id": channel["id"], "created_by": 1, "text": "once",
+                        "publish_time": now - timedelta(minutes=1)})
+    repeat = db.add_post({"channel_id": channel["id"], "created_by": 1, "text": "repeat",
+                          "publish_time": now - timedelta(minutes=2), "repeat_interval": 3600})
+    soon = db.add_post({"channel_id": channel["id"], "created_by": 1, "text": "soon",
+                        "publish_time": now + timedelta(minutes=10)})
+    db.add_post({"channel_id": channel["id"], "created_by": 1, "text": "later",
+                 "publish_time": now + timedelta(hours=2)})
+
+    tick = db.claim_scheduler_tick(now)
+    assert [p["id"] for p in tick["due"]] == [repeat["id"], once["id"]]
+    assert tick["due"][0]["channel_name"] == "News" and tick["due"][0]["chat_id"] == -100
+    assert [(p["id"], p["language"]) for p in tick["notify"]] == [(soon["id"], "ru")]
+
+    # Захваченные посты не выдаются повторно, пока не истечет аренда
+    assert db.claim_scheduler_tick(now)["due"] == []
+    assert len(db.claim_scheduler_tick(now + timedelta(minutes=6))["due"]) == 2
+
+    rows = db.complete_scheduler_tick(sent=[once["id"], repeat["id"]], notified=[soon["id"]])
+    assert {row["id"]: row["published"] for row in rows} == {once["id"]: True, repeat["id"]: False, soon["id"]: False}
+    assert db.get_post(soon["id"])["notified"] is True
+    moved = db.get_post(repeat["id"])
+    assert datetime.fromisoformat(moved["publish_time"]) == datetime.fromisoformat(repeat["publish_time"]) + timedelta(hours=1)
+    assert moved["claimed_at"] is None
+
+    tick = db.claim_scheduler_tick(now)
+    assert tick == {"due": [], "notify": []}
+
+
+def test_claim_inside_open_transaction():
+    """Захват работает, даже если на соединении уже открыта неявная транзакция"""
+    db = make_db()
+    channel = db.add_channel(-100, "News")
+    now = datetime.now(timezone.utc)
+    post = db.add_post({"channel_id": channel["id"], "created_by": 1, "text": "once",
+                        "publish_time": now - timedelta(minutes=1)})
+    db.conn.execute("UPDATE channels SET name = 'News' WHERE id = ?", (channel["id"],))
+    assert db.conn.in_transaction
+
+    assert [p["id"] for p in db.claim_scheduler_tick(now)["due"]] == [post["id"]]
+    assert not db.conn.in_transaction
+
+
+def test_parallel_claims():
+    """Два потока с отдельными соединениями не захватывают один пост дважды"""
+    import threading
+
+    db = make_db()
+    channel = db.add_channel(-100, "News")
+    now = datetime.now(timezone.utc)
+    ids = {db.add_post({"channel_id": channel["id"], "created_by": 1, "text": f"p{i}",
+                        "publish_time": now - timedelta(minutes=1)})["id"] for i in range(20)}
+    claimed = []
+
+    def claim():
+        claimed.extend(p["id"] for p in db.claim_scheduler_tick(now)["due"])
+
+    threads = [threading.Thread(target=claim) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(ids)
+
+
+class FailingUpdates:
+    """Соединение, на котором падает любой UPDATE (итоги прохода не записываются)"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=()):
+        if sql.lstrip().startswith("UPDATE") and "claimed_at = ?" not in sql:
+            raise sqlite3.OperationalError("database is locked")
+        return self.conn.execute(sql, params)
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self.conn.__exit__(*exc)
+
+
+def test_failed_complete_keeps_claims():
+    """Итоги не записались: посты остаются захваченными до конца аренды"""
+    db = make_db()
+    channel = db.add_channel(-100, "News")
+    now = datetime.now(timezone.utc)
+    post = db.add_post({"channel_id": channel["id"], "created_by": 1, "text": "once",
+                        "publish_time": now - timedelta(minutes=1)})
+
+    assert [p["id"] for p in db.claim_scheduler_tick(now)["due"]] == [post["id"]]
+    conn = db.conn
+    db._local.conn = FailingUpdates(conn)
+    assert db.complete_scheduler_tick(sent=[post["id"]]) is None
+    db._local.conn = conn
+
+    assert db.get_post(post["id"])["published"] is False
+    assert db.claim_scheduler_tick(now + timedelta(minutes=1))["due"] == []
+    # После аренды пост выдается снова - планировщик пропускает его сам (test_scheduler.py)
+    assert len(db.claim_scheduler_tick(now + timedelta(minutes=6))["due"]) == 1
+    assert db.complete_scheduler_tick(sent=[post["id"]])[0]["published"] is True
+
+
+def test_channel_post_stats():
+    """Счетчики каналов, которые ведут триггеры, совпадают с подсчетом по posts"""
+    db = make_db()
+    first = db.add_channel(-100, "News")
+    second = db.add_channel(-200, "Blog")
+    db.add_channel_admin(first["id"], 1)
+    db.add_channel_admin(second["id"], 1)
+    now = datetime.now(timezone.utc)
+
+    post = db.add_post({"channel_id": first["id"], "text": "a", "publish_time": now})
+    draft = db.add_post({"channel_id": first["id"], "text": "b", "draft": True})
+    db.add_post({"channel_id": second["id"], "text": "c", "publish_time": now})
+    assert db.get_channel_post_stats([first["id"], second["id"], 999]) == {
+        first["id"]: {"scheduled": 1, "drafts": 1, "published": 0, "total": 2},
+        second["id"]: {"scheduled": 1, "drafts": 0, "published": 0, "total": 1},
+        999: {"scheduled": 0, "drafts": 0, "published": 0, "total": 0},
+    }
+
+    db.mark_post_published(post["id"])
+    db.update_post(draft["id"], {"draft": False, "publish_time": now, "channel_id": second["id"]})
+    db.update_post(post["id"], {"text": "не меняет счетчики"})
+    assert db.count_posts_by_status(1) == {"scheduled": 2, "drafts": 0, "published": 1, "total": 3}
+
+    db.delete_post(post["id"])
+    db.remove_channel(second["id"])
+    assert db.count_posts_by_status(1) == {"scheduled": 0, "drafts": 0, "published": 0, "total": 0}
+
+
+def test_update_post_if_versions():
+    """Сохранение по версии: второй редактор получает конфликт, а не затирает правку"""
+    db = make_db()
+    channel = db.add_channel(-100, "News")
+    post = db.add_post({"channel_id": channel["id"], "text": "v1"})
+    assert post["version"] == 1
+
+    first, status = db.update_post_if(post["id"], 1, {"text": "первый"})
+    assert status == "ok" and first["version"] == 2 and first["text"] == "первый"
+
+    current, status = db.update_post_if(post["id"], 1, {"text": "второй"})
+    assert status == "conflict" and current["text"] == "первый" and current["version"] == 2
+
+    # Служебные флаги не меняют версию
+    db.mark_post_notified(post["id"])
+    assert db.get_post(post["id"])["version"] == 2
+
+    db.mark_post_published(post["id"])
+    current, status = db.update_post_if(post["id"], 3, {"text": "поздно"})
+    assert status == "published" and current["text"] == "первый"
+    assert db.update_post_if(999, 1, {"text": "x"}) == (None, "missing")
+
+
+def test_batch_lookups():
+    """get_users/get_channels/get_posts читают строки по списку id"""
+    db = make_db()
+    db.ensure_user(1, default_lang="en")
+    db.ensure_user(2)
+    first = db.add_channel(-100, "News")
+    second = db.add_channel(-200, "Blog")
+    posts = [db.add_post({"channel_id": first["id"], "text": f"post {i}"}) for i in range(3)]
+
+    users = db.get_users([1, 2, 2, 3, None])
+    assert sorted(users) == [1, 2]
+    assert users[1]["language"] == "en"
+    assert sorted(db.get_channels([second["id"], first["id"], 999])) == sorted([first["id"], second["id"]])
+
+    ids = [post["id"] for post in posts]
+    by_id = db.get_posts(ids + [999], projection="list_row")
+    assert sorted(by_id) == sorted(ids)
+    assert by_id[ids[0]]["text_preview"] == "post 0"
+    assert "text" not in by_id[ids[0]]
+    assert db.get_posts([]) == {}
+
+
+def test_all_posts_order():
+    """Все посты: запланированные и черновики по времени публикации, затем опубликованные, новые сверху"""
+    db = make_db()
+    channel = db.add_channel(-100, "News")
+    db.add_channel_admin(channel["id"], 1)
+    start = datetime(2030, 1, 1, tzinfo=timezone.utc)
+
+    def add(hours, created_days, **flags):
+        post_id = db.add_post({"channel_id": channel["id"], "created_by": 1, "text": "p",
+                               "publish_time": (start + timedelta(hours=hours)).isoformat(), **flags})["id"]
+        with db.conn:
+            db.conn.execute("UPDATE posts SET created_at = ? WHERE id = ?",
+                            (utc_timestamp(start - timedelta(days=created_days)), post_id))
+        return post_id
+
+    old_published = add(1, 10, published=True)
+    new_published = add(2, 1, published=True)
+    late = add(5, 3)
+    early = add(4, 3)
+    draft = add(3, 2, draft=True)
+
+    posts, total = db.list_posts_page(1, "all", page_size=10)
+    assert total == 5
+    assert [p["id"] for p in posts] == [early, late, draft, new_published, old_published]
+    second, _ = db.list_posts_page(1, "all", page=1, page_size=3)
+    assert [p["id"] for p in second] == [new_published, old_published]
+
+
+def test_keyset_pages():
+    """Курсорная пагинация: страницы не сдвигаются при публикации постов"""
+    from storage import encode_cursor
+
+    db = make_db()
+    channel = db.add_channel(-100, "News")
+    db.add_channel_admin(channel["id"], 1)
+    start = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    # Два поста на одно время: порядок внутри задает id
+    ids = [db.add_post({"channel_id": channel["id"], "created_by": 1, "text": f"p{i}",
+                        "publish_time": (start + timedelta(hours=i // 2)).isoformat()})["id"] for i in range(7)]
+
+    first, total = db.list_posts_keyset(1, "scheduled", page_size=3)
+    assert total == 7
+    assert [p["id"] for p in first] == ids[:3]
+    assert first[0]["channels"]["name"] == "News"
+
+    # Пост с первой страницы опубликован - вторая страница не сдвигается
+    db.update_post(ids[0], {"published": True})
+    second, total = db.list_posts_keyset(1, "scheduled", encode_cursor(first[-1], "scheduled"), "after", 3)
+    assert total == 6
+    assert [p["id"] for p in second] == ids[3:6]
+
+    back, _ = db.list_posts_keyset(1, "scheduled", encode_cursor(second[0], "scheduled"), "before", 3)
+    assert [p["id"] for p in back] == ids[1:3]
+
+    # Последняя страница выровнена по страницам от начала (6 постов = 3 + 3)
+    last, _ = db.list_posts_keyset(1, "scheduled", direction="last", page_size=3)
+    assert [p["id"] for p in last] == ids[4:]
+
+    # За курсором ничего не осталось - отдается последняя страница
+    tail, _ = db.list_posts_keyset(1, "scheduled", encode_cursor(last[-1], "scheduled"), "after", 3)
+    assert [p["id"] for p in tail] == ids[4:]
+
+    # Опубликованные: новые сверху
+    db.update_post(ids[1], {"published": True})
+    published, total = db.list_posts_keyset(1, "published", page_size=1)
+    assert total == 2
+    older, _ = db.list_posts_keyset(1, "published", encode_cursor(published[0], "published"), "after", 1)
+    assert {published[0]["id"], older[0]["id"]} == {ids[0], ids[1]}
+
+
+def test_archive_published_posts():
+    """Старые опубликованные посты уходят в архив, история видит их через include_archive"""
+    from storage import encode_cursor
+
+    db = make_db()
+    channel = db.add_channel(-100, "News")
+    db.add_channel_admin(channel["id"], 1)
+    now = datetime.now(timezone.utc)
+    old = [db.add_post({"channel_id": channel["id"], "created_by": 1, "text": f"old{i}", "published": True,
+                        "publish_time": (now - timedelta(days=100 + i)).isoformat()})["id"] for i in range(3)]
+    repeating = db.add_post({"channel_id": channel["id"], "created_by": 1, "text": "repeat", "published": True,
+                             "repeat_interval": 3600, "publish_time": (now - timedelta(days=200)).isoformat()})["id"]
+    fresh = db.add_post({"channel_id": channel["id"], "created_by": 1, "text": "fresh", "published": True,
+                         "publish_time": (now - timedelta(days=1)).isoformat()})["id"]
+    before = db.count_posts_by_status(1)
+
+    # Пачки по 2 поста: вторая короче пачки - архивировать больше нечего
+    assert db.archive_published_posts(30, batch_size=2) == 2
+    assert db.archive_published_posts(30, batch_size=2) == 1
+    assert db.archive_published_posts(30, batch_size=2) == 0
+    assert db.get_post(old[0]) is None
+    assert db.get_post(repeating) and db.get_post(fresh)
+
+    # Счетчики считают архив, перенос их не меняет
+    assert db.count_posts_by_status(1) == before
+
+    # Список "все" включает архив: его total совпадает со счетчиками
+    page, total = db.list_posts_page(1, "all", page_size=10)
+    assert total == db.count_posts_by_status(1)["total"] == 5
+    assert {p["id"] for p in page} == set(old) | {repeating, fresh}
+
+    recent, _ = db.list_posts_keyset(1, "published", page_size=5)
+    assert {p["id"] for p in recent} == {repeating, fresh}
+
+    # История: архив подмешивается с той же сортировкой и курсорами
+    first, total = db.list_posts_keyset(1, "published", page_size=3, include_archive=True)
+    assert total == 5
+    second, _ = db.list_posts_keyset(1, "published", encode_cursor(first[-1], "published"), "after", 3,
+                                     include_archive=True)
+    assert {p["id"] for p in first + second} == set(old) | {repeating, fresh}
+    # ...и в том же порядке, что и "все" (там только опубликованные)
+    assert [p["id"] for p in first + second] == [p["id"] for p in page]
+    assert second[0]["text_preview"].startswith(("old", "repeat", "fresh"))
+
+    assert db.get_post_for_admin(old[0], 1) is None
+    archived = db.get_post_for_admin(old[0], 1, include_archive=True)
+    assert archived["text"] == "old0" and archived["is_admin"]
+
+    assert db.delete_post(old[0])
+    assert db.get_post_for_admin(old[0], 1, include_archive=True) is None
+    assert db.count_posts_by_status(1)["published"] == before["published"] - 1
+
+
+
+def test_merge_short_fractions():
+    """Дробная часть секунд короче 6 цифр (так ее отдает PostgREST) сортируется верно"""
+    from storage import merge_keyset_rows, _epoch_micros
+
+    assert _epoch_micros("2030-01-01T12:00:00.5+00:00") == _epoch_micros("2030-01-01T12:00:00.500000+00:00")
+    assert _epoch_micros("2030-01-01T12:00:00.05Z") - _epoch_micros("2030-01-01T12:00:00Z") == 50_000
+    rows = [
+        {"id": 1, "created_at": "2030-01-01T12:00:00.5+00:00"},
+        {"id": 2, "created_at": "2030-01-01T12:00:00.123456+00:00"},
+        {"id": 3, "created_at": "2030-01-01T12:00:01+00:00"},
+    ]
+    merged = merge_keyset_rows([rows[:1], rows[1:]], "published", False, 3)
+    assert [row["id"] for row in merged] == [3, 1, 2]
+
+
+def test_due_posts_use_partial_index():
+    """Выборка планировщика идет по частичному индексу idx_posts_due"""
+    db = make_db()
+    plan = db.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT p.id FROM posts p WHERE p.published = 0 AND p.draft = 0 AND p.publish_time <= ?",
+        ("2030-01-01",),
+    ).fetchall()
+    assert any("idx_posts_due" in row[3] for row in plan)
+
+
+if __name__ == "__main__":
+    test_interface_matches_supabase_db()
+    test_channels_and_acl()
+    test_posts_flow()
+    test_scheduler_tick()
+    test_failed_complete_keeps_claims()
+    test_claim_inside_open_transaction()
+    test_parallel_claims()
+    test_channel_post_stats()
+    test_update_post_if_versions()
+    test_batch_lookups()
+    test_all_posts_order()
+    test_keyset_pages()
+    test_archive_published_posts()
+    test_merge_short_fractions()
+    test_due_posts_use_partial_index()
+    print("✅ Все тесты SQLite-бэкенда пройдены")
@@ -295,10 +295,10 @@ def get_post_management_keyboard(post_id: int, is_published: bool = False) -> In
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 @router.message(Command("view"))
-async def cmd_view_post(message: Message):
+async def cmd_view_post(message: Message, db_user: dict = None):
     """Просмотр поста по ID"""
     user_id = message.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     args = message.text.split(maxsplit=1)
@@ -327,7 +327,7 @@ async def cmd_view_post(message: Message):
         return
     
     # Получаем пост
-    post = supabase_db.db.get_post(post_id)
+    post = await supabase_db.db.get_post_for_admin(post_id, user_id, include_archive=True)
     if not post:
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="📋 Список постов", callback_data="posts_menu")],
@@ -337,7 +337,7 @@ async def cmd_view_post(message: Message):
         return
     
     # Проверяем доступ через канал
-    if not supabase_db.db.is_channel_admin(post.get("channel_id"), user_id):
+    if not post["is_admin"]:
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="📋 Список постов", callback_data="posts_menu")],
             [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
@@ -346,7 +346,7 @@ async def cmd_view_post(message: Message):
         return
     
     # Получаем информацию о канале
-    channel = supabase_db.db.get_channel(post.get("channel_id"))
+    channel = post.get("channels")
     
     # Отправляем превью поста
     await send_post_preview(message, post, channel)
@@ -413,10 +413,10 @@ async def send_post_preview_safe(message: Message, post: dict):
         await message.answer(text, parse_mode="Markdown")
 
 @router.message(Command("publish"))
-async def cmd_publish_now(message: Message):
+async def cmd_publish_now(message: Message, db_user: dict = None):
     """Опубликовать пост немедленно"""
     user_id = message.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     args = message.text.split(maxsplit=1)
@@ -445,7 +445,7 @@ async def cmd_publish_now(message: Message):
         return
     
     # Получаем пост
-    post = supabase_db.db.get_post(post_id)
+    post = await supabase_db.db.get_post_for_admin(post_id, user_id)
     if not post:
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="📋 Список постов", callback_data="posts_menu")],
@@ -455,7 +455,7 @@ async def cmd_publish_now(message: Message):
         return
     
     # Проверяем доступ через канал
-    if not supabase_db.db.is_channel_admin(post.get("channel_id"), user_id):
+    if not post["is_admin"]:
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="📋 Список постов", callback_data="posts_menu")],
             [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
@@ -471,12 +471,16 @@ async def cmd_publish_now(message: Message):
         await message.answer("❌ Пост уже опубликован", reply_markup=keyboard)
         return
     
-    # Обновляем время публикации на текущее - ИСПРАВЛЕНО
+    # Обновляем время публикации на текущее, если пост не изменился после чтения
     now = datetime.now(ZoneInfo("UTC"))
-    supabase_db.db.update_post(post_id, {
+    updated, status = await supabase_db.db.update_post_if(post_id, post.get("version"), {
         "publish_time": now.isoformat(),  # Конвертируем в строку!
         "draft": False
     })
+    if status != "ok":
+        await message.answer("❌ Пост уже опубликован" if status == "published"
+                             else "❌ Пост изменился, попробуйте еще раз")
+        return
     
     # Пытаемся получить бот из main.py для немедленной публикации
     try:
@@ -486,7 +490,7 @@ async def cmd_publish_now(message: Message):
         # Пытаемся опубликовать немедленно
         # Получаем бот из глобального контекста
         from main import bot
-        published = await publish_post_immediately(bot, post_id)
+        published = await publish_post_immediately(bot, post_id, updated)
         
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="👀 Просмотр поста", callback_data=f"post_full_view:{post_id}")],
@@ -524,10 +528,10 @@ async def cmd_publish_now(message: Message):
         )
 
 @router.message(Command("reschedule"))
-async def cmd_reschedule_post(message: Message):
+async def cmd_reschedule_post(message: Message, db_user: dict = None):
     """Перенести публикацию поста"""
     user_id = message.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     parts = message.text.split(maxsplit=3)
@@ -558,7 +562,7 @@ async def cmd_reschedule_post(message: Message):
         return
     
     # Получаем пост
-    post = supabase_db.db.get_post(post_id)
+    post = await supabase_db.db.get_post_for_admin(post_id, user_id)
     if not post:
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="📋 Список постов", callback_data="posts_menu")],
@@ -568,7 +572,7 @@ async def cmd_reschedule_post(message: Message):
         return
     
     # Проверяем доступ через канал
-    if not supabase_db.db.is_channel_admin(post.get("channel_id"), user_id):
+    if not post["is_admin"]:
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="📋 Список постов", callback_data="posts_menu")],
             [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
@@ -600,12 +604,16 @@ async def cmd_reschedule_post(message: Message):
             await message.answer("❌ Время должно быть в будущем", reply_markup=keyboard)
             return
         
-        # Обновляем пост - ИСПРАВЛЕНО
-        supabase_db.db.update_post(post_id, {
+        # Обновляем пост, если его не опубликовали и не изменили после чтения
+        _, status = await supabase_db.db.update_post_if(post_id, post.get("version"), {
             "publish_time": utc_dt.isoformat(),  # Конвертируем в строку!
             "draft": False,
             "notified": False
         })
+        if status != "ok":
+            await message.answer("❌ Нельзя перенести уже опубликованный пост" if status == "published"
+                                 else "❌ Пост изменился, попробуйте еще раз")
+            return
         
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="👀 Просмотр поста", callback_data=f"post_full_view:{post_id}")],
@@ -634,10 +642,10 @@ async def cmd_reschedule_post(message: Message):
         )
 
 @router.message(Command("delete"))
-async def cmd_delete_post(message: Message):
+async def cmd_delete_post(message: Message, db_user: dict = None):
     """Удалить пост"""
     user_id = message.from_user.id
-    user = supabase_db.db.get_user(user_id)
+    user = db_user
     lang = user.get("language", "ru") if user else "ru"
     
     args = message.text.split(maxsplit=1)
@@ -666,7 +674,7 @@ async def cmd_delete_post(message: Message):
         return
     
     # Получаем пост
-    post = supabase_db.db.get_post(post_id)
+    post = await supabase_db.db.get_post_for_admin(post_id, user_id, include_archive=True)
     if not post:
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="📋 Список постов", callback_data="posts_menu")],
@@ -676,7 +684,7 @@ async def cmd_delete_post(message: Message):
         return
     
     # Проверяем доступ через канал
-    if not supabase_db.db.is_channel_admin(post.get("channel_id"), user_id):
+    if not post["is_admin"]:
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="📋 Список постов", callback_data="posts_menu")],
             [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
@@ -708,12 +716,12 @@ async def callback_confirm_delete_post(callback: CallbackQuery):
     post_id = int(callback.data.split(":", 1)[1])
     
     # Проверяем доступ
-    post = supabase_db.db.get_post(post_id)
-    if not post or not supabase_db.db.is_channel_admin(post.get("channel_id"), user_id):
+    post = await supabase_db.db.get_post_for_admin(post_id, user_id, include_archive=True)
+    if not post or not post["is_admin"]:
         await callback.answer("❌ У вас нет доступа к этому посту!")
         return
     
-    if supabase_db.db.delete_post(post_id):
+    if await supabase_db.db.delete_post(post_id):
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="📋 Список постов", callback_data="posts_menu")],
             [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]